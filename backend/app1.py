@@ -1,13 +1,29 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, send_file
 from flask_cors import CORS
 from pymongo import MongoClient
 from bson.objectid import ObjectId
+from bson.errors import InvalidId
+from bson.decimal128 import Decimal128
 from dotenv import load_dotenv
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 import bcrypt
 import certifi
+import hashlib
+import itertools
 import os
-
+import re
+import time
+
+import archive
+import dedup
+import metrics
+import money
+import profiler
+import ratelimit
+import remediation
+import reports
+import sketches
+import swift
 
 from flask_jwt_extended import (
     JWTManager, create_access_token,
@@ -18,18 +34,33 @@ load_dotenv()
 
 MONGO_URI = os.getenv('MONGO_URI')
 
+class JSONProvider(metrics.TimedJSONProvider):
+    @staticmethod
+    def default(o):
+        # Decimal128 amounts go out as exact decimal strings
+        if isinstance(o, (Decimal128, ObjectId)):
+            return str(o)
+        return metrics.TimedJSONProvider.default(o)
+
 app = Flask(__name__)
+app.json = JSONProvider(app)
 CORS(app)
+metrics.install(app)
 
 app.config["JWT_SECRET_KEY"] = os.getenv("JWT_SECRET_KEY")
 jwt = JWTManager(app)
+limiter = ratelimit.default_limiter()
+ratelimit.install(app, limiter)
 
 # MongoDB connection (local)
+slow_queries = profiler.SlowQueryProfiler()
 client = MongoClient(
     MONGO_URI,
     tls=True,
-    tlsCAFile=certifi.where()
+    tlsCAFile=certifi.where(),
+    event_listeners=[metrics.CommandMetrics(), slow_queries]
 )
+slow_queries.bind(client)
 try:
     # This will attempt to get the list of databases from MongoDB
     dbs = client.list_database_names()
@@ -42,6 +73,35 @@ exceptions = db['exceptions']
 processed = db['processed']
 audit = db['audit_logs']
 users = db['users'] 
+resolution_sketches = db['resolution_sketches']
+exception_tombstones = db['exception_tombstones']  # ids that left the queue, for changed_since syncs
+
+# how long removals are remembered; clients that last synced earlier must reload the queue
+TOMBSTONE_RETENTION_DAYS = int(os.getenv('TOMBSTONE_RETENTION_DAYS', 7))
+# sync watermarks are set back this much so writes racing a sync are picked up by the next one
+SYNC_OVERLAP = timedelta(seconds=2)
+
+def ensure_indexes():
+    resolution_sketches.create_index([('operator', 1), ('day', 1)], unique=True)
+    # archival cutoff scans and dashboard date ranges
+    processed.create_index([('processed_at', -1)])
+    audit.create_index([('timestamp', -1)])
+    # queue order and keyset paging
+    exceptions.create_index([('created_at', -1), ('_id', -1)])
+    # changed_since syncs
+    exceptions.create_index([('updated_at', 1)])
+    exception_tombstones.create_index([('deleted_at', 1)], expireAfterSeconds=TOMBSTONE_RETENTION_DAYS * 86400)
+    # exact amount range filters and per-currency totals
+    exceptions.create_index([('currency', 1), ('amount', 1)])
+    processed.create_index([('currency', 1), ('amount', 1)])
+    # one queue record per payment; partial, so records from before fingerprinting aren't covered and
+    # stay separate (and aren't matched by new repeats) until `python dedup.py` fingerprints and merges them
+    dedup.ensure_index(exceptions)
+
+try:
+    ensure_indexes()
+except Exception as e:
+    print("❌ Could not create indexes:", e)
 
 # --- Simple operator "auth" (demo only) ---
 OPERATORS = {
@@ -59,28 +119,93 @@ def validate_transaction(tx):
         errs.append('Beneficiary name empty')
     if len(name) > 70:
         errs.append('Beneficiary name too long (max 70)')
+    # Currency (ISO 4217 alpha code)
+    currency = tx.get('currency', '')
+    if not re.match(r'^[A-Z]{3}$', currency or ''):
+        errs.append('Currency must be a 3-letter ISO code')
     # Amount
     try:
-        amt = float(tx.get('amount', 0))
+        amt = money.to_decimal(tx.get('amount', 0))
         if amt <= 0:
             errs.append('Amount must be positive')
-    except Exception:
+        elif not money.fits_minor_unit(amt, currency):
+            errs.append(f'Amount has more decimals than {currency} allows')
+        elif not money.fits_storage(amt, currency):
+            errs.append('Amount too large')
+    except ValueError:
         errs.append('Amount invalid')
     # Very simple IBAN-like pattern (not full validation)
     iban = tx.get('iban', '')
     if iban and not re.match(r'^[A-Z0-9]{8,34}$', iban.replace(' ', '').upper()):
         errs.append('IBAN format invalid')
+    # a record that passes the basic checks must also convert cleanly to pacs.008
+    if not errs:
+        errs = swift.conversion_errors(tx)
     return errs
 
-def get_dashboard_stats(days=5):
+def commit_fix(orig, merged, operator, processed_by=None, **audit_fields):
+    """
+    Move a validated exception to `processed` and audit it; shared by /api/fix
+    and the auto-remediation engine. `operator` is who acted, for the audit
+    log; `processed_by` (default: operator) is who the fix is credited to.
+    Returns the processed id, or None when the exception had already left the
+    queue (someone else fixed it first).
+    """
+    tx_id = orig['_id']
+    processed_by = processed_by or operator
+    # Move to processed, with the amount in its exact stored form
+    merged.update(money.amount_fields(merged['amount'], merged['currency']))
+    merged['processed_at'] = datetime.utcnow()
+    merged['processed_by'] = processed_by
+    res = processed.insert_one(merged)
+
+    # Remove from exceptions; losing that race means the record was processed twice, so undo ours
+    if exceptions.delete_one({'_id': tx_id}).deleted_count == 0:
+        processed.delete_one({'_id': res.inserted_id})
+        return None
+    # Leave a tombstone so syncing clients drop it too
+    exception_tombstones.replace_one({'_id': tx_id}, {'_id': tx_id, 'deleted_at': datetime.utcnow()}, upsert=True)
+
+    # Feed the per-operator resolution-time sketch
+    if isinstance(merged.get('created_at'), datetime):
+        resolution = (merged['processed_at'] - merged['created_at']).total_seconds()
+        sketches.record_resolution(resolution_sketches, processed_by, merged['processed_at'], resolution)
+
+    # Insert audit log
+    audit.insert_one({
+        'tx_id': str(tx_id),
+        'operator': operator,
+        'before': {k: v for k, v in orig.items() if k != '_id'},
+        'after': merged,
+        'timestamp': datetime.utcnow(),
+        **audit_fields
+    })
+    return res.inserted_id
+
+def currency_totals(coll):
+    pipeline = [
+        {'$project': {'_id': 0, 'currency': 1, 'amount': 1}},
+        {'$group': {'_id': '$currency', 'count': {'$sum': 1}, 'total': {'$sum': '$amount'}}},
+        {'$sort': {'_id': 1}}
+    ]
+    return [{'currency': doc['_id'] or '(none)', 'count': doc['count'], 'total': doc['total']}
+            for doc in coll.aggregate(pipeline, hint=[('currency', 1), ('amount', 1)])]
+
+def get_dashboard_stats(days=5, include_archived=False):
     """
     Returns a dict of dashboard metrics for the last `days` days.
+    With include_archived, processed counts also cover records moved to the archive.
     """
     now = datetime.utcnow()
     since = now - timedelta(days=days)
 
     # Counts
     total_exceptions = exceptions.count_documents({})
+    # upstream copies behind those records, duplicates included
+    occurrences = list(exceptions.aggregate([
+        {'$group': {'_id': None, 'count': {'$sum': {'$ifNull': ['$occurrences', 1]}}}}
+    ]))
+    total_occurrences = occurrences[0]['count'] if occurrences else 0
     total_processed = processed.count_documents({})
     processed_recent = processed.count_documents({'processed_at': {'$gte': since}})
     # processed today (UTC day)
@@ -101,6 +226,16 @@ def get_dashboard_stats(days=5):
     ])
     processed_by_operator = [{'operator': doc['_id'] or '(unknown)', 'count': doc['count']} for doc in proc_by_op_cursor]
 
+    if include_archived:
+        archived_total, archived_by_op = archive.archived_counts('processed')
+        archived_recent, _ = archive.archived_counts('processed', since=since)
+        total_processed += archived_total
+        processed_recent += archived_recent
+        by_op = {p['operator']: p['count'] for p in processed_by_operator}
+        for op, n in archived_by_op.items():
+            by_op[op] = by_op.get(op, 0) + n
+        processed_by_operator = [{'operator': op, 'count': n} for op, n in sorted(by_op.items(), key=lambda kv: -kv[1])]
+
     # Top errors (from exceptions.error string)
     top_errors_cursor = exceptions.aggregate([
         {'$match': {'error': {'$exists': True}}},
@@ -110,6 +245,12 @@ def get_dashboard_stats(days=5):
     ])
     top_errors = [{'error': doc['_id'] or '(none)', 'count': doc['count']} for doc in top_errors_cursor]
 
+    # Exact per-currency totals, covered by the (currency, amount) index
+    totals_by_currency = {
+        'exceptions': currency_totals(exceptions),
+        'processed': currency_totals(processed),
+    }
+
     # Average resolution time (processed.processed_at - processed.created_at) in seconds
     # Only consider processed docs that have created_at and processed_at
     avg_pipeline = [
@@ -143,7 +284,9 @@ def get_dashboard_stats(days=5):
     return {
         'ok': True,
         'generated_at': now.isoformat() + 'Z',
+        'include_archived': include_archived,
         'total_exceptions': total_exceptions,
+        'total_occurrences': total_occurrences,
         'total_processed': total_processed,
         'processed_recent_days': processed_recent,
         'processed_today': processed_today,
@@ -151,9 +294,29 @@ def get_dashboard_stats(days=5):
         'exceptions_by_message_type': exceptions_by_message_type,
         'processed_by_operator': processed_by_operator,
         'top_errors': top_errors,
+        'totals_by_currency': totals_by_currency,
         'exceptions_trend': trend
     }
 
+# (days, include_archived) -> (computed at, stats, etag); shared by every client polling the dashboard
+DASHBOARD_CACHE_SECONDS = float(os.getenv('DASHBOARD_CACHE_SECONDS', 10))
+_dashboard_cache = {}
+
+def cached_dashboard_stats(days, include_archived=False):
+    """
+    get_dashboard_stats(), recomputed at most every DASHBOARD_CACHE_SECONDS, plus an
+    ETag over the numbers (not generated_at) so unchanged results can be answered with 304.
+    """
+    key = (days, include_archived)
+    entry = _dashboard_cache.get(key)
+    if entry and time.monotonic() - entry[0] < DASHBOARD_CACHE_SECONDS:
+        return entry[1], entry[2]
+    stats = get_dashboard_stats(days=days, include_archived=include_archived)
+    numbers = {k: v for k, v in stats.items() if k != 'generated_at'}
+    etag = hashlib.sha1(app.json.dumps(numbers, sort_keys=True).encode('utf-8')).hexdigest()
+    _dashboard_cache[key] = (time.monotonic(), stats, etag)
+    return stats, etag
+
 # --- API endpoints ---
 @app.route('/api/signup', methods=['POST'])
 def signup():
@@ -182,6 +345,44 @@ def signup():
 def ping():
     return jsonify({'ok': True, 'message': 'ping'})
 
+@app.route('/api/metrics', methods=['GET'])
+def metrics_endpoint():
+    # Prometheus text exposition of request latency and per-route Mongo usage
+    return Response(metrics.registry.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/api/client-metrics', methods=['POST'])
+@jwt_required()
+def client_metrics():
+    # aggregated latency histograms uploaded by the desktop client, exposed via /api/metrics
+    try:
+        merged, dropped = metrics.record_client_timings(request.get_json(silent=True))
+    except ValueError as e:
+        return jsonify({'ok': False, 'error': str(e)}), 400
+    return jsonify({'ok': True, 'merged': merged, 'dropped': dropped})
+
+@app.route('/api/admin/slow_queries', methods=['GET', 'DELETE'])
+@jwt_required()
+def admin_slow_queries():
+    # aggregate/count commands slower than SLOW_QUERY_MS, with their explain plans
+    if request.method == 'DELETE':
+        slow_queries.clear()
+        return jsonify({'ok': True})
+    try:
+        limit = int(request.args.get('limit', 50))
+    except ValueError:
+        limit = 50
+    return jsonify({
+        'ok': True,
+        'threshold_ms': slow_queries.threshold_ms,
+        'slow_queries': slow_queries.entries(limit=max(1, limit))
+    })
+
+@app.route('/api/admin/rate_limits', methods=['GET'])
+@jwt_required()
+def admin_rate_limits():
+    # limiter configuration, in-flight requests per class and allowed / refused counts
+    return jsonify({'ok': True, 'rate_limits': limiter.stats()})
+
 @app.route('/api/login', methods=['POST'])
 def login():
     data = request.json or {}
@@ -210,19 +411,166 @@ def login():
         "username": username
     })
 
+def _exception_filters(args):
+    # optional ?currency=USD&min_amount=&max_amount= (exact, index-backed); ValueError on bad amounts
+    query = {}
+    if args.get('currency'):
+        query['currency'] = args['currency'].upper()
+    for arg, op in (('min_amount', '$gte'), ('max_amount', '$lte')):
+        if args.get(arg):
+            query.setdefault('amount', {})[op] = money.to_decimal128(args[arg])
+    return query
+
 @app.route('/api/exceptions', methods=['GET'])
 def get_exceptions():
-    docs = list(exceptions.find().sort('created_at', -1))
+    try:
+        query = _exception_filters(request.args)
+    except ValueError:
+        return jsonify({'ok': False, 'error': 'min_amount/max_amount must be numbers'}), 400
+    # pass back as changed_since on the next sync
+    watermark = (datetime.utcnow() - SYNC_OVERLAP).isoformat()
+
+    # optional ?changed_since=<watermark of the previous response>: only exceptions added or
+    # changed since then, plus the ids removed since then
+    if request.args.get('changed_since'):
+        try:
+            since = datetime.fromisoformat(request.args['changed_since'])
+        except ValueError:
+            return jsonify({'ok': False, 'error': 'changed_since must be an ISO datetime'}), 400
+        if since < datetime.utcnow() - timedelta(days=TOMBSTONE_RETENTION_DAYS):
+            # removals that old are forgotten; the client has to reload
+            return jsonify({'ok': True, 'resync': True, 'watermark': watermark})
+        query['$or'] = [{'updated_at': {'$gte': since}},
+                        {'updated_at': {'$exists': False}, 'created_at': {'$gte': since}}]
+        docs = list(exceptions.find(query).sort([('created_at', -1), ('_id', -1)]))
+        for d in docs:
+            d['_id'] = str(d['_id'])
+        removed = [str(t['_id']) for t in exception_tombstones.find({'deleted_at': {'$gte': since}}, {'_id': 1})]
+        return jsonify({'ok': True, 'exceptions': docs, 'removed': removed, 'watermark': watermark})
+
+    # optional keyset paging: ?limit=N&after=<next_cursor of the previous page>
+    limit = request.args.get('limit', type=int)
+    if limit is not None:
+        limit = max(1, limit)
+    after = request.args.get('after')
+    if after:
+        try:
+            ts, oid = after.rsplit('|', 1)
+            ts, oid = datetime.fromisoformat(ts), ObjectId(oid)
+        except Exception:
+            return jsonify({'ok': False, 'error': 'Invalid cursor'}), 400
+        query['$or'] = [{'created_at': {'$lt': ts}}, {'created_at': ts, '_id': {'$lt': oid}}]
+
+    cursor = exceptions.find(query).sort([('created_at', -1), ('_id', -1)])
+    if limit:
+        cursor = cursor.limit(limit + 1)
+    docs = list(cursor)
+    next_cursor = None
+    if limit and len(docs) > limit:
+        docs = docs[:limit]
+        last = docs[-1]
+        next_cursor = f"{last['created_at'].isoformat()}|{last['_id']}"
     for d in docs:
         d['_id'] = str(d['_id'])
-    return jsonify({'ok': True, 'exceptions': docs})
+    return jsonify({'ok': True, 'exceptions': docs, 'next_cursor': next_cursor, 'watermark': watermark})
+
+EXPORT_BATCH_SIZE = 1000
+
+@app.route('/api/exceptions/export', methods=['GET'])
+def export_exceptions():
+    # the whole queue (same filters as /api/exceptions) as NDJSON, one exception per
+    # line, streamed straight from the cursor; X-Total-Count lets clients show progress
+    try:
+        query = _exception_filters(request.args)
+    except ValueError:
+        return jsonify({'ok': False, 'error': 'min_amount/max_amount must be numbers'}), 400
+    total = exceptions.count_documents(query)
+    cursor = exceptions.find(query).sort([('created_at', -1), ('_id', -1)]).batch_size(EXPORT_BATCH_SIZE)
+
+    def generate():
+        lines = []
+        for d in cursor:
+            d['_id'] = str(d['_id'])
+            for key, value in d.items():
+                if isinstance(value, datetime):
+                    d[key] = value.isoformat()
+            lines.append(app.json.dumps(d))
+            if len(lines) >= EXPORT_BATCH_SIZE:
+                yield '\n'.join(lines) + '\n'
+                lines = []
+        if lines:
+            yield '\n'.join(lines) + '\n'
+
+    return Response(generate(), mimetype='application/x-ndjson', headers={'X-Total-Count': str(total)})
+
+@app.route('/api/exceptions/<tx_id>', methods=['GET'])
+def get_exception(tx_id):
+    # single queue record; honours If-None-Match with a 304
+    try:
+        oid = ObjectId(tx_id)
+    except InvalidId:
+        return jsonify({'ok': False, 'error': 'Invalid transaction id'}), 400
+    doc = exceptions.find_one({'_id': oid})
+    if not doc:
+        return jsonify({'ok': False, 'error': 'Transaction not found in exceptions'}), 404
+    doc['_id'] = str(doc['_id'])
+    resp = jsonify({'ok': True, 'exception': doc})
+    resp.set_etag(hashlib.sha1(resp.get_data()).hexdigest())
+    return resp.make_conditional(request)
+
+def _arg_flag(name):
+    return request.args.get(name, '').lower() in ('1', 'true', 'yes')
+
+def _arg_date(name):
+    # ISO date or datetime query parameter, None when absent; naive UTC like the stored timestamps
+    value = request.args.get(name)
+    if not value:
+        return None
+    when = datetime.fromisoformat(value)
+    if when.tzinfo is not None:
+        when = when.astimezone(timezone.utc).replace(tzinfo=None)
+    return when
 
 @app.route('/api/processed', methods=['GET'])
 def get_processed():
-    docs = list(processed.find().sort('processed_at', -1))
+    # optional ?since=&until= (ISO dates) and ?include_archived=1 to read archived months too
+    try:
+        since, until = _arg_date('since'), _arg_date('until')
+    except ValueError:
+        return jsonify({'ok': False, 'error': 'since/until must be ISO dates'}), 400
+    query = {}
+    if since or until:
+        query['processed_at'] = {}
+        if since:
+            query['processed_at']['$gte'] = since
+        if until:
+            query['processed_at']['$lt'] = until
+
+    # pass back as since= to fetch only what was processed after this response
+    watermark = (datetime.utcnow() - SYNC_OVERLAP).isoformat()
+    docs = list(processed.find(query).sort('processed_at', -1))
+    if _arg_flag('include_archived'):
+        # archived records are all older than the hot collection, so they go after it
+        docs.extend(archive.iter_archived('processed', since=since, until=until))
     for d in docs:
         d['_id'] = str(d['_id'])
-    return jsonify({'ok': True, 'processed': docs})
+    return jsonify({'ok': True, 'processed': docs, 'watermark': watermark})
+
+@app.route('/api/processed/<tx_id>/pacs008', methods=['GET'])
+def processed_pacs008(tx_id):
+    # the processed record re-converted to an ISO 20022 pacs.008 message
+    try:
+        oid = ObjectId(tx_id)
+    except InvalidId:
+        return jsonify({'ok': False, 'error': 'Invalid transaction id'}), 400
+    doc = processed.find_one({'_id': oid})
+    if not doc:
+        return jsonify({'ok': False, 'error': 'Transaction not found in processed'}), 404
+    try:
+        xml = swift.to_pacs008(doc, msg_id=tx_id)
+    except swift.ConversionError as e:
+        return jsonify({'ok': False, 'errors': e.errors}), 422
+    return Response(xml, mimetype='application/xml')
 
 @app.route('/api/fix', methods=['POST'])
 def fix_transaction():
@@ -246,27 +594,14 @@ def fix_transaction():
     errors = validate_transaction(merged)
     if errors:
         # update the exception record with last_error and keep in queue
-        exceptions.update_one({'_id': ObjectId(tx_id)}, {'$set': {'last_error': errors, 'last_modified_by': operator, 'last_modified_at': datetime.utcnow()}})
+        now = datetime.utcnow()
+        exceptions.update_one({'_id': ObjectId(tx_id)}, {'$set': {'last_error': errors, 'last_modified_by': operator, 'last_modified_at': now, 'updated_at': now}})
         return jsonify({'ok': False, 'errors': errors}), 400
 
-    # Move to processed
-    merged['processed_at'] = datetime.utcnow()
-    merged['processed_by'] = operator
-    res = processed.insert_one(merged)
-
-    # Insert audit log
-    audit.insert_one({
-        'tx_id': tx_id,
-        'operator': operator,
-        'before': {k: v for k, v in orig.items() if k != '_id'},
-        'after': merged,
-        'timestamp': datetime.utcnow()
-    })
-
-    # Remove from exceptions
-    exceptions.delete_one({'_id': ObjectId(tx_id)})
-
-    return jsonify({'ok': True, 'processed_id': str(res.inserted_id)})
+    processed_id = commit_fix(orig, merged, operator)
+    if processed_id is None:
+        return jsonify({'ok': False, 'error': 'Transaction was already processed'}), 409
+    return jsonify({'ok': True, 'processed_id': str(processed_id)})
 
 @app.route('/api/seed', methods=['POST'])
 def seed_data():
@@ -278,10 +613,11 @@ def seed_data():
             'receiver': 'XYZ BANK',
             'beneficiary_name': 'Johnathan Will...',
             'iban': 'GB29NWBK60161331926819',
-            'amount': '5000',
+            **money.amount_fields('5000', 'USD'),
             'currency': 'USD',
             'error': 'Field 59 truncated when converting to MX',
-            'created_at': datetime.utcnow()
+            'created_at': datetime.utcnow(),
+            'updated_at': datetime.utcnow()
         },
         {
             'message_type': 'MT103',
@@ -289,14 +625,15 @@ def seed_data():
             'receiver': 'OTHER BANK',
             'beneficiary_name': '',
             'iban': 'INVALIDIBAN',
-            'amount': '-100',
+            **money.amount_fields('-100', 'EUR'),
             'currency': 'EUR',
             'error': 'Multiple errors detected from MT->MX conversion',
-            'created_at': datetime.utcnow()
+            'created_at': datetime.utcnow(),
+            'updated_at': datetime.utcnow()
         }
     ]
-    res = exceptions.insert_many(sample)
-    return jsonify({'ok': True, 'inserted_count': len(res.inserted_ids)})
+    inserted, collapsed = dedup.insert_exceptions(exceptions, sample)
+    return jsonify({'ok': True, 'inserted_count': inserted, 'duplicate_count': collapsed})
 
 @app.route('/api/dashboard', methods=['GET'])
 def dashboard():
@@ -308,11 +645,14 @@ def dashboard():
     days = max(1, min(days, 365))  # sane bounds
 
     try:
-        stats = get_dashboard_stats(days=days)
-        return jsonify(stats)
+        stats, etag = cached_dashboard_stats(days, _arg_flag('include_archived'))
     except Exception as e:
         # don't expose stack trace in prod; helpful during dev
         return jsonify({'ok': False, 'error': str(e)}), 500
+    # unchanged numbers -> 304, so auto-refreshing clients don't redraw anything
+    resp = jsonify(stats)
+    resp.set_etag(etag)
+    return resp.make_conditional(request)
     
     
 
@@ -352,22 +692,171 @@ def dashboard():
 
 @app.route('/api/operator_stats', methods=['GET'])
 def operator_stats():
-    pipeline = [
-        {"$group": {
-            "_id": "$processed_by",
-            "count": {"$sum": 1},
-            "avg_resolution": {"$avg": {"$subtract": ["$processed_at", "$created_at"]}}
-        }},
-        {"$sort": {"count": -1}}
-    ]
-    results = []
-    for doc in processed.aggregate(pipeline):
-        results.append({
-            "operator": doc["_id"],
-            "count": doc["count"],
-            "avg_resolution_seconds": doc["avg_resolution"] / 1000.0 if doc.get("avg_resolution") else None
-        })
+    # optional ?since=YYYY-MM-DD&until=YYYY-MM-DD (UTC days, inclusive) and ?by=day
+    since = request.args.get('since')
+    until = request.args.get('until')
+    for value in (since, until):
+        if value:
+            try:
+                datetime.strptime(value, '%Y-%m-%d')
+            except ValueError:
+                return jsonify({"ok": False, "error": "since/until must be YYYY-MM-DD"}), 400
+    by_day = request.args.get('by') == 'day'
+
+    # merged from per-operator daily t-digests, not a scan of `processed`
+    results = sketches.operator_percentiles(resolution_sketches, since=since, until=until, by_day=by_day)
     return jsonify({"ok": True, "stats": results})
 
+# --- Reports ---
+EXCEPTION_REPORT_COLUMNS = [
+    ('_id', 'ID'), ('created_at', 'Created'), ('message_type', 'Type'), ('sender', 'Sender'),
+    ('receiver', 'Receiver'), ('beneficiary_name', 'Beneficiary'), ('amount', 'Amount'),
+    ('currency', 'Currency'), ('error', 'Error'),
+]
+PROCESSED_REPORT_COLUMNS = [
+    ('_id', 'ID'), ('processed_at', 'Processed'), ('processed_by', 'Operator'), ('sender', 'Sender'),
+    ('receiver', 'Receiver'), ('beneficiary_name', 'Beneficiary'), ('amount', 'Amount'), ('currency', 'Currency'),
+]
+
+def _table_section(title, columns, docs):
+    fields = [f for f, _ in columns]
+    return reports.Section(title, [h for _, h in columns], ([d.get(f) for f in fields] for d in docs))
+
+def _exceptions_report_params(raw):
+    params = {}
+    if raw.get('currency'):
+        params['currency'] = str(raw['currency']).upper()
+    for name in ('min_amount', 'max_amount'):
+        if raw.get(name) not in (None, ''):
+            params[name] = str(money.to_decimal(raw[name]))
+    return params
+
+def _exceptions_report(params):
+    cursor = exceptions.find(_exception_filters(params)).sort([('created_at', -1), ('_id', -1)]).batch_size(EXPORT_BATCH_SIZE)
+    return 'Exception Queue', [_table_section('Exceptions', EXCEPTION_REPORT_COLUMNS, cursor)]
+
+def _processed_report_params(raw):
+    params = {}
+    for name in ('since', 'until'):
+        if raw.get(name):
+            params[name] = datetime.fromisoformat(str(raw[name])).isoformat()
+    if str(raw.get('include_archived', '')).lower() in ('1', 'true', 'yes'):
+        params['include_archived'] = True
+    return params
+
+def _processed_report(params):
+    since = datetime.fromisoformat(params['since']) if 'since' in params else None
+    until = datetime.fromisoformat(params['until']) if 'until' in params else None
+    query = {}
+    if since or until:
+        query['processed_at'] = {}
+        if since:
+            query['processed_at']['$gte'] = since
+        if until:
+            query['processed_at']['$lt'] = until
+    docs = processed.find(query).sort('processed_at', -1).batch_size(EXPORT_BATCH_SIZE)
+    if params.get('include_archived'):
+        docs = itertools.chain(docs, archive.iter_archived('processed', since=since, until=until))
+    return 'Processed Transactions', [_table_section('Processed', PROCESSED_REPORT_COLUMNS, docs)]
+
+def _dashboard_report_params(raw):
+    days = int(raw.get('days') or 30)
+    if not 1 <= days <= 365:
+        raise ValueError('days must be between 1 and 365')
+    params = {'days': days}
+    if str(raw.get('include_archived', '')).lower() in ('1', 'true', 'yes'):
+        params['include_archived'] = True
+    return params
+
+def _dashboard_report(params):
+    stats = get_dashboard_stats(days=params['days'], include_archived=params.get('include_archived', False))
+    summary = [
+        ['Total exceptions', stats['total_exceptions']],
+        ['Total processed', stats['total_processed']],
+        [f"Processed in the last {params['days']} days", stats['processed_recent_days']],
+        ['Processed today', stats['processed_today']],
+        ['Average resolution (seconds)', round(stats['avg_resolution_seconds'] or 0, 1)],
+    ]
+    totals = [[kind, t['currency'], t['count'], t['total']]
+              for kind, rows in stats['totals_by_currency'].items() for t in rows]
+    return f"Dashboard ({params['days']} days)", [
+        reports.Section('Summary', ['Metric', 'Value'], summary),
+        reports.Section('Exceptions by message type', ['Message type', 'Count'],
+                        [[t['message_type'], t['count']] for t in stats['exceptions_by_message_type']]),
+        reports.Section('Processed by operator', ['Operator', 'Count'],
+                        [[p['operator'], p['count']] for p in stats['processed_by_operator']]),
+        reports.Section('Top errors', ['Error', 'Count'], [[e['error'], e['count']] for e in stats['top_errors']]),
+        reports.Section('Totals by currency', ['Collection', 'Currency', 'Count', 'Total'], totals),
+        reports.Section('Exceptions trend', ['Day', 'New exceptions'], [[d, n] for d, n in stats['exceptions_trend'].items()]),
+    ]
+
+report_service = reports.ReportService({
+    'exceptions': (_exceptions_report_params, _exceptions_report),
+    'processed': (_processed_report_params, _processed_report),
+    'dashboard': (_dashboard_report_params, _dashboard_report),
+})
+
+@app.route('/api/reports', methods=['GET', 'POST'])
+@jwt_required()
+def report_jobs():
+    # POST {"kind": "exceptions", "format": "pdf", "params": {...}, "operator": "..."} starts (or reuses) a report
+    if request.method == 'GET':
+        return jsonify({'ok': True, 'reports': report_service.jobs()})
+    data = request.json or {}
+    try:
+        job = report_service.submit(data.get('kind'), data.get('format'), data.get('params') or {},
+                                    requested_by=data.get('operator'))
+    except ValueError as e:
+        return jsonify({'ok': False, 'error': str(e)}), 400
+    return jsonify({'ok': True, 'report': job}), 200 if job['status'] == 'done' else 202
+
+@app.route('/api/reports/<report_id>', methods=['GET'])
+@jwt_required()
+def report_status(report_id):
+    job = report_service.get(report_id)
+    if not job:
+        return jsonify({'ok': False, 'error': 'Report not found or expired'}), 404
+    return jsonify({'ok': True, 'report': job})
+
+@app.route('/api/reports/<report_id>/download', methods=['GET'])
+@jwt_required()
+def report_download(report_id):
+    job = report_service.get(report_id)
+    if not job:
+        return jsonify({'ok': False, 'error': 'Report not found or expired'}), 404
+    artifact = report_service.artifact(report_id)
+    if not artifact:
+        return jsonify({'ok': False, 'error': f"Report is {job['status']}", 'report': job}), 409
+    path, name, mimetype = artifact
+    return send_file(path, mimetype=mimetype, as_attachment=True, download_name=name, conditional=True)
+
+# --- Auto-remediation ---
+remediation_engine = remediation.RemediationEngine(exceptions, validate_transaction, commit_fix)
+
+@app.route('/api/remediation/rules', methods=['GET'])
+@jwt_required()
+def remediation_rules():
+    return jsonify({'ok': True, 'rules': remediation_engine.rules_info()})
+
+@app.route('/api/remediation/run', methods=['GET', 'POST'])
+@jwt_required()
+def remediation_run():
+    # POST {"dry_run": true, "rules": ["iban-format"]} starts a run as the JWT subject; GET polls the latest one
+    if request.method == 'GET':
+        run = remediation_engine.status()
+        if not run:
+            return jsonify({'ok': False, 'error': 'No remediation run yet'}), 404
+        return jsonify({'ok': True, 'run': run})
+    data = request.json or {}
+    try:
+        run = remediation_engine.start(dry_run=bool(data.get('dry_run')), rule_names=data.get('rules'),
+                                       requested_by=get_jwt_identity())
+    except ValueError as e:
+        return jsonify({'ok': False, 'error': str(e)}), 400
+    if run is None:
+        return jsonify({'ok': False, 'error': 'A remediation run is already in progress',
+                        'run': remediation_engine.status()}), 409
+    return jsonify({'ok': True, 'run': run}), 202
+
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5000, debug=True)
\ No newline at end of file
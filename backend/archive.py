@@ -0,0 +1,203 @@
+"""
+Tiered archival of `processed` and `audit_logs`.
+
+Records older than a cutoff are moved out of MongoDB into compressed,
+month-partitioned JSONL files under ARCHIVE_DIR:
+
+    archive/processed/2025-01.jsonl.zst
+    archive/processed/manifest.json
+
+zstandard is used when installed, gzip otherwise. Each archival batch is
+appended as its own compressed frame, recorded in the manifest, and only then
+deleted from the hot collection, so an interrupted run can be resumed without
+losing or duplicating records. The manifest also keeps per-day counts so the
+dashboard can include archived history without opening any files.
+
+Run with `python archive.py --older-than-days 180`.
+"""
+import gzip
+import io
+import json
+import os
+from datetime import datetime, timedelta
+
+from bson import ObjectId, json_util
+
+try:
+    import zstandard
+except ImportError:  # optional, falls back to gzip
+    zstandard = None
+
+ARCHIVE_DIR = os.getenv('ARCHIVE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'archive'))
+
+# collection -> (time field used for partitioning, operator field counted in the manifest)
+ARCHIVED_COLLECTIONS = {
+    'processed': ('processed_at', 'processed_by'),
+    'audit_logs': ('timestamp', 'operator'),
+}
+
+BATCH_SIZE = 1000
+
+_JSON_OPTIONS = json_util.CANONICAL_JSON_OPTIONS
+
+
+# --- compression ---
+def _extension():
+    return '.jsonl.zst' if zstandard else '.jsonl.gz'
+
+
+def _compress(data):
+    if zstandard:
+        return zstandard.ZstdCompressor(level=10).compress(data)
+    return gzip.compress(data)
+
+
+def _decompress(path, length):
+    with open(path, 'rb') as fh:
+        raw = fh.read(length)
+    if path.endswith('.zst'):
+        if zstandard is None:
+            raise RuntimeError(f'{path} is zstd-compressed but zstandard is not installed')
+        reader = zstandard.ZstdDecompressor().stream_reader(io.BytesIO(raw), read_across_frames=True)
+        return io.TextIOWrapper(reader, encoding='utf-8')
+    return io.TextIOWrapper(gzip.GzipFile(fileobj=io.BytesIO(raw)), encoding='utf-8')
+
+
+# --- manifest ---
+def _collection_dir(name):
+    return os.path.join(ARCHIVE_DIR, name)
+
+
+def load_manifest(name):
+    path = os.path.join(_collection_dir(name), 'manifest.json')
+    if not os.path.exists(path):
+        return {'months': {}, 'pending_delete': []}
+    with open(path) as fh:
+        return json.load(fh)
+
+
+def _save_manifest(name, manifest):
+    path = os.path.join(_collection_dir(name), 'manifest.json')
+    tmp = path + '.tmp'
+    with open(tmp, 'w') as fh:
+        json.dump(manifest, fh, indent=1, sort_keys=True)
+        fh.flush()
+        os.fsync(fh.fileno())
+    os.replace(tmp, path)
+
+
+# --- archival job ---
+def archive_collection(coll, name, cutoff, batch_size=BATCH_SIZE):
+    """Move every document of `coll` whose time field is older than `cutoff` into the archive."""
+    time_field, operator_field = ARCHIVED_COLLECTIONS[name]
+    os.makedirs(_collection_dir(name), exist_ok=True)
+    manifest = load_manifest(name)
+
+    # finish the deletes of a batch that was written but not removed last time
+    if manifest['pending_delete']:
+        coll.delete_many({'_id': {'$in': [ObjectId(i) for i in manifest['pending_delete']]}})
+        manifest['pending_delete'] = []
+        _save_manifest(name, manifest)
+
+    moved = 0
+    cursor = coll.find({time_field: {'$lt': cutoff}}).sort(time_field, 1).batch_size(batch_size)
+    batch, month = [], None
+    for doc in cursor:
+        doc_month = doc[time_field].strftime('%Y-%m')
+        if batch and (doc_month != month or len(batch) >= batch_size):
+            moved += _write_batch(coll, name, manifest, month, batch, time_field, operator_field)
+            batch = []
+        month = doc_month
+        batch.append(doc)
+    if batch:
+        moved += _write_batch(coll, name, manifest, month, batch, time_field, operator_field)
+    return moved
+
+
+def _write_batch(coll, name, manifest, month, docs, time_field, operator_field):
+    entry = manifest['months'].get(month)
+    if entry is None:
+        entry = manifest['months'][month] = {'file': month + _extension(), 'bytes': 0, 'count': 0, 'days': {}}
+    path = os.path.join(_collection_dir(name), entry['file'])
+
+    payload = ''.join(json_util.dumps(d, json_options=_JSON_OPTIONS) + '\n' for d in docs).encode('utf-8')
+    frame = _compress(payload)
+    with open(path, 'ab') as fh:
+        # drop anything past the last committed frame (an interrupted append)
+        fh.truncate(entry['bytes'])
+        fh.seek(entry['bytes'])
+        fh.write(frame)
+        fh.flush()
+        os.fsync(fh.fileno())
+
+    entry['bytes'] += len(frame)
+    entry['count'] += len(docs)
+    for d in docs:
+        day = entry['days'].setdefault(d[time_field].strftime('%Y-%m-%d'), {'count': 0, 'by_operator': {}})
+        day['count'] += 1
+        op = d.get(operator_field) or '(unknown)'
+        day['by_operator'][op] = day['by_operator'].get(op, 0) + 1
+    manifest['pending_delete'] = [str(d['_id']) for d in docs]
+    _save_manifest(name, manifest)
+
+    coll.delete_many({'_id': {'$in': [d['_id'] for d in docs]}})
+    manifest['pending_delete'] = []
+    _save_manifest(name, manifest)
+    return len(docs)
+
+
+# --- query layer ---
+def iter_archived(name, since=None, until=None, newest_first=True):
+    """Yield archived documents with since <= time field < until, month by month."""
+    time_field, _ = ARCHIVED_COLLECTIONS[name]
+    manifest = load_manifest(name)
+    months = sorted(manifest['months'], reverse=newest_first)
+    for month in months:
+        if since and month < since.strftime('%Y-%m'):
+            continue
+        if until and month > until.strftime('%Y-%m'):
+            continue
+        entry = manifest['months'][month]
+        path = os.path.join(_collection_dir(name), entry['file'])
+        docs = []
+        for line in _decompress(path, entry['bytes']):
+            doc = json_util.loads(line, json_options=_JSON_OPTIONS)
+            ts = doc.get(time_field)
+            if since and ts < since:
+                continue
+            if until and ts >= until:
+                continue
+            docs.append(doc)
+        docs.sort(key=lambda d: d[time_field], reverse=newest_first)
+        yield from docs
+
+
+def archived_counts(name, since=None):
+    """Total and per-operator archived counts from the manifest (no file access)."""
+    manifest = load_manifest(name)
+    since_day = since.strftime('%Y-%m-%d') if since else None
+    total, by_operator = 0, {}
+    for entry in manifest['months'].values():
+        for day, stats in entry['days'].items():
+            if since_day and day < since_day:
+                continue
+            total += stats['count']
+            for op, n in stats['by_operator'].items():
+                by_operator[op] = by_operator.get(op, 0) + n
+    return total, by_operator
+
+
+if __name__ == '__main__':
+    import argparse
+
+    from app1 import db
+
+    parser = argparse.ArgumentParser(description='Move old processed / audit_logs records to compressed monthly files')
+    parser.add_argument('--older-than-days', type=int, default=180)
+    parser.add_argument('--collections', nargs='+', default=list(ARCHIVED_COLLECTIONS), choices=list(ARCHIVED_COLLECTIONS))
+    args = parser.parse_args()
+
+    cutoff = datetime.utcnow() - timedelta(days=args.older_than_days)
+    for name in args.collections:
+        n = archive_collection(db[name], name, cutoff)
+        print(f'{name}: archived {n} records older than {cutoff.isoformat()}Z')
@@ -0,0 +1,143 @@
+"""
+Content-hash deduplication of incoming exceptions.
+
+Upstream retries re-emit the same failed payment. Every exception carries a
+`fingerprint`: sha256 over the canonical form of its payment fields
+(FINGERPRINT_FIELDS; case, spacing and amount formatting don't count). A
+unique partial index on it keeps one queue record per payment.
+insert_exceptions() upserts by fingerprint. A new payment is inserted with
+`occurrences: 1`, and a repeat only bumps `occurrences` and `last_seen_at`.
+
+Records written before fingerprinting (or by a producer that bypassed
+insert_exceptions) are fingerprinted and merged with
+`python dedup.py` (`--dry-run` to only count). The oldest copy is kept, its
+occurrences become the sum of the group's, and the others are removed with a
+tombstone so syncing clients drop them.
+"""
+import hashlib
+from datetime import datetime
+
+from pymongo import DeleteOne, ReplaceOne, UpdateOne
+from pymongo.errors import BulkWriteError
+
+import money
+
+FINGERPRINT_FIELDS = ('message_type', 'sender', 'receiver', 'iban', 'amount', 'currency', 'beneficiary_name')
+BATCH_SIZE = 1000
+DUPLICATE_KEY = 11000
+
+
+def _canonical(field, value):
+    if value is None:
+        return ''
+    if field == 'amount':
+        try:
+            # 5000, '5000.00' and Decimal128('5000.00') are the same amount
+            return format(money.to_decimal(value).normalize(), 'f')
+        except ValueError:
+            return str(value).strip()
+    text = ' '.join(str(value).split()).upper()
+    return text.replace(' ', '') if field == 'iban' else text
+
+
+def fingerprint(doc):
+    """Hex sha256 of the canonical payment fields of `doc`."""
+    canonical = '\x1f'.join(_canonical(field, doc.get(field)) for field in FINGERPRINT_FIELDS)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+def ensure_index(coll):
+    # partial, so records that predate fingerprinting don't collide on a missing value
+    coll.create_index([('fingerprint', 1)], unique=True,
+                      partialFilterExpression={'fingerprint': {'$exists': True}})
+
+
+def _upsert(doc, now):
+    fields = {k: v for k, v in doc.items()
+              if k not in ('_id', 'fingerprint', 'occurrences', 'last_seen_at', 'updated_at')}
+    fields.setdefault('created_at', now)
+    # the upsert's equality filter stores the fingerprint on insert
+    return UpdateOne({'fingerprint': fingerprint(doc)}, {
+        '$setOnInsert': fields,
+        '$inc': {'occurrences': 1},
+        '$set': {'last_seen_at': now, 'updated_at': now},
+    }, upsert=True)
+
+
+def insert_exceptions(coll, docs):
+    """
+    Add `docs` to the queue, collapsing repeats of a queued payment into its
+    occurrence counter. Returns (new records, repeats collapsed).
+    """
+    now = datetime.utcnow()
+    ops = [_upsert(doc, now) for doc in docs]
+    inserted = collapsed = 0
+    for start in range(0, len(ops), BATCH_SIZE):
+        batch = ops[start:start + BATCH_SIZE]
+        try:
+            res = coll.bulk_write(batch, ordered=False)
+        except BulkWriteError as e:
+            # two upserts of one new fingerprint raced; the loser finds the winner's record on retry
+            errors = e.details['writeErrors']
+            if any(err['code'] != DUPLICATE_KEY for err in errors):
+                raise
+            inserted += e.details['nUpserted']
+            collapsed += e.details['nMatched']
+            res = coll.bulk_write([batch[err['index']] for err in errors], ordered=False)
+        inserted += res.upserted_count
+        collapsed += res.matched_count
+    return inserted, collapsed
+
+
+def backfill(coll, tombstones, dry_run=False):
+    """
+    Fingerprint records that lack one and merge records sharing a fingerprint.
+    Returns (fingerprinted, merged away).
+    """
+    unfingerprinted = {}  # _id -> fingerprint still to be stored
+    groups = {}  # fingerprint -> [(created_at, _id, occurrences)]
+    projection = {field: 1 for field in FINGERPRINT_FIELDS + ('fingerprint', 'occurrences', 'created_at')}
+    for doc in coll.find({}, projection):
+        fp = doc.get('fingerprint')
+        if fp is None:
+            fp = unfingerprinted[doc['_id']] = fingerprint(doc)
+        groups.setdefault(fp, []).append((doc.get('created_at') or datetime.max, doc['_id'], doc.get('occurrences') or 1))
+    fingerprinted = len(unfingerprinted)
+
+    now = datetime.utcnow()
+    totals, deletes, tombs = [], [], []
+    for copies in groups.values():
+        if len(copies) == 1:
+            continue
+        # keep the oldest copy, so the queue position and created_at don't move
+        copies.sort(key=lambda c: (c[0], c[1]))
+        totals.append(UpdateOne({'_id': copies[0][1]}, {'$set': {'occurrences': sum(c[2] for c in copies),
+                                                                  'last_seen_at': now, 'updated_at': now}}))
+        for _, _id, _ in copies[1:]:
+            unfingerprinted.pop(_id, None)
+            deletes.append(DeleteOne({'_id': _id}))
+            tombs.append(ReplaceOne({'_id': _id}, {'_id': _id, 'deleted_at': now}, upsert=True))
+    merged = len(deletes)
+    ops = [UpdateOne({'_id': _id}, {'$set': {'fingerprint': fp}}) for _id, fp in unfingerprinted.items()] + totals
+
+    if not dry_run:
+        # deletes first, so fingerprinting the survivors can't hit the unique index
+        for target, batch_ops in ((coll, deletes), (tombstones, tombs), (coll, ops)):
+            for start in range(0, len(batch_ops), BATCH_SIZE):
+                target.bulk_write(batch_ops[start:start + BATCH_SIZE], ordered=False)
+        ensure_index(coll)
+    return fingerprinted, merged
+
+
+if __name__ == '__main__':
+    import argparse
+
+    from app1 import exception_tombstones, exceptions
+
+    parser = argparse.ArgumentParser(description='Fingerprint queued exceptions and merge duplicates')
+    parser.add_argument('--dry-run', action='store_true')
+    args = parser.parse_args()
+
+    fingerprinted, merged = backfill(exceptions, exception_tombstones, dry_run=args.dry_run)
+    verb = 'would' if args.dry_run else 'did'
+    print(f'exceptions: {verb} fingerprint {fingerprinted}, {verb} merge away {merged} duplicates')
@@ -0,0 +1,303 @@
+"""
+Request timing and MongoDB command instrumentation.
+
+Everything is kept in-process and rendered in the Prometheus text format by
+the /api/metrics endpoint. Mongo commands are attributed to the Flask route
+that issued them through a thread-local request context (pymongo calls
+command listeners on the thread running the operation). Clients can upload
+their own latency histograms (record_client_timings), which are merged into
+client_duration_seconds so client and server latency sit side by side.
+"""
+import os
+import re
+import threading
+import time
+from bisect import bisect_left
+
+import bson
+from flask import request
+from flask.json.provider import DefaultJSONProvider
+from pymongo import monitoring
+
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+HELP = {
+    'http_request_duration_seconds': 'Time spent handling a request, by route',
+    'http_request_db_seconds': 'Time spent in MongoDB commands per request, by route',
+    'http_request_serialize_seconds': 'Time spent serializing JSON responses per request, by route',
+    'mongo_command_duration_seconds': 'MongoDB command latency, by command and route',
+    'mongo_commands_total': 'MongoDB commands issued, by command and route',
+    'mongo_command_failures_total': 'MongoDB commands that failed, by command and route',
+    'mongo_command_bytes_total': 'BSON bytes sent to / received from MongoDB, by command and route',
+    'client_duration_seconds': 'Latency measured by the desktop client, by kind, action and phase',
+    'client_series_dropped_total': 'Uploaded client histograms dropped because client_duration_seconds hit its series cap',
+    'remediation_fixes_total': 'Exceptions processed by the auto-remediation engine, by rule',
+    'rate_limited_total': 'Requests refused with 429, by priority class, route and reason (rate, concurrency, shed)',
+    'remediation_unresolved_total': 'Exceptions auto-remediation rules applied to that still failed validation',
+}
+
+# uploaded client histograms: label values are client-chosen, so keep them bounded
+CLIENT_KINDS = {'api', 'render'}
+CLIENT_PHASES = {'total', 'dns', 'connect', 'ttfb', 'download'}
+CLIENT_ACTION = re.compile(r'[\w .:/<>()+-]{1,80}')
+CLIENT_MAX_HISTOGRAMS = 500  # per upload
+CLIENT_MAX_SERIES = int(os.getenv('CLIENT_METRICS_MAX_SERIES', 2000))  # client_duration_seconds series in total
+
+# sizing a command means re-encoding its BSON, so it is opt-in
+COMMAND_BYTES = os.getenv('MONGO_COMMAND_BYTES', '').lower() in ('1', 'true', 'yes')
+
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus sense."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._series = {}  # histogram name -> number of label sets
+        self._counters = {}
+
+    def observe(self, name, labels, value):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            hist = self._histograms.get(key)
+            if hist is None:
+                hist = self._histograms[key] = Histogram()
+                self._series[name] = self._series.get(name, 0) + 1
+            hist.observe(value)
+
+    def merge(self, name, labels, counts, total, count, max_series=None):
+        """
+        Add pre-bucketed observations (bucket counts over LATENCY_BUCKETS, plus
+        +Inf). With max_series, a new series is only created while `name` has
+        fewer than that many; returns False when the observations were dropped.
+        """
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            hist = self._histograms.get(key)
+            if hist is None:
+                if max_series is not None and self._series.get(name, 0) >= max_series:
+                    return False
+                hist = self._histograms[key] = Histogram()
+                self._series[name] = self._series.get(name, 0) + 1
+            hist.counts = [a + b for a, b in zip(hist.counts, counts)]
+            hist.sum += total
+            hist.count += count
+            return True
+
+    def inc(self, name, labels, value=1):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def render(self):
+        with self._lock:
+            histograms = {k: (h.buckets, list(h.counts), h.sum, h.count) for k, h in self._histograms.items()}
+            counters = dict(self._counters)
+
+        lines = []
+        seen = set()
+
+        def header(name, kind):
+            if name not in seen:
+                seen.add(name)
+                if name in HELP:
+                    lines.append(f'# HELP {name} {HELP[name]}')
+                lines.append(f'# TYPE {name} {kind}')
+
+        for (name, labels), (buckets, counts, total, count) in sorted(histograms.items()):
+            header(name, 'histogram')
+            cumulative = 0
+            for bound, n in zip(buckets, counts):
+                cumulative += n
+                lines.append(f'{name}_bucket{_labels(labels, le=bound)} {cumulative}')
+            lines.append(f'{name}_bucket{_labels(labels, le="+Inf")} {count}')
+            lines.append(f'{name}_sum{_labels(labels)} {total}')
+            lines.append(f'{name}_count{_labels(labels)} {count}')
+
+        for (name, labels), value in sorted(counters.items()):
+            header(name, 'counter')
+            lines.append(f'{name}{_labels(labels)} {value}')
+
+        return '\n'.join(lines) + '\n'
+
+
+def _labels(labels, **extra):
+    pairs = list(labels) + list(extra.items())
+    if not pairs:
+        return ''
+    body = ','.join('{}="{}"'.format(k, str(v).replace('\\', '\\\\').replace('"', '\\"')) for k, v in pairs)
+    return '{' + body + '}'
+
+
+registry = Registry()
+
+
+def record_client_timings(payload):
+    """
+    Merge a client upload ({'buckets': [...], 'histograms': [{kind, action, phase,
+    counts, sum, count}]}) into client_duration_seconds. Raises ValueError on
+    anything malformed, before merging any of it. Once the metric has
+    CLIENT_MAX_SERIES label sets, histograms for new ones are dropped (and
+    counted) so uploads can't grow the registry without bound. Returns
+    (histograms merged, histograms dropped).
+    """
+    if not isinstance(payload, dict) or list(payload.get('buckets') or []) != list(LATENCY_BUCKETS):
+        raise ValueError(f'buckets must be {list(LATENCY_BUCKETS)}')
+    histograms = payload.get('histograms')
+    if not isinstance(histograms, list) or len(histograms) > CLIENT_MAX_HISTOGRAMS:
+        raise ValueError(f'histograms must be a list of at most {CLIENT_MAX_HISTOGRAMS}')
+    parsed = []
+    for h in histograms:
+        try:
+            kind, action, phase = h['kind'], h['action'], h['phase']
+            counts = [int(c) for c in h['counts']]
+            total, count = float(h['sum']), int(h['count'])
+        except (KeyError, TypeError, ValueError):
+            raise ValueError('each histogram needs kind, action, phase, counts, sum and count')
+        if kind not in CLIENT_KINDS or phase not in CLIENT_PHASES:
+            raise ValueError(f'kind must be one of {sorted(CLIENT_KINDS)}, phase one of {sorted(CLIENT_PHASES)}')
+        if not isinstance(action, str) or not CLIENT_ACTION.fullmatch(action):
+            raise ValueError(f'invalid action {action!r}')
+        if len(counts) != len(LATENCY_BUCKETS) + 1 or min(counts) < 0 or sum(counts) != count or total < 0:
+            raise ValueError(f'inconsistent histogram for {action!r}')
+        parsed.append(({'kind': kind, 'action': action, 'phase': phase}, counts, total, count))
+    merged = sum(registry.merge('client_duration_seconds', labels, counts, total, count, max_series=CLIENT_MAX_SERIES)
+                 for labels, counts, total, count in parsed)
+    dropped = len(parsed) - merged
+    if dropped:
+        registry.inc('client_series_dropped_total', {}, dropped)
+    return merged, dropped
+
+
+# --- Per-request context ---
+_local = threading.local()
+
+
+class RequestContext:
+    def __init__(self, route):
+        self.route = route
+        self.started = time.perf_counter()
+        self.db_seconds = 0.0
+        self.db_commands = 0
+        self.db_bytes = None  # set once a sizing CommandMetrics charges the request
+        self.serialize_seconds = 0.0
+
+
+def current():
+    """The RequestContext of the request running on this thread, or None."""
+    return getattr(_local, 'ctx', None)
+
+
+def current_route():
+    ctx = current()
+    return ctx.route if ctx else '(background)'
+
+
+class CommandMetrics(monitoring.CommandListener):
+    """
+    Counts and times every command and charges it to the current request.
+    With `sizes` (MONGO_COMMAND_BYTES) it also measures the BSON sent and
+    received, at the cost of encoding each command and reply a second time.
+    """
+
+    def __init__(self, sizes=COMMAND_BYTES):
+        self.sizes = sizes
+
+    def started(self, event):
+        if self.sizes:
+            self._count_bytes(event, event.command, 'sent')
+
+    def succeeded(self, event):
+        self._finish(event)
+        if self.sizes:
+            self._count_bytes(event, event.reply, 'received')
+
+    def _count_bytes(self, event, doc, direction):
+        size = len(bson.encode(doc))
+        registry.inc('mongo_command_bytes_total', {'command': event.command_name, 'route': current_route(), 'direction': direction}, size)
+        ctx = current()
+        if ctx:
+            ctx.db_bytes = (ctx.db_bytes or 0) + size
+
+    def failed(self, event):
+        self._finish(event)
+        registry.inc('mongo_command_failures_total', {'command': event.command_name, 'route': current_route()})
+
+    def _finish(self, event):
+        seconds = event.duration_micros / 1e6
+        labels = {'command': event.command_name, 'route': current_route()}
+        registry.observe('mongo_command_duration_seconds', labels, seconds)
+        registry.inc('mongo_commands_total', labels)
+        ctx = current()
+        if ctx:
+            ctx.db_seconds += seconds
+            ctx.db_commands += 1
+
+
+class TimedJSONProvider(DefaultJSONProvider):
+    """Default Flask JSON provider that also records serialization time."""
+
+    def dumps(self, obj, **kwargs):
+        start = time.perf_counter()
+        try:
+            return super().dumps(obj, **kwargs)
+        finally:
+            ctx = current()
+            if ctx:
+                ctx.serialize_seconds += time.perf_counter() - start
+
+
+# --- Flask wiring ---
+def install(app):
+    """
+    Register the request hooks on `app`.
+
+    SERVER_TIMING_THRESHOLD_MS (env or app.config) enables a Server-Timing
+    header on requests slower than the threshold; 0 adds it to every request.
+    """
+    threshold = app.config.get('SERVER_TIMING_THRESHOLD_MS', os.getenv('SERVER_TIMING_THRESHOLD_MS'))
+    threshold = float(threshold) / 1000.0 if threshold not in (None, '') else None
+
+    @app.before_request
+    def _start_request_timer():
+        route = request.url_rule.rule if request.url_rule else '(unmatched)'
+        _local.ctx = RequestContext(route)
+
+    @app.after_request
+    def _record_request(response):
+        ctx = current()
+        if ctx is None:
+            return response
+        elapsed = time.perf_counter() - ctx.started
+        registry.observe('http_request_duration_seconds',
+                         {'method': request.method, 'route': ctx.route, 'status': response.status_code}, elapsed)
+        registry.observe('http_request_db_seconds', {'route': ctx.route}, ctx.db_seconds)
+        registry.observe('http_request_serialize_seconds', {'route': ctx.route}, ctx.serialize_seconds)
+
+        if threshold is not None and elapsed >= threshold:
+            app_seconds = max(elapsed - ctx.db_seconds - ctx.serialize_seconds, 0.0)
+            db_desc = f'{ctx.db_commands} commands' + (f', {ctx.db_bytes} bytes' if ctx.db_bytes is not None else '')
+            response.headers['Server-Timing'] = ', '.join([
+                f'db;dur={ctx.db_seconds * 1000:.1f};desc="{db_desc}"',
+                f'serialize;dur={ctx.serialize_seconds * 1000:.1f}',
+                f'app;dur={app_seconds * 1000:.1f}',
+                f'total;dur={elapsed * 1000:.1f}',
+            ])
+        return response
+
+    @app.teardown_request
+    def _clear_request(exc):
+        _local.ctx = None
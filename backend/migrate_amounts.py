@@ -0,0 +1,53 @@
+"""
+One-off migration: string/float `amount` fields -> Decimal128 + `amount_minor`.
+
+Run with `python migrate_amounts.py` (add --dry-run to only count). Amounts
+that don't parse, or carry more decimals than their currency allows, are left
+untouched and listed so they can be fixed by hand.
+"""
+import argparse
+
+from pymongo import UpdateOne
+
+from app1 import ensure_indexes, exceptions, processed
+from money import amount_fields, fits_minor_unit, to_decimal
+
+BATCH_SIZE = 1000
+
+
+def migrate(coll, dry_run=False):
+    converted, skipped = 0, []
+    ops = []
+    cursor = coll.find({'amount': {'$type': ['string', 'double', 'int', 'long']}}, {'amount': 1, 'currency': 1})
+    for doc in cursor:
+        try:
+            amount = to_decimal(doc['amount'])
+            if not fits_minor_unit(amount, doc.get('currency')):
+                raise ValueError('too many decimals')
+            fields = amount_fields(amount, doc.get('currency'))
+        except ValueError as e:
+            skipped.append((doc['_id'], doc['amount'], str(e)))
+            continue
+        ops.append(UpdateOne({'_id': doc['_id']}, {'$set': fields}))
+        converted += 1
+        if len(ops) >= BATCH_SIZE:
+            if not dry_run:
+                coll.bulk_write(ops, ordered=False)
+            ops = []
+    if ops and not dry_run:
+        coll.bulk_write(ops, ordered=False)
+    return converted, skipped
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Convert stored amounts to Decimal128')
+    parser.add_argument('--dry-run', action='store_true')
+    args = parser.parse_args()
+
+    for coll in (exceptions, processed):
+        converted, skipped = migrate(coll, dry_run=args.dry_run)
+        print(f'{coll.name}: {"would convert" if args.dry_run else "converted"} {converted}, skipped {len(skipped)}')
+        for _id, amount, reason in skipped:
+            print(f'  {_id}: {amount!r} ({reason})')
+    if not args.dry_run:
+        ensure_indexes()
@@ -0,0 +1,78 @@
+"""
+Amount handling.
+
+Amounts are stored as Decimal128 quantized to the currency's minor unit, next
+to `amount_minor`, the same value as an integer count of minor units
+(cents for USD, yen for JPY). Both are exact, sortable and indexable together
+with `currency`, so range filters and per-currency sums need no string parsing.
+"""
+from decimal import Context, Decimal, InvalidOperation
+
+from bson.decimal128 import Decimal128
+
+# ISO 4217 minor-unit exponents that differ from the default of 2
+CURRENCY_EXPONENTS = {
+    'BHD': 3, 'IQD': 3, 'JOD': 3, 'KWD': 3, 'LYD': 3, 'OMR': 3, 'TND': 3,
+    'BIF': 0, 'CLP': 0, 'DJF': 0, 'GNF': 0, 'ISK': 0, 'JPY': 0, 'KMF': 0, 'KRW': 0,
+    'PYG': 0, 'RWF': 0, 'UGX': 0, 'VND': 0, 'VUV': 0, 'XAF': 0, 'XOF': 0, 'XPF': 0,
+}
+DEFAULT_EXPONENT = 2
+MAX_DIGITS = 34  # significant digits a Decimal128 holds
+_STORAGE_CONTEXT = Context(prec=MAX_DIGITS)
+
+
+def exponent(currency):
+    return CURRENCY_EXPONENTS.get((currency or '').strip().upper(), DEFAULT_EXPONENT)
+
+
+def to_decimal(value):
+    """Decimal for a stored or submitted amount; raises ValueError when it isn't a finite number."""
+    if isinstance(value, Decimal128):
+        value = value.to_decimal()
+    elif isinstance(value, float):
+        value = repr(value)
+    try:
+        amount = Decimal(str(value).strip())
+    except InvalidOperation:
+        raise ValueError(f'not a number: {value!r}')
+    if not amount.is_finite():
+        raise ValueError(f'not a finite number: {value!r}')
+    return amount
+
+
+def to_decimal128(value):
+    """Decimal128 for a submitted amount (e.g. a filter bound); raises ValueError when it doesn't fit one."""
+    amount = to_decimal(value)
+    try:
+        return Decimal128(amount)
+    except ArithmeticError:
+        raise ValueError(f'too many digits: {value!r}')
+
+
+def fits_minor_unit(amount, currency):
+    """True when `amount` has no more decimals than the currency allows."""
+    return -min(amount.normalize().as_tuple().exponent, 0) <= exponent(currency)
+
+
+def fits_storage(amount, currency):
+    """True when `amount`, quantized to the currency's minor unit, fits in a Decimal128."""
+    return amount.adjusted() + 1 + exponent(currency) <= MAX_DIGITS
+
+
+def amount_fields(value, currency):
+    """
+    The stored representation of an amount: {'amount': Decimal128, 'amount_minor': int}.
+    Raises ValueError for unparseable amounts and ones too large to store.
+    """
+    exp = exponent(currency)
+    amount = to_decimal(value)
+    if not fits_storage(amount, currency):
+        raise ValueError(f'amount too large: {value!r}')
+    try:
+        amount = amount.quantize(Decimal(1).scaleb(-exp), context=_STORAGE_CONTEXT)
+    except InvalidOperation:
+        raise ValueError(f'amount too large: {value!r}')
+    return {
+        'amount': Decimal128(amount),
+        'amount_minor': int(amount.scaleb(exp, context=_STORAGE_CONTEXT)),
+    }
@@ -0,0 +1,160 @@
+"""
+Slow aggregation capture.
+
+A pymongo CommandListener that watches `aggregate` commands (count_documents
+sends one too, a $match followed by a $group) and `count` commands (what
+estimated_document_count sends). Anything slower than SLOW_QUERY_MS is
+re-run with explain('executionStats') on a background thread and the result
+is kept in a bounded ring buffer, served by /api/admin/slow_queries. This finds
+bad plans in production without turning on the server-side profiler.
+"""
+import json
+import os
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from bson import json_util
+from pymongo import monitoring
+
+import metrics
+
+WATCHED_COMMANDS = ('aggregate', 'count')
+
+# Session / routing fields that the driver adds and explain does not accept
+_DRIVER_FIELDS = ('lsid', '$db', '$clusterTime', '$readPreference', 'txnNumber',
+                  'autocommit', 'startTransaction', 'readConcern', 'writeConcern')
+
+# Keep the explain backlog from growing if the cluster is struggling
+_MAX_PENDING_EXPLAINS = 20
+
+
+class SlowQueryProfiler(monitoring.CommandListener):
+    def __init__(self, threshold_ms=None, capacity=None):
+        if threshold_ms is None:
+            threshold_ms = float(os.getenv('SLOW_QUERY_MS', 100))
+        if capacity is None:
+            capacity = int(os.getenv('SLOW_QUERY_BUFFER', 200))
+        self.threshold_ms = threshold_ms
+        self.client = None
+        self._entries = deque(maxlen=capacity)
+        self._lock = threading.Lock()
+        self._inflight = {}
+        self._pending_explains = 0
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='explain')
+
+    def bind(self, client):
+        """The client used to run explains (the one this listener is attached to)."""
+        self.client = client
+
+    # --- CommandListener ---
+    def started(self, event):
+        if event.command_name in WATCHED_COMMANDS:
+            command = {k: v for k, v in event.command.items() if k not in _DRIVER_FIELDS}
+            with self._lock:
+                self._inflight[(event.connection_id, event.request_id)] = (
+                    event.database_name, command, metrics.current_route())
+
+    def succeeded(self, event):
+        if event.command_name not in WATCHED_COMMANDS:
+            return
+        with self._lock:
+            started = self._inflight.pop((event.connection_id, event.request_id), None)
+        duration_ms = event.duration_micros / 1000.0
+        if started is None or duration_ms < self.threshold_ms or self.client is None:
+            return
+        with self._lock:
+            if self._pending_explains >= _MAX_PENDING_EXPLAINS:
+                return
+            self._pending_explains += 1
+        self._executor.submit(self._capture, started, event.command_name, duration_ms)
+
+    def failed(self, event):
+        with self._lock:
+            self._inflight.pop((event.connection_id, event.request_id), None)
+
+    # --- capture ---
+    def _capture(self, started, command_name, duration_ms):
+        database, command, route = started
+        entry = {
+            'at': datetime.utcnow().isoformat() + 'Z',
+            'route': route,
+            'command': command_name,
+            'collection': command.get(command_name),
+            'pipeline': command.get('pipeline'),
+            'query': command.get('query'),
+            'duration_ms': round(duration_ms, 2),
+        }
+        try:
+            plan = self.client[database].command('explain', command, verbosity='executionStats')
+            stats = _execution_stats(plan)
+            entry.update({
+                'docs_examined': stats['docs_examined'],
+                'docs_returned': _docs_returned(plan),
+                'keys_examined': stats['keys_examined'],
+                'plan_stages': sorted(stats['stages']),
+                'explain': plan,
+            })
+        except Exception as e:
+            entry['explain_error'] = str(e)
+        finally:
+            with self._lock:
+                self._pending_explains -= 1
+
+        # explain output carries BSON types (Timestamp, Int64...) that plain JSON can't
+        entry = json.loads(json_util.dumps(entry))
+        with self._lock:
+            self._entries.append(entry)
+
+    def entries(self, limit=None):
+        """Captured slow queries, newest first."""
+        with self._lock:
+            items = list(reversed(self._entries))
+        return items[:limit] if limit else items
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+def _execution_stats(plan):
+    """Sum docs/keys examined over every executionStats block in an explain document."""
+    out = {'docs_examined': 0, 'keys_examined': 0, 'stages': set()}
+
+    def walk(node):
+        if isinstance(node, dict):
+            stats = node.get('executionStats')
+            if isinstance(stats, dict):
+                out['docs_examined'] += stats.get('totalDocsExamined', 0)
+                out['keys_examined'] += stats.get('totalKeysExamined', 0)
+            stage = node.get('stage')
+            if isinstance(stage, str):
+                out['stages'].add(stage)
+            for value in node.values():
+                walk(value)
+        elif isinstance(node, list):
+            for value in node:
+                walk(value)
+
+    walk(plan)
+    return out
+
+
+def _docs_returned(node):
+    """
+    Documents the explained command returned: the last pipeline stage's
+    nReturned when the server reports per-stage counts, else the query's
+    executionStats.nReturned; summed over shards.
+    """
+    if isinstance(node, list):
+        return sum(_docs_returned(value) for value in node)
+    if not isinstance(node, dict):
+        return 0
+    stages = node.get('stages')
+    if isinstance(stages, list) and stages and isinstance(stages[-1], dict) and 'nReturned' in stages[-1]:
+        return stages[-1]['nReturned']
+    stats = node.get('executionStats')
+    if isinstance(stats, dict) and 'nReturned' in stats:
+        return stats['nReturned']
+    return sum(_docs_returned(value) for value in node.values())
@@ -0,0 +1,284 @@
+"""
+Per-operator rate limiting and load shedding.
+
+Every route belongs to a priority class (ROUTE_CLASSES, 'interactive' when
+unlisted). `write` covers fixes, `interactive` covers reading the queue, and
+`analytics` covers dashboards, statistics, exports and reports. A request
+takes a token from the bucket for (identity, route), refilled at its class's
+rate. The identity is the JWT subject when a valid token is sent, otherwise
+the client address. Two guards are process-wide:
+
+- Each class below `write` has a cap on concurrent requests. A burst of
+  dashboard queries therefore holds at most a few Flask workers and MongoDB
+  connections.
+- Once the total number of in-flight requests reaches SHED_AT, analytics is
+  shed, and at twice that, interactive traffic too. Writes are never shed.
+
+Rejections are `429` with `Retry-After`. They are counted in /api/metrics as
+`rate_limited_total{class,route,reason}` and summarised by stats().
+
+Buckets live in process memory by default. Set RATE_LIMIT_REDIS_URL (and
+install `redis`) to share them between processes. If Redis is unreachable,
+requests are limited from memory rather than refused.
+"""
+import math
+import os
+import threading
+import time
+from collections import namedtuple
+from functools import partial
+
+from flask import g, jsonify, request
+from flask_jwt_extended import get_jwt_identity, verify_jwt_in_request
+
+import metrics
+
+try:
+    import redis
+except ImportError:  # optional, buckets stay in process memory
+    redis = None
+
+# rate: tokens per second per (identity, route); burst: bucket size; concurrent: in-flight cap, None = no cap;
+# shed: shed once this many times SHED_AT requests are in flight, None = never
+Limit = namedtuple('Limit', 'rate burst concurrent shed')
+
+
+def _limit(name, rate, burst, concurrent, shed):
+    # RATE_LIMIT_ANALYTICS="1/5/2" overrides rate/burst/concurrent for a class
+    override = os.getenv(f'RATE_LIMIT_{name.upper()}')
+    if override:
+        values = override.split('/')
+        rate = float(values[0])
+        burst = float(values[1]) if len(values) > 1 else burst
+        concurrent = int(values[2]) if len(values) > 2 and values[2] else concurrent
+    return Limit(rate, burst, concurrent, shed)
+
+
+# highest priority first
+CLASSES = {
+    'write': _limit('write', 5, 20, None, None),
+    'interactive': _limit('interactive', 10, 30, 16, 2),
+    'analytics': _limit('analytics', 1, 5, 2, 1),
+}
+
+# Flask endpoint -> class; None exempts the endpoint
+ROUTE_CLASSES = {
+    'ping': None,
+    'metrics_endpoint': None,
+    'fix_transaction': 'write',
+    'seed_data': 'write',
+    'signup': 'write',
+    'dashboard': 'analytics',
+    'operator_stats': 'analytics',
+    'export_exceptions': 'analytics',
+    'report_jobs': 'analytics',
+    'report_download': 'analytics',
+    'remediation_run': 'analytics',
+    'client_metrics': 'analytics',
+    'processed_pacs008': 'analytics',
+}
+DEFAULT_CLASS = 'interactive'
+
+# in-flight requests at which analytics is shed; interactive is shed at twice this
+SHED_AT = int(os.getenv('RATE_LIMIT_SHED_AT', 8))
+SHED_RETRY_AFTER = 2  # seconds suggested to shed clients
+REDIS_URL = os.getenv('RATE_LIMIT_REDIS_URL')
+PRUNE_EVERY = 10000  # bucket operations between sweeps of idle in-memory buckets
+
+
+# --- buckets ---
+class MemoryBuckets:
+    """Token buckets in a dict; idle, full buckets are dropped now and then."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets = {}  # key -> (tokens, updated, seconds to refill)
+        self._ops = 0
+
+    def take(self, key, rate, burst):
+        """0 when a token was taken, else the seconds until one will be available."""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated, _ = self._buckets.get(key, (burst, now, 0))
+            tokens = min(burst, tokens + (now - updated) * rate)
+            wait = 0.0
+            if tokens >= 1:
+                tokens -= 1
+            else:
+                wait = (1 - tokens) / rate
+            self._buckets[key] = (tokens, now, (burst - tokens) / rate)
+            self._ops += 1
+            if self._ops >= PRUNE_EVERY:
+                self._ops = 0
+                self._buckets = {k: b for k, b in self._buckets.items() if now - b[1] < b[2]}
+            return wait
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+# KEYS[1] bucket hash; ARGV rate, burst. Uses the server clock so all processes agree.
+_TAKE_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(bucket[1]) or burst
+local updated = tonumber(bucket[2]) or now
+tokens = math.min(burst, tokens + (now - updated) * rate)
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    wait = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 1)
+return tostring(wait)
+"""
+
+
+class RedisBuckets:
+    """The same buckets in Redis, updated atomically by a Lua script; falls back to memory on errors."""
+
+    def __init__(self, url, prefix='ratelimit:'):
+        self.client = redis.Redis.from_url(url, socket_timeout=0.05, socket_connect_timeout=0.05)
+        self.prefix = prefix
+        self._take = self.client.register_script(_TAKE_SCRIPT)
+        self.fallback = MemoryBuckets()
+        self.errors = 0
+
+    def take(self, key, rate, burst):
+        try:
+            return float(self._take(keys=[self.prefix + '|'.join(key)], args=[rate, burst]))
+        except redis.RedisError:
+            self.errors += 1
+            return self.fallback.take(key, rate, burst)
+
+    def __len__(self):
+        return len(self.fallback)
+
+
+# --- limiter ---
+class Limiter:
+    def __init__(self, classes=CLASSES, route_classes=ROUTE_CLASSES, shed_at=SHED_AT, buckets=None):
+        self.classes = classes
+        self.route_classes = route_classes
+        self.shed_at = shed_at
+        self.buckets = buckets or MemoryBuckets()
+        self._lock = threading.Lock()
+        self._inflight = {name: 0 for name in classes}
+        self._counts = {}  # (class, outcome) -> requests
+
+    def class_of(self, endpoint):
+        return self.route_classes.get(endpoint, DEFAULT_CLASS)
+
+    def admit(self, identity, endpoint, cls):
+        """
+        Admit a request of class `cls`: None when it may run (the caller must
+        release(cls) afterwards), else (reason, retry after seconds).
+        """
+        limit = self.classes[cls]
+        wait = self.buckets.take((identity, endpoint), limit.rate, limit.burst)
+        if wait > 0:
+            return self._reject(cls, 'rate', wait)
+        with self._lock:
+            total = sum(self._inflight.values())
+            if limit.shed is not None and total >= self.shed_at * limit.shed:
+                reason = 'shed'
+            elif limit.concurrent is not None and self._inflight[cls] >= limit.concurrent:
+                reason = 'concurrency'
+            else:
+                self._inflight[cls] += 1
+                self._count(cls, 'allowed')
+                return None
+        return self._reject(cls, reason, SHED_RETRY_AFTER)
+
+    def _reject(self, cls, reason, wait):
+        with self._lock:
+            self._count(cls, reason)
+        return reason, max(1, math.ceil(wait))
+
+    def _count(self, cls, outcome):
+        self._counts[(cls, outcome)] = self._counts.get((cls, outcome), 0) + 1
+
+    def release(self, cls):
+        with self._lock:
+            self._inflight[cls] -= 1
+
+    def stats(self):
+        with self._lock:
+            counts = {}
+            for (cls, outcome), n in self._counts.items():
+                counts.setdefault(cls, {})[outcome] = n
+            return {
+                'backend': type(self.buckets).__name__,
+                'buckets': len(self.buckets),
+                'shed_at': self.shed_at,
+                'inflight': dict(self._inflight),
+                'classes': {name: dict(limit._asdict(), counts=counts.get(name, {}))
+                            for name, limit in self.classes.items()},
+            }
+
+
+def default_limiter():
+    if REDIS_URL:
+        if redis is None:
+            print('❌ RATE_LIMIT_REDIS_URL is set but redis is not installed; rate limits are per process')
+        else:
+            return Limiter(buckets=RedisBuckets(REDIS_URL))
+    return Limiter()
+
+
+def identity():
+    """'user:<jwt subject>' for a valid bearer token, else 'ip:<client address>'."""
+    try:
+        if verify_jwt_in_request(optional=True):
+            return f'user:{get_jwt_identity()}'
+    except Exception:
+        pass  # a bad or expired token just falls back to the address
+    return f'ip:{request.remote_addr}'
+
+
+# --- Flask wiring ---
+MESSAGES = {
+    'rate': 'Too many {cls} requests; retry in {wait} s',
+    'concurrency': 'Too many {cls} requests in progress; retry in {wait} s',
+    'shed': 'Server busy, {cls} requests are being shed; retry in {wait} s',
+}
+
+
+def install(app, limiter):
+    """Register the limiter's request hooks on `app` (after metrics.install, so 429s are timed too)."""
+
+    @app.before_request
+    def _rate_limit():
+        endpoint = request.endpoint
+        cls = limiter.class_of(endpoint) if endpoint else None
+        if cls is None or request.method == 'OPTIONS':
+            return None
+        rejected = limiter.admit(identity(), endpoint, cls)
+        if rejected is None:
+            g.rate_limit_class = cls
+            return None
+        reason, wait = rejected
+        route = request.url_rule.rule if request.url_rule else endpoint
+        metrics.registry.inc('rate_limited_total', {'class': cls, 'route': route, 'reason': reason})
+        resp = jsonify({'ok': False, 'error': MESSAGES[reason].format(cls=cls, wait=wait), 'retry_after': wait})
+        resp.status_code = 429
+        resp.headers['Retry-After'] = str(wait)
+        return resp
+
+    @app.after_request
+    def _release_when_streamed(response):
+        # a streamed body outlives the request context; hold the slot until it is sent
+        if response.is_streamed and 'rate_limit_class' in g:
+            response.call_on_close(partial(limiter.release, g.pop('rate_limit_class')))
+        return response
+
+    @app.teardown_request
+    def _release(exc):
+        cls = g.pop('rate_limit_class', None)
+        if cls is not None:
+            limiter.release(cls)
@@ -0,0 +1,281 @@
+"""
+Rule-based auto-remediation of mechanical queue errors.
+
+A Rule declares which exceptions it applies to (a regex over the error
+fingerprint plus regexes over fields) and how to rewrite those fields. A run
+pages through `exceptions` in batches of BATCH_SIZE, prefiltered in MongoDB
+by the rules' own field patterns, and hands each batch to a worker pool.
+Workers apply every matching rule to a record, re-validate it with the same
+validate_transaction as /api/fix, and commit the records that now pass
+through the same commit path with `processed_by: "auto"`; the audit entry
+names whoever started the run as its operator, plus the rules and the run.
+Records that still fail validation stay in the queue for an operator,
+untouched.
+
+Start a run with `POST /api/remediation/run` or `python remediation.py`
+(`--dry-run` to count what would be fixed without writing anything).
+"""
+import os
+import re
+import threading
+import time
+import uuid
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import metrics
+
+REMEDIATION_WORKERS = int(os.getenv('REMEDIATION_WORKERS', 4))
+BATCH_SIZE = 500
+AUTO_OPERATOR = 'auto'
+MAX_SAMPLES = 20  # records left for review (and failed commits) that a run reports back, per run
+
+# error: regex searched in the error fingerprint, None for any error
+# match: field -> regex the field must contain for the rule to apply (also the MongoDB prefilter)
+# fix: field -> function(value) returning the corrected value
+Rule = namedtuple('Rule', 'name description error match fix')
+
+
+def _compact_iban(iban):
+    return re.sub(r'[\s-]', '', iban).upper()
+
+
+def _collapse_spaces(text):
+    return ' '.join(text.split())
+
+
+# Only rewrites that can't change who gets paid. A beneficiary name truncated by
+# MT->MX conversion ("Field 59 truncated") is not here: the rest of the name
+# isn't in the record, so those exceptions stay with an operator.
+RULES = [
+    Rule('iban-format',
+         'Remove spaces and dashes from IBANs and uppercase them',
+         error=None,
+         match={'iban': r'[\s\-a-z]'},
+         fix={'iban': _compact_iban}),
+    Rule('currency-case',
+         'Uppercase and trim currency codes',
+         error=None,
+         match={'currency': r'^(?=\s|.*\s$|.*[a-z])\s*[A-Za-z]{3}\s*$'},
+         fix={'currency': lambda c: c.strip().upper()}),
+    Rule('beneficiary-whitespace',
+         'Trim beneficiary names and collapse repeated spaces',
+         error=None,
+         match={'beneficiary_name': r'^\s|\s$|\s\s'},
+         fix={'beneficiary_name': _collapse_spaces}),
+]
+
+
+def error_fingerprint(error):
+    """Lowercased, whitespace-collapsed error text; what Rule.error patterns are matched against."""
+    if isinstance(error, (list, tuple)):
+        error = '; '.join(str(e) for e in error)
+    return ' '.join(str(error or '').lower().split())
+
+
+def _applies(rule, doc, fingerprint):
+    if rule.error and not re.search(rule.error, fingerprint):
+        return False
+    return all(isinstance(doc.get(field), str) and re.search(pattern, doc[field])
+               for field, pattern in rule.match.items())
+
+
+def plan(doc, rules=RULES):
+    """(changed fields, names of the rules that changed something) for one exception record."""
+    fingerprint = error_fingerprint(doc.get('error'))
+    current, applied = dict(doc), []
+    for rule in rules:
+        if not _applies(rule, current, fingerprint):
+            continue
+        changes = {field: fn(current[field]) for field, fn in rule.fix.items()}
+        changes = {k: v for k, v in changes.items() if v != current.get(k)}
+        if changes:
+            current.update(changes)
+            applied.append(rule.name)
+    return {k: current[k] for k in current if current[k] != doc.get(k)}, applied
+
+
+def prefilter(rules):
+    """MongoDB query matching every record at least one of `rules` could apply to."""
+    clauses = []
+    for rule in rules:
+        clause = {field: {'$regex': pattern} for field, pattern in rule.match.items()}
+        if rule.error:
+            clause['error'] = {'$regex': rule.error.replace(' ', r'\s+'), '$options': 'i'}
+        clauses.append(clause)
+    return {'$or': clauses}
+
+
+# --- runs ---
+class RemediationEngine:
+    """One run at a time, in the background; the latest run's progress is kept for polling."""
+
+    def __init__(self, exceptions, validate, commit, rules=RULES, workers=REMEDIATION_WORKERS,
+                 batch_size=BATCH_SIZE):
+        self.exceptions = exceptions
+        self.validate = validate
+        self.commit = commit  # commit(orig, merged, operator, processed_by, **audit_fields) -> processed id or None
+        self.rules = rules
+        self.workers = workers
+        self.batch_size = batch_size
+        self._lock = threading.Lock()
+        self._run = None
+
+    def rules_info(self):
+        return [{'name': r.name, 'description': r.description, 'error': r.error,
+                 'fields': sorted(set(r.match) | set(r.fix))} for r in self.rules]
+
+    def _select(self, names):
+        if not names:
+            return list(self.rules)
+        known = {r.name: r for r in self.rules}
+        unknown = [n for n in names if n not in known]
+        if unknown:
+            raise ValueError(f'unknown rules {unknown}; expected some of {sorted(known)}')
+        return [known[n] for n in names]
+
+    def start(self, dry_run=False, rule_names=None, requested_by=None):
+        """
+        Start a run on a background thread and return its status; None when a
+        run is already in progress. Raises ValueError for unknown rule names.
+        """
+        rules = self._select(rule_names)
+        with self._lock:
+            if self._run and self._run['status'] == 'running':
+                return None
+            run = self._run = self._new_run(rules, dry_run, requested_by)
+        threading.Thread(target=self._execute, args=(run, rules), name='remediation', daemon=True).start()
+        return self.status()
+
+    def run(self, dry_run=False, rule_names=None, requested_by=None):
+        """Run synchronously (for the CLI); returns the final status."""
+        rules = self._select(rule_names)
+        with self._lock:
+            if self._run and self._run['status'] == 'running':
+                raise RuntimeError('a remediation run is already in progress')
+            run = self._run = self._new_run(rules, dry_run, requested_by)
+        self._execute(run, rules)
+        return self.status()
+
+    def status(self):
+        with self._lock:
+            if self._run is None:
+                return None
+            run = dict(self._run)
+            run['by_rule'] = dict(run['by_rule'])
+            run['needs_review'] = list(run['needs_review'])
+            run['commit_errors'] = list(run['commit_errors'])
+            return run
+
+    def _new_run(self, rules, dry_run, requested_by):
+        return {
+            'id': uuid.uuid4().hex,
+            'status': 'running',
+            'dry_run': dry_run,
+            'rules': [r.name for r in rules],
+            'requested_by': requested_by,
+            'started_at': datetime.utcnow(),
+            'finished_at': None,
+            'seconds': None,
+            'scanned': 0,
+            'fixed': 0,        # committed to processed (would be, on a dry run)
+            'unresolved': 0,   # rules applied but the record still fails validation
+            'conflicts': 0,    # processed by someone else while the run had it
+            'failed': 0,       # commit raised
+            'by_rule': {},     # rule -> records it contributed to that were (or would be) fixed
+            'needs_review': [],  # first MAX_SAMPLES unresolved records with their remaining errors
+            'commit_errors': [],  # first MAX_SAMPLES failed commits with the exception raised
+            'error': None,
+        }
+
+    def _execute(self, run, rules):
+        started = time.perf_counter()
+        query = prefilter(rules)
+        # bounded in-flight batches, so a huge queue isn't read into memory ahead of the workers
+        slots = threading.BoundedSemaphore(self.workers * 2)
+        try:
+            with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='remediation') as executor:
+                futures, last_id = [], None
+                while True:
+                    page = query if last_id is None else {'$and': [query, {'_id': {'$gt': last_id}}]}
+                    docs = list(self.exceptions.find(page).sort('_id', 1).limit(self.batch_size))
+                    if not docs:
+                        break
+                    last_id = docs[-1]['_id']
+                    slots.acquire()
+                    future = executor.submit(self._remediate_batch, run, rules, docs)
+                    future.add_done_callback(lambda _: slots.release())
+                    futures.append(future)
+                for future in futures:
+                    future.result()
+            status = 'done'
+        except Exception as e:
+            status = 'failed'
+            with self._lock:
+                run['error'] = str(e)
+        with self._lock:
+            run['status'] = status
+            run['finished_at'] = datetime.utcnow()
+            run['seconds'] = round(time.perf_counter() - started, 3)
+
+    def _remediate_batch(self, run, rules, docs):
+        counts = {'scanned': 0, 'fixed': 0, 'unresolved': 0, 'conflicts': 0, 'failed': 0}
+        by_rule, samples, commit_errors = {}, [], []
+        for doc in docs:
+            counts['scanned'] += 1
+            changes, applied = plan(doc, rules)
+            if not applied:
+                continue
+            merged = {k: v for k, v in doc.items() if k != '_id'}
+            merged.update(changes)
+            errors = self.validate(merged)
+            if errors:
+                counts['unresolved'] += 1
+                samples.append({'tx_id': str(doc['_id']), 'rules': applied, 'errors': errors})
+                continue
+            if not run['dry_run']:
+                try:
+                    processed_id = self.commit(doc, merged, run['requested_by'] or AUTO_OPERATOR,
+                                               processed_by=AUTO_OPERATOR, remediation_rules=applied,
+                                               remediation_run=run['id'])
+                except Exception as e:
+                    counts['failed'] += 1
+                    commit_errors.append({'tx_id': str(doc['_id']), 'rules': applied, 'error': repr(e)})
+                    continue
+                if processed_id is None:
+                    counts['conflicts'] += 1
+                    continue
+            counts['fixed'] += 1
+            for name in applied:
+                by_rule[name] = by_rule.get(name, 0) + 1
+
+        if not run['dry_run']:
+            for name, n in by_rule.items():
+                metrics.registry.inc('remediation_fixes_total', {'rule': name}, n)
+            if counts['unresolved']:
+                metrics.registry.inc('remediation_unresolved_total', {}, counts['unresolved'])
+        with self._lock:
+            for key, n in counts.items():
+                run[key] += n
+            for name, n in by_rule.items():
+                run['by_rule'][name] = run['by_rule'].get(name, 0) + n
+            run['needs_review'].extend(samples[:MAX_SAMPLES - len(run['needs_review'])])
+            run['commit_errors'].extend(commit_errors[:MAX_SAMPLES - len(run['commit_errors'])])
+
+
+if __name__ == '__main__':
+    import argparse
+    import json
+
+    from app1 import remediation_engine
+
+    parser = argparse.ArgumentParser(description='Auto-fix mechanical errors in the exception queue')
+    parser.add_argument('--dry-run', action='store_true', help='count what would be fixed, write nothing')
+    parser.add_argument('--rules', nargs='+', choices=[r.name for r in RULES], help='only these rules (default: all)')
+    parser.add_argument('--workers', type=int, default=REMEDIATION_WORKERS)
+    args = parser.parse_args()
+
+    remediation_engine.workers = args.workers
+    result = remediation_engine.run(dry_run=args.dry_run, rule_names=args.rules, requested_by='cli')
+    print(json.dumps(result, indent=2, default=str))
@@ -0,0 +1,353 @@
+"""
+Server-side report rendering.
+
+A report is a kind (the exception queue, processed transactions, a dashboard
+snapshot, ...) rendered to PDF, XLSX or CSV. Reports are rendered by a small
+worker pool into REPORTS_DIR and downloaded by id. The id is a hash of the
+kind, format and parameters, so the same report asked for by any operator
+within REPORT_TTL_SECONDS is served from the file that is already there (or
+joins the render already in progress) instead of being rendered again.
+
+Report kinds are registered by the app as {kind: (parse_params, build)}:
+parse_params(raw) validates the request parameters (ValueError when they are
+bad) and returns them in canonical form, build(params) returns the report's
+title and its list of Sections. Section rows are iterated lazily, so a report
+can stream straight from a MongoDB cursor.
+"""
+import csv
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from bson import ObjectId
+from bson.decimal128 import Decimal128
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4, landscape
+from reportlab.lib.styles import getSampleStyleSheet
+from reportlab.lib.units import mm
+from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+
+import metrics
+
+REPORTS_DIR = os.getenv('REPORTS_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'reports'))
+REPORT_TTL_SECONDS = int(os.getenv('REPORT_TTL_SECONDS', 600))
+REPORT_WORKERS = int(os.getenv('REPORT_WORKERS', 2))
+
+FORMATS = {
+    'pdf': 'application/pdf',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    'csv': 'text/csv',
+}
+
+PDF_MAX_ROWS = 50000  # beyond this a PDF is no use to anyone; ask for xlsx/csv instead
+PDF_CHUNK_ROWS = 500  # rows per platypus Table; small tables split across pages cheaply
+XLSX_MAX_SHEET_ROWS = 1048576  # Excel's limit, header included
+
+# title, column headers, iterable of rows (lists of values)
+Section = namedtuple('Section', 'title headers rows')
+
+
+def report_id(kind, fmt, params):
+    key = json.dumps({'kind': kind, 'format': fmt, 'params': params}, sort_keys=True)
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()[:32]
+
+
+def _value(value):
+    # Mongo types -> plain Python types every renderer understands
+    if isinstance(value, Decimal128):
+        return value.to_decimal()
+    if isinstance(value, ObjectId):
+        return str(value)
+    return value
+
+
+# --- renderers ---
+def render_csv(title, sections, path):
+    rows = 0
+    with open(path, 'w', newline='', encoding='utf-8') as fh:
+        writer = csv.writer(fh)
+        for i, section in enumerate(sections):
+            if len(sections) > 1:
+                if i:
+                    writer.writerow([])
+                writer.writerow([section.title])
+            writer.writerow(section.headers)
+            for row in section.rows:
+                writer.writerow(['' if v is None else v.isoformat() if isinstance(v, datetime) else v
+                                 for v in map(_value, row)])
+                rows += 1
+    return rows
+
+
+def _sheet_title(title, number):
+    title = re.sub(r'[\[\]:*?/\\]', '', title)[:28] or 'Sheet'
+    return title if number == 1 else f'{title} {number}'
+
+
+def render_xlsx(title, sections, path):
+    wb = Workbook(write_only=True)
+    rows = 0
+    bold = Font(bold=True)
+
+    def new_sheet(section, number):
+        ws = wb.create_sheet(_sheet_title(section.title, number))
+        ws.freeze_panes = 'A2'
+        header = []
+        for h in section.headers:
+            cell = WriteOnlyCell(ws, value=h)
+            cell.font = bold
+            header.append(cell)
+        ws.append(header)
+        return ws
+
+    for section in sections:
+        number = 1
+        ws, sheet_rows = new_sheet(section, number), 1
+        for row in section.rows:
+            if sheet_rows >= XLSX_MAX_SHEET_ROWS:
+                number += 1
+                ws, sheet_rows = new_sheet(section, number), 1
+            ws.append([_value(v) for v in row])
+            sheet_rows += 1
+            rows += 1
+    wb.save(path)
+    return rows
+
+
+def _pdf_text(value):
+    value = _value(value)
+    if value is None:
+        return ''
+    if isinstance(value, datetime):
+        return value.strftime('%Y-%m-%d %H:%M')
+    if isinstance(value, float):
+        return f'{value:,.2f}'
+    if isinstance(value, Decimal):
+        return f'{value:,}'
+    return str(value)
+
+
+def _clip(text, limit):
+    return text if len(text) <= limit else text[:limit - 1] + '…'
+
+
+def _pdf_columns(headers, rows, usable):
+    # column widths from the text in the first chunk, capped so one long text
+    # column doesn't starve the rest; returns (widths, max characters per column)
+    weights = []
+    for i, h in enumerate(headers):
+        longest = max([len(h)] + [len(r[i]) for r in rows])
+        weights.append(min(max(longest, 6), 40))
+    widths = [usable * w / sum(weights) for w in weights]
+    return widths, [max(int(w / 3.6), 4) for w in widths]  # ~3.6pt per character at 7pt Helvetica
+
+
+def _pdf_table(headers, rows, widths):
+    table = Table([headers] + rows, colWidths=widths, repeatRows=1)
+    table.setStyle(TableStyle([
+        ('FONT', (0, 0), (-1, -1), 'Helvetica', 7),
+        ('FONT', (0, 0), (-1, 0), 'Helvetica-Bold', 7),
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#d9dee7')),
+        ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#f3f5f8')]),
+        ('GRID', (0, 0), (-1, -1), 0.25, colors.HexColor('#b0b7c3')),
+        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+        ('TOPPADDING', (0, 0), (-1, -1), 1.5),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 1.5),
+    ]))
+    return table
+
+
+def _pdf_chunk(headers, rows, columns):
+    widths, limits = columns
+    return _pdf_table(headers, [[_clip(t, n) for t, n in zip(row, limits)] for row in rows], widths)
+
+
+def render_pdf(title, sections, path):
+    styles = getSampleStyleSheet()
+    page = landscape(A4)
+    margin = 12 * mm
+    usable = page[0] - 2 * margin
+    generated = datetime.utcnow().strftime('%Y-%m-%d %H:%M UTC')
+
+    def footer(canvas, doc):
+        canvas.saveState()
+        canvas.setFont('Helvetica', 7)
+        canvas.drawString(margin, margin / 2, f'{title} · generated {generated}')
+        canvas.drawRightString(page[0] - margin, margin / 2, f'Page {doc.page}')
+        canvas.restoreState()
+
+    story = [Paragraph(title, styles['Title']), Spacer(1, 4 * mm)]
+    rows = 0
+    for section in sections:
+        story.append(Paragraph(section.title, styles['Heading2']))
+        chunk, columns, section_rows = [], None, 0
+        for row in section.rows:
+            rows += 1
+            section_rows += 1
+            if rows > PDF_MAX_ROWS:
+                raise ValueError(f'more than {PDF_MAX_ROWS:,} rows is too large for a PDF; use xlsx or csv')
+            chunk.append([_pdf_text(v) for v in row])
+            if len(chunk) >= PDF_CHUNK_ROWS:
+                columns = columns or _pdf_columns(section.headers, chunk, usable)
+                story.append(_pdf_chunk(section.headers, chunk, columns))
+                chunk = []
+        if chunk:
+            columns = columns or _pdf_columns(section.headers, chunk, usable)
+            story.append(_pdf_chunk(section.headers, chunk, columns))
+        elif not section_rows:
+            story.append(Paragraph('No records.', styles['Normal']))
+        story.append(Spacer(1, 4 * mm))
+
+    doc = SimpleDocTemplate(path, pagesize=page, title=title, leftMargin=margin, rightMargin=margin,
+                            topMargin=margin, bottomMargin=margin)
+    doc.build(story, onFirstPage=footer, onLaterPages=footer)
+    return rows
+
+
+RENDERERS = {'pdf': render_pdf, 'xlsx': render_xlsx, 'csv': render_csv}
+
+
+# --- jobs ---
+class ReportService:
+    """Report jobs: deduplicated by id, rendered on a thread pool, cached on disk for `ttl` seconds (failures too)."""
+
+    def __init__(self, kinds, directory=REPORTS_DIR, ttl=REPORT_TTL_SECONDS, workers=REPORT_WORKERS):
+        self.kinds = kinds
+        self.directory = directory
+        self.ttl = ttl
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='report')
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def submit(self, kind, fmt, params=None, requested_by=None):
+        """
+        Job for this report, starting a render unless a fresh artifact or a render
+        in progress already exists. Raises ValueError for unknown kinds/formats
+        or bad parameters.
+        """
+        if kind not in self.kinds:
+            raise ValueError(f'unknown report kind {kind!r}; expected one of {sorted(self.kinds)}')
+        if fmt not in FORMATS:
+            raise ValueError(f'unknown format {fmt!r}; expected one of {sorted(FORMATS)}')
+        parse_params, _ = self.kinds[kind]
+        params = parse_params(params or {})
+        rid = report_id(kind, fmt, params)
+
+        with self._lock:
+            self._purge_expired()
+            job = self._jobs.get(rid) or self._from_disk(rid, kind, fmt, params)
+            if job and job['status'] in ('queued', 'running', 'done'):
+                return self._public(job)
+            now = datetime.utcnow()
+            job = self._jobs[rid] = {
+                'id': rid,
+                'kind': kind,
+                'format': fmt,
+                'params': params,
+                'status': 'queued',
+                'requested_by': requested_by,
+                'requested_at': now,
+                'finished_at': None,
+                'expires_at': None,
+                'rows': None,
+                'bytes': None,
+                'error': None,
+                'path': os.path.join(self.directory, f'{rid}.{fmt}'),
+            }
+        self._executor.submit(self._render, job)
+        return self._public(job)
+
+    def get(self, rid):
+        with self._lock:
+            job = self._jobs.get(rid)
+            if job and self._expired(job):
+                self._drop(job)
+                job = None
+            return self._public(job) if job else None
+
+    def artifact(self, rid):
+        """(path, download name, mimetype) of a finished report, None when it isn't available."""
+        with self._lock:
+            job = self._jobs.get(rid)
+            if not job or job['status'] != 'done' or self._expired(job) or not os.path.exists(job['path']):
+                return None
+            name = f"{job['kind']}-report-{job['finished_at']:%Y%m%d-%H%M%S}.{job['format']}"
+            return job['path'], name, FORMATS[job['format']]
+
+    def jobs(self):
+        with self._lock:
+            self._purge_expired()
+            return [self._public(j) for j in sorted(self._jobs.values(), key=lambda j: j['requested_at'], reverse=True)]
+
+    def _render(self, job):
+        with self._lock:
+            job['status'] = 'running'
+        start = time.perf_counter()
+        tmp = f"{job['path']}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            _, build = self.kinds[job['kind']]
+            title, sections = build(job['params'])
+            rows = RENDERERS[job['format']](title, sections, tmp)
+            os.replace(tmp, job['path'])
+        except Exception as e:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            with self._lock:
+                # failed jobs expire like finished ones, so they don't pile up in the job list
+                now = datetime.utcnow()
+                job.update(status='failed', error=str(e), finished_at=now, expires_at=now + timedelta(seconds=self.ttl))
+            return
+        finally:
+            metrics.registry.observe('report_render_seconds', {'kind': job['kind'], 'format': job['format']},
+                                     time.perf_counter() - start)
+        now = datetime.utcnow()
+        with self._lock:
+            job.update(status='done', rows=rows, bytes=os.path.getsize(job['path']),
+                       finished_at=now, expires_at=now + timedelta(seconds=self.ttl))
+
+    def _from_disk(self, rid, kind, fmt, params):
+        # an artifact rendered before a restart is still good until its ttl runs out
+        path = os.path.join(self.directory, f'{rid}.{fmt}')
+        if not os.path.exists(path):
+            return None
+        finished = datetime.utcfromtimestamp(os.path.getmtime(path))
+        job = {
+            'id': rid, 'kind': kind, 'format': fmt, 'params': params, 'status': 'done',
+            'requested_by': None, 'requested_at': finished, 'finished_at': finished,
+            'expires_at': finished + timedelta(seconds=self.ttl), 'rows': None,
+            'bytes': os.path.getsize(path), 'error': None, 'path': path,
+        }
+        if self._expired(job):
+            self._drop(job)
+            return None
+        self._jobs[rid] = job
+        return job
+
+    def _expired(self, job):
+        return job['expires_at'] is not None and job['expires_at'] <= datetime.utcnow()
+
+    def _drop(self, job):
+        self._jobs.pop(job['id'], None)
+        try:
+            os.remove(job['path'])
+        except OSError:
+            pass
+
+    def _purge_expired(self):
+        for job in [j for j in self._jobs.values() if self._expired(j)]:
+            self._drop(job)
+
+    @staticmethod
+    def _public(job):
+        return {k: v for k, v in job.items() if k != 'path'}
@@ -1,6 +1,9 @@
 from pymongo import MongoClient
 from datetime import datetime
 
+from dedup import insert_exceptions
+from money import amount_fields
+
 client = MongoClient('mongodb://localhost:27017')
 db = client['payment_fixer_db']
 exceptions = db['exceptions']
@@ -12,11 +15,12 @@ sample = [
         'receiver': 'XYZ BANK',
         'beneficiary_name': 'Johnathan Will...',
         'iban': 'GB29NWBK60161331926819',
-        'amount': '5000',
+        **amount_fields('5000', 'USD'),
         'currency': 'USD',
         'error': 'Field 59 truncated when converting to MX',
-        'created_at': datetime.utcnow()
+        'created_at': datetime.utcnow(),
+        'updated_at': datetime.utcnow()
     }
 ]
-exceptions.insert_many(sample)
-print('seeded')
\ No newline at end of file
+inserted, collapsed = insert_exceptions(exceptions, sample)
+print(f'seeded {inserted} new, {collapsed} duplicates')
\ No newline at end of file
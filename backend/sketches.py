@@ -0,0 +1,226 @@
+"""
+Resolution-time quantile sketches.
+
+Every committed fix adds its resolution time (processed_at - created_at) to a
+t-digest for (operator, UTC day) in the `resolution_sketches` collection.
+Digests merge, so percentiles over any date range cost one small document per
+operator per day instead of a pass over `processed`.
+
+Rebuild from history with `python sketches.py --rebuild`; it reads archived
+`processed` months as well as the hot collection, so sketches still cover
+records archive.py has moved out of MongoDB.
+"""
+import itertools
+import math
+from array import array
+from datetime import datetime, timedelta
+
+from bson.binary import Binary
+from pymongo.errors import DuplicateKeyError
+
+import archive
+
+DEFAULT_COMPRESSION = 100
+
+
+class TDigest:
+    """Merging t-digest (Dunning & Ertl) with the arcsine scale function."""
+
+    def __init__(self, compression=DEFAULT_COMPRESSION):
+        self.compression = compression
+        self.centroids = []  # sorted [mean, weight] pairs
+        self._buffer = []
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+
+    def add(self, value, weight=1):
+        self._buffer.append((value, weight))
+        self.count += weight
+        self.sum += value * weight
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+        if len(self._buffer) > 5 * self.compression:
+            self._compress()
+
+    def merge(self, other):
+        other._compress()
+        self._buffer.extend((m, w) for m, w in other.centroids)
+        self.count += other.count
+        self.sum += other.sum
+        if other.min is not None:
+            self.min = other.min if self.min is None else min(self.min, other.min)
+            self.max = other.max if self.max is None else max(self.max, other.max)
+        self._compress()
+        return self
+
+    def _k(self, q):
+        return self.compression / (2 * math.pi) * math.asin(2 * q - 1)
+
+    def _k_inv(self, k):
+        return (math.sin(min(max(k * 2 * math.pi / self.compression, -math.pi / 2), math.pi / 2)) + 1) / 2
+
+    def _compress(self):
+        if not self._buffer:
+            return
+        points = sorted([tuple(c) for c in self.centroids] + self._buffer)
+        self._buffer = []
+        total = sum(w for _, w in points)
+        merged = []
+        mean, weight = points[0]
+        done = 0
+        limit = self._k_inv(self._k(0) + 1) * total
+        for m, w in points[1:]:
+            if done + weight + w <= limit:
+                weight += w
+                mean += (m - mean) * w / weight
+            else:
+                merged.append([mean, weight])
+                done += weight
+                limit = self._k_inv(self._k(done / total) + 1) * total
+                mean, weight = m, w
+        merged.append([mean, weight])
+        self.centroids = merged
+
+    def quantile(self, q):
+        self._compress()
+        if not self.centroids:
+            return None
+        if len(self.centroids) == 1:
+            return self.centroids[0][0]
+        target = q * self.count
+        first_mean, first_weight = self.centroids[0]
+        if target < first_weight / 2:
+            return self.min + (first_mean - self.min) * target / (first_weight / 2)
+        seen = 0
+        for (m0, w0), (m1, w1) in zip(self.centroids, self.centroids[1:]):
+            left = seen + w0 / 2
+            right = seen + w0 + w1 / 2
+            if target <= right:
+                return m0 + (m1 - m0) * (target - left) / (right - left)
+            seen += w0
+        last_mean, last_weight = self.centroids[-1]
+        tail = self.count - last_weight / 2
+        return last_mean + (self.max - last_mean) * min((target - tail) / (last_weight / 2), 1.0)
+
+    # --- persistence ---
+    def to_fields(self):
+        self._compress()
+        packed = array('d', [x for c in self.centroids for x in c])
+        return {
+            'count': self.count,
+            'sum': self.sum,
+            'min': self.min,
+            'max': self.max,
+            'compression': self.compression,
+            'centroids': Binary(packed.tobytes()),
+        }
+
+    @classmethod
+    def from_doc(cls, doc):
+        digest = cls(doc.get('compression', DEFAULT_COMPRESSION))
+        packed = array('d')
+        packed.frombytes(bytes(doc['centroids']))
+        digest.centroids = [[packed[i], packed[i + 1]] for i in range(0, len(packed), 2)]
+        digest.count = doc['count']
+        digest.sum = doc['sum']
+        digest.min = doc['min']
+        digest.max = doc['max']
+        return digest
+
+
+def day_key(ts):
+    return ts.strftime('%Y-%m-%d')
+
+
+def record_resolution(coll, operator, processed_at, seconds, retries=8):
+    """Add one resolution time to the (operator, day) sketch with optimistic concurrency."""
+    key = {'operator': operator or '(unknown)', 'day': day_key(processed_at)}
+    for _ in range(retries):
+        doc = coll.find_one(key)
+        if doc is None:
+            digest = TDigest()
+            digest.add(seconds)
+            try:
+                coll.insert_one({**key, **digest.to_fields(), 'version': 1})
+                return True
+            except DuplicateKeyError:
+                continue
+        digest = TDigest.from_doc(doc)
+        digest.add(seconds)
+        res = coll.update_one({'_id': doc['_id'], 'version': doc['version']},
+                              {'$set': {**digest.to_fields(), 'version': doc['version'] + 1}})
+        if res.modified_count:
+            return True
+    return False
+
+
+def operator_percentiles(coll, since=None, until=None, by_day=False, quantiles=(0.5, 0.9, 0.99)):
+    """
+    Merge sketches per operator (or per operator and day) over [since, until].
+    `since` / `until` are 'YYYY-MM-DD' strings; either may be None.
+    """
+    query = {}
+    if since or until:
+        query['day'] = {}
+        if since:
+            query['day']['$gte'] = since
+        if until:
+            query['day']['$lte'] = until
+
+    merged = {}
+    for doc in coll.find(query):
+        key = (doc['operator'], doc['day']) if by_day else doc['operator']
+        digest = TDigest.from_doc(doc)
+        if key in merged:
+            merged[key].merge(digest)
+        else:
+            merged[key] = digest
+
+    results = []
+    for key, digest in merged.items():
+        entry = {'operator': key[0] if by_day else key}
+        if by_day:
+            entry['day'] = key[1]
+        entry['count'] = digest.count
+        entry['avg_resolution_seconds'] = digest.sum / digest.count if digest.count else None
+        for q in quantiles:
+            entry[f'p{int(q * 100)}_resolution_seconds'] = digest.quantile(q)
+        results.append(entry)
+    results.sort(key=lambda e: (-e['count'], e.get('day', '')))
+    return results
+
+
+def rebuild(processed, coll, include_archived=True):
+    """Recompute every sketch from the `processed` collection and, with include_archived, its archive."""
+    digests = {}
+    cursor = processed.find(
+        {'created_at': {'$exists': True}, 'processed_at': {'$exists': True}},
+        {'processed_by': 1, 'created_at': 1, 'processed_at': 1}
+    )
+    docs = itertools.chain(cursor, archive.iter_archived('processed', newest_first=False)) if include_archived else cursor
+    for doc in docs:
+        if not doc.get('created_at') or not doc.get('processed_at'):
+            continue
+        key = (doc.get('processed_by') or '(unknown)', day_key(doc['processed_at']))
+        seconds = (doc['processed_at'] - doc['created_at']) / timedelta(seconds=1)
+        digests.setdefault(key, TDigest()).add(seconds)
+
+    coll.delete_many({})
+    for (operator, day), digest in digests.items():
+        coll.insert_one({'operator': operator, 'day': day, **digest.to_fields(), 'version': 1})
+    return len(digests)
+
+
+if __name__ == '__main__':
+    import sys
+
+    from app1 import processed, resolution_sketches
+
+    if '--rebuild' not in sys.argv:
+        print('usage: python sketches.py --rebuild [--hot-only]')
+        sys.exit(1)
+    started = datetime.utcnow()
+    n = rebuild(processed, resolution_sketches, include_archived='--hot-only' not in sys.argv)
+    print(f'rebuilt {n} sketches in {(datetime.utcnow() - started).total_seconds():.1f}s')
@@ -0,0 +1,564 @@
+"""
+MT103 parsing and pacs.008 generation, so conversions can be re-run in-house.
+
+iter_mt103() reads a FIN file in fixed-size chunks and yields one parsed
+message at a time, so memory stays constant however many messages the file
+holds. to_record() flattens a message into the fields the queue stores.
+Pacs008Writer serializes records as ISO 20022 pacs.008.001.08 credit
+transfers through xml.sax's XMLGenerator. Transactions are spooled to a
+temporary file while the count and control sum are totalled, and the group
+header is written ahead of them on close. Output streams are binary (UTF-8).
+
+conversion_errors() is what /api/fix (through validate_transaction) and the
+auto-remediation engine run before a record moves to `processed`. It reports
+anything that would stop the record converting, then serializes it once to
+prove it does.
+
+    python swift.py convert payments.fin -o payments.xml [--queue]
+    python swift.py bench --messages 100000
+"""
+import io
+import re
+import shutil
+import tempfile
+import uuid
+from datetime import date, datetime
+from decimal import Decimal
+from xml.sax.saxutils import XMLGenerator
+
+import money
+
+PACS008_NS = 'urn:iso:std:iso:20022:tech:xsd:pacs.008.001.08'
+CHUNK_SIZE = 1 << 20  # characters read per chunk from FIN files
+SPOOL_BYTES = 4 << 20  # transactions kept in memory before spilling to disk
+FLUSH_CHARS = 1 << 16  # XML text buffered before it is encoded into the spool
+AGENT_CACHE = 10000  # rendered agent elements kept per writer; files repeat a handful of banks
+
+MAX_TEXT = 140  # Max140Text: names, agent names
+MAX_REFERENCE = 35  # Max35Text: InstrId, EndToEndId, MsgId
+MAX_ADDRESS_LINES = 7
+MAX_ADDRESS_LINE = 70
+MAX_AMOUNT_DIGITS = 18  # ActiveCurrencyAndAmount: totalDigits 18, fractionDigits 5
+MAX_AMOUNT_FRACTION = 5
+
+CHARGES = {'OUR': 'DEBT', 'BEN': 'CRED', 'SHA': 'SHAR'}
+
+_FIELD = re.compile(r'\r?\n:(\d{2}[A-Z]?):')
+_AMOUNT_32A = re.compile(r'(\d{6})([A-Z]{3})(\d+(?:,\d*)?)$')
+_BIC = re.compile(r'[A-Z]{6}[A-Z2-9][A-NP-Z0-9]([A-Z0-9]{3})?$')
+_IBAN = re.compile(r'[A-Z]{2}[0-9]{2}[A-Za-z0-9]{1,30}$')
+_CURRENCY = re.compile(r'[A-Z]{3}$')
+_CONTROL = re.compile(r'[\x00-\x08\x0b\x0c\x0e-\x1f]')
+_TRUNCATED = re.compile(r'(\.\.\.|…)\s*$')
+
+
+class ConversionError(ValueError):
+    def __init__(self, errors):
+        super().__init__('; '.join(errors))
+        self.errors = errors
+
+
+# --- MT103 ---
+def iter_raw_messages(stream, chunk_size=CHUNK_SIZE):
+    """Yield each '{1:...' message of a FIN text stream; only one chunk plus one message is held at a time."""
+    buffer = ''
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        buffer += chunk
+        end = buffer.rfind('{1:')
+        if end <= 0:
+            continue
+        # everything before the last '{1:' is complete; piece 0 is whatever preceded the first message
+        for piece in buffer[:end].split('{1:')[1:]:
+            yield '{1:' + piece
+        buffer = buffer[end:]
+    for piece in buffer.split('{1:')[1:]:
+        yield '{1:' + piece
+
+
+def _block(raw, number):
+    start = raw.find('{%d:' % number)
+    if start < 0:
+        return None
+    start += 3
+    if number == 4:
+        end = raw.find('-}', start)
+    elif raw.startswith('{', start):
+        # blocks 3 and 5 hold {tag:value} groups, so they end at the first '}}'
+        end = raw.find('}}', start)
+        end = end + 1 if end >= 0 else -1
+    else:
+        end = raw.find('}', start)
+    return raw[start:end] if end >= 0 else None
+
+
+def _bic(address):
+    # 12-character logical terminal: BIC8, terminal code, branch
+    address = address or ''
+    return address[:8] + address[9:12] if len(address) == 12 else address
+
+
+def parse_message(raw):
+    """{'type', 'sender', 'receiver', 'uetr', 'fields': {tag: value}} for one FIN message."""
+    basic, app = _block(raw, 1) or '', _block(raw, 2) or ''
+    if app.startswith('O'):
+        # output message: block 1 is us (receiver), the MIR in block 2 names the sender
+        mt, sender, receiver = app[1:4], _bic(app[14:26]), _bic(basic[3:15])
+    else:
+        mt, sender, receiver = app[1:4], _bic(basic[3:15]), _bic(app[4:16])
+    user = _block(raw, 3) or ''
+    uetr = None
+    at = user.find('{121:')
+    if at >= 0:
+        uetr = user[at + 5:user.find('}', at)]
+
+    fields = {}
+    text = _block(raw, 4)
+    if text is not None:
+        if not text.startswith(('\n', '\r\n')):
+            text = '\n' + text
+        parts = _FIELD.split(text.rstrip('\r\n'))
+        for i in range(1, len(parts) - 1, 2):
+            fields.setdefault(parts[i], parts[i + 1].replace('\r\n', '\n'))
+    return {'type': mt, 'sender': sender, 'receiver': receiver, 'uetr': uetr, 'fields': fields}
+
+
+def iter_mt103(stream, chunk_size=CHUNK_SIZE):
+    for raw in iter_raw_messages(stream, chunk_size):
+        yield parse_message(raw)
+
+
+def _party(value):
+    """(account, name, address lines) of a 50a/59a field."""
+    lines = (value or '').split('\n')
+    account = lines.pop(0)[1:].strip() if lines and lines[0].startswith('/') else None
+    if lines and re.match(r'\d/', lines[0]):
+        # option F: numbered lines, 1/ is the name
+        name = ' '.join(l[2:] for l in lines if l.startswith('1/'))
+        address = [l[2:] for l in lines if l[:1] in '23' and l[1:2] == '/']
+        return account, name, address
+    return account, (lines[0] if lines else ''), lines[1:]
+
+
+def to_record(message):
+    """Flatten a parsed MT103 into queue fields (amount as a plain decimal string)."""
+    fields = message['fields']
+    record = {
+        'message_type': 'MT' + message['type'],
+        'sender': message['sender'],
+        'receiver': message['receiver'],
+        'reference': fields.get('20', '').strip(),
+        'uetr': message['uetr'],
+        'amount': None,
+        'currency': None,
+        'value_date': None,
+    }
+    m = _AMOUNT_32A.match(fields.get('32A', '').strip())
+    if m:
+        yymmdd, record['currency'], amount = m.groups()
+        record['amount'] = amount.replace(',', '.').rstrip('.')
+        try:
+            record['value_date'] = date(2000 + int(yymmdd[:2]), int(yymmdd[2:4]), int(yymmdd[4:])).isoformat()
+        except ValueError:
+            pass
+    debtor = next((fields[t] for t in ('50K', '50F', '50A') if t in fields), None)
+    record['ordering_account'], record['ordering_customer'], _ = _party(debtor)
+    creditor = next((fields[t] for t in ('59', '59F', '59A') if t in fields), None)
+    record['iban'], record['beneficiary_name'], record['beneficiary_address'] = _party(creditor)
+    if '70' in fields:
+        record['remittance'] = ' '.join(fields['70'].split('\n'))
+    if '71A' in fields:
+        record['charges'] = fields['71A'].strip()
+    return record
+
+
+# --- checks ---
+def _compact_iban(iban):
+    return ''.join((iban or '').split()).upper()
+
+
+def iban_checksum_ok(iban):
+    """ISO 13616 mod-97 check."""
+    rearranged = iban[4:] + iban[:4]
+    return int(''.join(str(int(ch, 36)) for ch in rearranged)) % 97 == 1
+
+
+def record_errors(record):
+    """Field-level reasons `record` can't be expressed as a pacs.008 transaction."""
+    errs = []
+    for field in ('sender', 'receiver', 'beneficiary_name', 'ordering_customer', 'reference', 'remittance'):
+        value = record.get(field)
+        if isinstance(value, str) and _CONTROL.search(value):
+            errs.append(f'{field} contains control characters')
+    if errs:
+        return errs
+
+    for field, label in (('sender', 'Instructing agent'), ('receiver', 'Instructed agent')):
+        value = (record.get(field) or '').strip()
+        if not value:
+            errs.append(f'{label} ({field}) missing')
+        elif len(value) > MAX_TEXT:
+            errs.append(f'{label} ({field}) longer than {MAX_TEXT} characters')
+
+    name = (record.get('beneficiary_name') or '').strip()
+    if not name:
+        errs.append('Creditor name (field 59) missing')
+    elif len(name) > MAX_TEXT:
+        errs.append(f'Creditor name (field 59) longer than {MAX_TEXT} characters')
+    elif _TRUNCATED.search(name):
+        errs.append('Creditor name (field 59) is truncated')
+    address = record.get('beneficiary_address') or []
+    if len(address) > MAX_ADDRESS_LINES or any(len(line) > MAX_ADDRESS_LINE for line in address):
+        errs.append(f'Creditor address exceeds {MAX_ADDRESS_LINES} lines of {MAX_ADDRESS_LINE} characters')
+
+    iban = _compact_iban(record.get('iban'))
+    if iban and not (_IBAN.match(iban) and iban_checksum_ok(iban)):
+        errs.append('Creditor IBAN invalid (format or checksum)')
+
+    currency = record.get('currency') or ''
+    if not _CURRENCY.match(currency):
+        errs.append('Currency (field 32A) must be a 3-letter ISO code')
+    try:
+        amount = money.to_decimal(record.get('amount'))
+    except ValueError:
+        errs.append('Amount (field 32A) missing or invalid')
+    else:
+        if amount <= 0:
+            errs.append('Amount (field 32A) must be positive')
+        else:
+            whole, fraction = _amount_digits(amount, currency)
+            if whole + fraction > MAX_AMOUNT_DIGITS or fraction > MAX_AMOUNT_FRACTION:
+                errs.append(f'Amount exceeds {MAX_AMOUNT_DIGITS} digits / {MAX_AMOUNT_FRACTION} decimals')
+
+    reference = (record.get('reference') or '').strip()
+    if len(reference) > MAX_REFERENCE:
+        errs.append(f'Reference (field 20) longer than {MAX_REFERENCE} characters')
+    return errs
+
+
+def conversion_errors(record):
+    """Why `record` would not convert to pacs.008; [] when it converts cleanly."""
+    errs = record_errors(record)
+    if errs:
+        return errs
+    # record_errors should cover every way serialization fails; prove it
+    try:
+        with Pacs008Writer(io.BytesIO()) as writer:
+            writer.add(record, checked=True)
+    except ArithmeticError:
+        # decimal.InvalidOperation and friends: only the amount goes through decimal arithmetic
+        return [f'Amount (field 32A) cannot be written with {MAX_AMOUNT_DIGITS} digits']
+    except (ValueError, TypeError) as e:
+        return [f'pacs.008 serialization failed: {e}']
+    return []
+
+
+# --- pacs.008 ---
+def _leaf(gen, name, text, attrs=None):
+    gen.startElement(name, attrs or {})
+    gen.characters(text)
+    gen.endElement(name)
+
+
+def _agent(gen, name, value):
+    gen.startElement(name, {})
+    gen.startElement('FinInstnId', {})
+    value = value.strip()
+    _leaf(gen, 'BICFI' if _BIC.match(value) else 'Nm', value)
+    gen.endElement('FinInstnId')
+    gen.endElement(name)
+
+
+def _amount_digits(amount, currency):
+    """(integer digits, decimals) of `amount` as _amount_text writes it."""
+    fraction = max(money.exponent(currency), -min(amount.as_tuple().exponent, 0))
+    # adjusted() is the power of ten of the leading digit, so it counts exponent notation ('1E+20') too
+    return max(amount.adjusted() + 1, 1), fraction
+
+
+def _amount_text(amount, currency):
+    # minor units as the currency defines them, never fewer
+    _, exp = _amount_digits(amount, currency)
+    return format(amount.quantize(Decimal(1).scaleb(-exp)), 'f')
+
+
+class Pacs008Writer:
+    """
+    One pacs.008 Document with a CdtTrfTxInf per added record, written to the
+    binary stream `out` on close. Use as a context manager.
+    """
+
+    def __init__(self, out, msg_id=None, created=None):
+        self.out = out
+        self.msg_id = (msg_id or uuid.uuid4().hex)[:MAX_REFERENCE]
+        self.created = created or datetime.utcnow()
+        self.count = 0
+        self.total = Decimal(0)
+        self._spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_BYTES, mode='w+b')
+        # XMLGenerator makes a write per tag and per text node; collect them in memory, spool in larger pieces
+        self._text = io.StringIO()
+        self._gen = XMLGenerator(self._text, encoding='utf-8', short_empty_elements=True)
+        self._agents = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self._spool.close()
+
+    def add(self, record, checked=False):
+        """Append one transaction; raises ConversionError unless `checked` says record_errors() passed."""
+        if not checked:
+            errors = record_errors(record)
+            if errors:
+                raise ConversionError(errors)
+        gen = self._gen
+        currency = record['currency']
+        amount = money.to_decimal(record['amount'])
+        reference = (record.get('reference') or '').strip() or 'NOTPROVIDED'
+
+        gen.startElement('CdtTrfTxInf', {})
+        gen.startElement('PmtId', {})
+        _leaf(gen, 'InstrId', reference)
+        _leaf(gen, 'EndToEndId', reference)
+        if record.get('uetr'):
+            _leaf(gen, 'UETR', record['uetr'])
+        gen.endElement('PmtId')
+        _leaf(gen, 'IntrBkSttlmAmt', _amount_text(amount, currency), {'Ccy': currency})
+        _leaf(gen, 'IntrBkSttlmDt', record.get('value_date') or date.today().isoformat())
+        _leaf(gen, 'ChrgBr', CHARGES.get(record.get('charges'), 'SHAR'))
+        self._agent('InstgAgt', record['sender'])
+        self._agent('InstdAgt', record['receiver'])
+
+        gen.startElement('Dbtr', {})
+        _leaf(gen, 'Nm', (record.get('ordering_customer') or '').strip()[:MAX_TEXT] or 'NOTPROVIDED')
+        gen.endElement('Dbtr')
+        if record.get('ordering_account'):
+            gen.startElement('DbtrAcct', {})
+            gen.startElement('Id', {})
+            gen.startElement('Othr', {})
+            _leaf(gen, 'Id', record['ordering_account'][:34])
+            gen.endElement('Othr')
+            gen.endElement('Id')
+            gen.endElement('DbtrAcct')
+        self._agent('DbtrAgt', record['sender'])
+        self._agent('CdtrAgt', record['receiver'])
+
+        gen.startElement('Cdtr', {})
+        _leaf(gen, 'Nm', record['beneficiary_name'].strip())
+        if record.get('beneficiary_address'):
+            gen.startElement('PstlAdr', {})
+            for line in record['beneficiary_address']:
+                _leaf(gen, 'AdrLine', line)
+            gen.endElement('PstlAdr')
+        gen.endElement('Cdtr')
+        iban = _compact_iban(record.get('iban'))
+        if iban:
+            gen.startElement('CdtrAcct', {})
+            gen.startElement('Id', {})
+            _leaf(gen, 'IBAN', iban)
+            gen.endElement('Id')
+            gen.endElement('CdtrAcct')
+        if record.get('remittance'):
+            gen.startElement('RmtInf', {})
+            _leaf(gen, 'Ustrd', record['remittance'][:MAX_TEXT])
+            gen.endElement('RmtInf')
+        gen.endElement('CdtTrfTxInf')
+
+        self.count += 1
+        self.total += amount
+        if self._text.tell() >= FLUSH_CHARS:
+            self._flush()
+
+    def _agent(self, name, value):
+        # written straight to the buffer; only valid where the generator has no start tag pending
+        key = (name, value)
+        xml = self._agents.get(key)
+        if xml is None:
+            out = io.StringIO()
+            _agent(XMLGenerator(out, encoding='utf-8', short_empty_elements=True), name, value)
+            xml = out.getvalue()
+            if len(self._agents) < AGENT_CACHE:
+                self._agents[key] = xml
+        self._text.write(xml)
+
+    def _flush(self):
+        self._spool.write(self._text.getvalue().encode('utf-8'))
+        self._text.seek(0)
+        self._text.truncate()
+
+    def close(self):
+        gen = XMLGenerator(self.out, encoding='utf-8', short_empty_elements=True)
+        gen.startDocument()
+        gen.startElement('Document', {'xmlns': PACS008_NS})
+        gen.startElement('FIToFICstmrCdtTrf', {})
+        gen.startElement('GrpHdr', {})
+        _leaf(gen, 'MsgId', self.msg_id)
+        _leaf(gen, 'CreDtTm', self.created.strftime('%Y-%m-%dT%H:%M:%S'))
+        _leaf(gen, 'NbOfTxs', str(self.count))
+        _leaf(gen, 'CtrlSum', format(self.total, 'f'))
+        gen.startElement('SttlmInf', {})
+        _leaf(gen, 'SttlmMtd', 'INDA')
+        gen.endElement('SttlmInf')
+        gen.endElement('GrpHdr')
+        self._flush()
+        self._spool.seek(0)
+        shutil.copyfileobj(self._spool, self.out)
+        self._spool.close()
+        gen.endElement('FIToFICstmrCdtTrf')
+        gen.endElement('Document')
+        self.out.write(b'\n')
+
+
+def to_pacs008(record, msg_id=None):
+    """pacs.008 XML (bytes) for a single record; raises ConversionError."""
+    out = io.BytesIO()
+    with Pacs008Writer(out, msg_id=msg_id) as writer:
+        writer.add(record)
+    return out.getvalue()
+
+
+def convert(stream, out, on_failure=None):
+    """
+    Convert every MT103 in the FIN text `stream` into one pacs.008 written to
+    the binary stream `out`. Messages that don't convert go to on_failure(record, errors).
+    Returns (converted, failed).
+    """
+    failed = 0
+    with Pacs008Writer(out) as writer:
+        for message in iter_mt103(stream):
+            record = to_record(message)
+            errors = record_errors(record)
+            if errors:
+                failed += 1
+                if on_failure:
+                    on_failure(record, errors)
+                continue
+            writer.add(record, checked=True)
+    return writer.count, failed
+
+
+# --- benchmark ---
+_NAMES = ['Johnathan Williams', 'Maria Garcia Lopez', 'ACME Industrial Supplies Ltd', 'Li Wei', 'Olga Petrova']
+_IBANS = ['GB29NWBK60161331926819', 'DE89370400440532013000', 'FR1420041010050500013M02606', 'NL91ABNA0417164300']
+
+
+def synthetic_message(i):
+    """A valid MT103 FIN message; every 50th has a truncated beneficiary, every 97th a bad IBAN."""
+    name = _NAMES[i % len(_NAMES)]
+    if i % 50 == 0:
+        name = name[:14] + '...'
+    iban = _IBANS[i % len(_IBANS)]
+    if i % 97 == 0:
+        iban = iban[:-1] + str((int(iban[-1], 36) + 1) % 10)
+    amount = f'{(i * 37) % 100000 + 1},{i % 100:02d}'
+    return (
+        '{1:F01ABCDGB2LAXXX0000000000}{2:I103XYZBDEFFXXXXN}{3:{121:%s}}{4:\r\n'
+        ':20:REF%010d\r\n:23B:CRED\r\n:32A:250107USD%s\r\n'
+        ':50K:/12345678\r\nORDERING CUSTOMER %d\r\n1 MAIN STREET\r\n'
+        ':59:/%s\r\n%s\r\n10 HIGH STREET\r\nLONDON\r\n'
+        ':70:INVOICE %d\r\n:71A:SHA\r\n-}\r\n'
+    ) % (uuid.UUID(int=i, version=4), i, amount, i, iban, name, i)
+
+
+def bench(messages, path=None):
+    """Write `messages` synthetic MT103s to a file, then time parsing and parse+convert over it."""
+    import os
+    import time
+    try:
+        import resource
+    except ImportError:  # not on Windows
+        resource = None
+
+    def rss_mb():
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024 if resource else float('nan')
+
+    own = path is None
+    if own:
+        fd, path = tempfile.mkstemp(suffix='.fin')
+        os.close(fd)
+    try:
+        with open(path, 'w', encoding='utf-8', newline='') as fh:
+            for i in range(messages):
+                fh.write(synthetic_message(i))
+        size_mb = os.path.getsize(path) / 1e6
+        results = {'messages': messages, 'file_mb': round(size_mb, 1), 'peak_rss_mb_before': round(rss_mb(), 1)}
+
+        started = time.perf_counter()
+        with open(path, encoding='utf-8', newline='') as fh:
+            parsed = sum(1 for _ in iter_mt103(fh))
+        seconds = time.perf_counter() - started
+        results['parse'] = {'messages': parsed, 'seconds': round(seconds, 3),
+                            'messages_per_second': round(parsed / seconds), 'mb_per_second': round(size_mb / seconds, 1)}
+
+        started = time.perf_counter()
+        with open(path, encoding='utf-8', newline='') as fh, \
+                tempfile.TemporaryFile() as out:
+            converted, failed = convert(fh, out)
+            xml_mb = out.tell() / 1e6
+        seconds = time.perf_counter() - started
+        results['convert'] = {'converted': converted, 'failed': failed, 'seconds': round(seconds, 3),
+                              'messages_per_second': round(messages / seconds), 'xml_mb': round(xml_mb, 1)}
+        results['peak_rss_mb_after'] = round(rss_mb(), 1)
+        return results
+    finally:
+        if own:
+            os.remove(path)
+
+
+if __name__ == '__main__':
+    import argparse
+    import json
+    import sys
+
+    parser = argparse.ArgumentParser(description='MT103 -> pacs.008 conversion')
+    sub = parser.add_subparsers(dest='command', required=True)
+    p_convert = sub.add_parser('convert', help='convert a FIN file of MT103s into one pacs.008')
+    p_convert.add_argument('input')
+    p_convert.add_argument('-o', '--output', help='pacs.008 file (default: stdout)')
+    p_convert.add_argument('--queue', action='store_true',
+                           help='add messages that fail conversion to the exception queue')
+    p_bench = sub.add_parser('bench', help='time parsing and conversion of synthetic MT103s')
+    p_bench.add_argument('--messages', type=int, default=100000)
+    p_bench.add_argument('--file', help='keep the generated FIN file here instead of a temp file')
+    args = parser.parse_args()
+
+    if args.command == 'bench':
+        print(json.dumps(bench(args.messages, args.file), indent=2))
+        sys.exit(0)
+
+    pending, queued = [], [0, 0]
+    if args.queue:
+        import dedup
+        from app1 import exceptions
+
+    def flush():
+        inserted, collapsed = dedup.insert_exceptions(exceptions, pending)
+        queued[0] += inserted
+        queued[1] += collapsed
+        pending.clear()
+
+    def queue_failure(record, errors):
+        doc = dict(record, error='; '.join(errors))
+        try:
+            doc.update(money.amount_fields(record['amount'], record['currency']))
+        except (ValueError, TypeError):
+            pass
+        pending.append(doc)
+        if len(pending) >= dedup.BATCH_SIZE:
+            flush()
+
+    out = open(args.output, 'wb') if args.output else sys.stdout.buffer
+    with open(args.input, encoding='utf-8', newline='') as fh:
+        converted, failed = convert(fh, out, queue_failure if args.queue else None)
+    if args.output:
+        out.close()
+    if pending:
+        flush()
+    print(f'converted {converted}, failed {failed}' +
+          (f', queued {queued[0]} new exceptions ({queued[1]} duplicates)' if args.queue else ''), file=sys.stderr)
@@ -0,0 +1,61 @@
+import os
+import sys
+
+import pytest
+
+# the backend is a flat set of modules run from its own directory
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def mongo():
+    """A fresh in-memory database; tests that need one are skipped without mongomock."""
+    mongomock = pytest.importorskip('mongomock')
+    return mongomock.MongoClient().db
+
+
+@pytest.fixture
+def archive_dir(tmp_path, monkeypatch):
+    import archive
+    monkeypatch.setattr(archive, 'ARCHIVE_DIR', str(tmp_path / 'archive'))
+    return tmp_path / 'archive'
+
+
+@pytest.fixture(scope='session')
+def _app_module():
+    mongomock = pytest.importorskip('mongomock')
+    import pymongo
+
+    class Client(mongomock.MongoClient):
+        def __init__(self, *args, **kwargs):
+            # TLS and listener options mean nothing to the in-memory client
+            super().__init__()
+
+    os.environ.setdefault('JWT_SECRET_KEY', 'test-secret-key-that-is-long-enough-for-hs256')
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setattr(pymongo, 'MongoClient', Client)
+        import app1
+    import ratelimit
+    app1.limiter.classes = {name: ratelimit.Limit(1e6, 1e6, None, None) for name in app1.limiter.classes}
+    return app1
+
+
+@pytest.fixture
+def app1(_app_module):
+    """app1 on an in-memory database, emptied for each test, with rate limits out of the way."""
+    for name in _app_module.db.list_collection_names():
+        _app_module.db[name].delete_many({})
+    _app_module._dashboard_cache.clear()
+    return _app_module
+
+
+@pytest.fixture
+def client(app1):
+    return app1.app.test_client()
+
+
+@pytest.fixture
+def auth(app1):
+    from flask_jwt_extended import create_access_token
+    with app1.app.app_context():
+        return {'Authorization': 'Bearer ' + create_access_token(identity='alice')}
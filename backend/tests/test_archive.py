@@ -0,0 +1,75 @@
+import os
+from datetime import datetime, timedelta
+
+from bson.decimal128 import Decimal128
+
+import archive
+
+CUTOFF = datetime(2025, 3, 1)
+
+
+def _seed(coll, n=12, start=datetime(2025, 1, 10)):
+    for i in range(n):
+        coll.insert_one({'processed_at': start + timedelta(days=5 * i), 'processed_by': 'alice' if i % 3 else 'bob',
+                         'amount': Decimal128('10.50'), 'reference': f'R{i}'})
+
+
+def test_old_records_move_to_monthly_files(mongo, archive_dir):
+    _seed(mongo.processed)
+    moved = archive.archive_collection(mongo.processed, 'processed', CUTOFF, batch_size=4)
+
+    assert moved == 10  # Jan 10 .. Feb 24
+    assert mongo.processed.count_documents({}) == 2
+    manifest = archive.load_manifest('processed')
+    assert sorted(manifest['months']) == ['2025-01', '2025-02']
+    assert manifest['pending_delete'] == []
+    for entry in manifest['months'].values():
+        assert os.path.getsize(archive_dir / 'processed' / entry['file']) == entry['bytes']
+
+
+def test_archived_documents_round_trip_with_bson_types(mongo, archive_dir):
+    _seed(mongo.processed)
+    originals = {d['reference']: d for d in mongo.processed.find({'processed_at': {'$lt': CUTOFF}})}
+    archive.archive_collection(mongo.processed, 'processed', CUTOFF)
+
+    docs = list(archive.iter_archived('processed'))
+    assert {d['reference']: d for d in docs} == originals
+    assert [d['processed_at'] for d in docs] == sorted((d['processed_at'] for d in docs), reverse=True)
+    february = list(archive.iter_archived('processed', since=datetime(2025, 2, 1), until=datetime(2025, 2, 15)))
+    assert [d['reference'] for d in february] == ['R7', 'R6', 'R5']
+
+
+def test_counts_come_from_the_manifest(mongo, archive_dir):
+    _seed(mongo.processed)
+    archive.archive_collection(mongo.processed, 'processed', CUTOFF)
+    assert archive.archived_counts('processed') == (10, {'bob': 4, 'alice': 6})
+    total, _ = archive.archived_counts('processed', since=datetime(2025, 2, 1))
+    assert total == 5
+
+
+def test_a_rerun_finishes_pending_deletes_without_archiving_twice(mongo, archive_dir):
+    _seed(mongo.processed)
+    archive.archive_collection(mongo.processed, 'processed', CUTOFF)
+    # simulate a run that wrote its last batch but died before deleting it
+    written = next(archive.iter_archived('processed'))
+    mongo.processed.insert_one(written)
+    manifest = archive.load_manifest('processed')
+    manifest['pending_delete'] = [str(written['_id'])]
+    archive._save_manifest('processed', manifest)
+
+    assert archive.archive_collection(mongo.processed, 'processed', CUTOFF) == 0
+    assert mongo.processed.count_documents({}) == 2
+    assert archive.archived_counts('processed')[0] == 10
+    assert len(list(archive.iter_archived('processed'))) == 10
+
+
+def test_processed_accepts_utc_offsets_with_archived_records(app1, client, archive_dir):
+    _seed(app1.processed)
+    archive.archive_collection(app1.processed, 'processed', CUTOFF)
+    naive = client.get('/api/processed?include_archived=1&since=2025-02-01T00:00:00&until=2025-02-15T00:00:00')
+    for since in ('2025-02-01T00:00:00Z', '2025-02-01T02:00:00+02:00'):
+        res = client.get('/api/processed', query_string={'include_archived': 1, 'since': since,
+                                                         'until': '2025-02-15T00:00:00+00:00'})
+        assert res.status_code == 200
+        assert res.get_json()['processed'] == naive.get_json()['processed']
+    assert [d['reference'] for d in naive.get_json()['processed']] == ['R7', 'R6', 'R5']
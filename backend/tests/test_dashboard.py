@@ -0,0 +1,38 @@
+from datetime import datetime, timedelta
+
+import pytest
+from bson.decimal128 import Decimal128
+
+
+@pytest.fixture
+def seeded(app1):
+    now = datetime.utcnow()
+    for i, (mt, error) in enumerate([('MT103', 'IBAN format invalid'), ('MT103', 'Amount invalid'),
+                                     ('MT202', 'IBAN format invalid')]):
+        app1.exceptions.insert_one({'message_type': mt, 'error': error, 'currency': 'USD',
+                                    'amount': Decimal128('10.00'), 'created_at': now - timedelta(days=i)})
+    app1.processed.insert_one({'processed_by': 'alice', 'currency': 'EUR', 'amount': Decimal128('5.00'),
+                               'created_at': now - timedelta(hours=2), 'processed_at': now})
+
+
+def test_dashboard_counts(client, seeded):
+    stats = client.get('/api/dashboard?days=7').get_json()
+    assert stats['total_exceptions'] == 3
+    assert stats['total_processed'] == 1
+    assert {'message_type': 'MT103', 'count': 2} in stats['exceptions_by_message_type']
+    assert stats['top_errors'][0] == {'error': 'IBAN format invalid', 'count': 2}
+    assert stats['processed_by_operator'] == [{'operator': 'alice', 'count': 1}]
+
+
+def test_unchanged_dashboard_is_a_304_and_results_are_cached(app1, client, seeded):
+    res = client.get('/api/dashboard?days=7')
+    etag = res.headers['ETag']
+    assert client.get('/api/dashboard?days=7', headers={'If-None-Match': etag}).status_code == 304
+
+    # within DASHBOARD_CACHE_SECONDS new data is not visible yet...
+    app1.exceptions.insert_one({'message_type': 'MT103', 'error': 'x', 'created_at': datetime.utcnow()})
+    assert client.get('/api/dashboard?days=7', headers={'If-None-Match': etag}).status_code == 304
+    # ...and once the entry is recomputed the ETag moves
+    app1._dashboard_cache.clear()
+    res = client.get('/api/dashboard?days=7', headers={'If-None-Match': etag})
+    assert res.status_code == 200 and res.get_json()['total_exceptions'] == 4
@@ -0,0 +1,77 @@
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+from bson import Decimal128
+from pymongo.errors import BulkWriteError
+
+import dedup
+
+PAYMENT = {'message_type': 'MT103', 'sender': 'DEUTDEFFXXX', 'receiver': 'CHASUS33XXX',
+           'iban': 'GB82WEST12345698765432', 'amount': '5000.00', 'currency': 'EUR',
+           'beneficiary_name': 'John Smith'}
+
+
+@pytest.mark.parametrize('variant', [
+    {'amount': 5000},
+    {'amount': '5000'},
+    {'amount': Decimal128('5000.00')},
+    {'iban': 'gb82 west 1234 5698 7654 32'},
+    {'beneficiary_name': '  john   SMITH '},
+    {'sender': 'deutdeffxxx'},
+    {'error': 'IBAN format invalid', 'created_at': datetime(2025, 1, 1), '_id': 'x'},  # not payment fields
+])
+def test_formatting_does_not_change_the_fingerprint(variant):
+    assert dedup.fingerprint(dict(PAYMENT, **variant)) == dedup.fingerprint(PAYMENT)
+
+
+@pytest.mark.parametrize('variant', [
+    {'amount': '5000.01'},
+    {'currency': 'USD'},
+    {'beneficiary_name': 'Jon Smith'},
+    {'iban': None},
+    {'amount': 'n/a'},
+])
+def test_payment_changes_change_the_fingerprint(variant):
+    assert dedup.fingerprint(dict(PAYMENT, **variant)) != dedup.fingerprint(PAYMENT)
+
+
+def test_upsert_counts_repeats_and_keeps_the_first_fields():
+    now = datetime(2025, 1, 1)
+    op = dedup._upsert(dict(PAYMENT, _id='x', occurrences=7), now)
+    assert op._filter == {'fingerprint': dedup.fingerprint(PAYMENT)}
+    assert op._doc['$inc'] == {'occurrences': 1}
+    assert op._doc['$setOnInsert'] == dict(PAYMENT, created_at=now)
+    assert op._upsert
+
+
+class RacingCollection:
+    """Fails the first bulk write's second upsert with a duplicate key, as a concurrent insert would."""
+
+    def __init__(self):
+        self.calls = []
+
+    def bulk_write(self, ops, ordered):
+        self.calls.append(ops)
+        if len(self.calls) == 1:
+            raise BulkWriteError({'writeErrors': [{'index': 1, 'code': dedup.DUPLICATE_KEY}],
+                                  'nUpserted': 1, 'nMatched': 0})
+        return SimpleNamespace(upserted_count=0, matched_count=len(ops))
+
+
+def test_duplicate_key_races_are_retried_as_repeats():
+    coll = RacingCollection()
+    second = dict(PAYMENT, amount='1.00')
+    assert dedup.insert_exceptions(coll, [PAYMENT, second]) == (1, 1)
+    assert coll.calls[1][0]._filter == {'fingerprint': dedup.fingerprint(second)}
+
+
+def test_backfill_dry_run_counts_without_writing(mongo):
+    coll = mongo.exceptions
+    coll.insert_many([
+        dict(PAYMENT, created_at=datetime(2025, 1, 2)),
+        dict(PAYMENT, amount=5000, created_at=datetime(2025, 1, 1), occurrences=3),
+        dict(PAYMENT, currency='USD', fingerprint=dedup.fingerprint(dict(PAYMENT, currency='USD'))),
+    ])
+    assert dedup.backfill(coll, mongo.tombstones, dry_run=True) == (2, 1)
+    assert coll.count_documents({}) == 3 and coll.count_documents({'fingerprint': {'$exists': True}}) == 1
@@ -0,0 +1,87 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+T0 = datetime(2025, 5, 1, 9, 0)
+
+
+@pytest.fixture
+def queue(app1):
+    # 7 records, three sharing a created_at so paging has to break ties on _id
+    stamps = [T0 + timedelta(minutes=m) for m in (0, 1, 2, 2, 2, 3, 4)]
+    ids = [app1.exceptions.insert_one({'reference': f'R{i}', 'created_at': ts}).inserted_id
+           for i, ts in enumerate(stamps)]
+    return [str(i) for i in ids]
+
+
+def _pages(client, limit):
+    pages, after = [], None
+    while True:
+        url = f'/api/exceptions?limit={limit}' + (f'&after={after}' if after else '')
+        body = client.get(url).get_json()
+        pages.append([d['reference'] for d in body['exceptions']])
+        after = body['next_cursor']
+        if not after:
+            return pages
+
+
+def test_keyset_pages_cover_the_queue_once_newest_first(client, queue):
+    pages = _pages(client, 3)
+    assert [len(p) for p in pages] == [3, 3, 1]
+    flat = [r for p in pages for r in p]
+    assert flat == ['R6', 'R5', 'R4', 'R3', 'R2', 'R1', 'R0']
+
+
+def test_last_full_page_has_no_cursor(client, queue):
+    body = client.get('/api/exceptions?limit=7').get_json()
+    assert len(body['exceptions']) == 7 and body['next_cursor'] is None
+
+
+def test_unpaged_request_returns_everything(client, queue):
+    body = client.get('/api/exceptions').get_json()
+    assert len(body['exceptions']) == 7 and body['next_cursor'] is None
+
+
+@pytest.mark.parametrize('after', ['garbage', '2025-05-01T09:00:00|not-an-id', 'x|' + '0' * 24])
+def test_malformed_cursor_is_rejected(client, queue, after):
+    assert client.get(f'/api/exceptions?limit=2&after={after}').status_code == 400
+
+
+def test_single_exception_supports_conditional_get(app1, client, queue):
+    res = client.get(f'/api/exceptions/{queue[0]}')
+    assert res.status_code == 200
+    assert res.get_json()['exception']['reference'] == 'R0'
+    etag = res.headers['ETag']
+
+    assert client.get(f'/api/exceptions/{queue[0]}', headers={'If-None-Match': etag}).status_code == 304
+    app1.exceptions.update_one({'reference': 'R0'}, {'$set': {'amount': '5.00'}})
+    assert client.get(f'/api/exceptions/{queue[0]}', headers={'If-None-Match': etag}).status_code == 200
+
+
+def test_single_exception_errors(client):
+    assert client.get('/api/exceptions/not-an-id').status_code == 400
+    assert client.get('/api/exceptions/' + '0' * 24).status_code == 404
+
+
+def test_changed_since_returns_changes_and_removals(app1, client, queue):
+    from test_fix import VALID
+
+    watermark = client.get('/api/exceptions').get_json()['watermark']
+    since = datetime.fromisoformat(watermark)
+    later = since + timedelta(seconds=5)
+    app1.exceptions.update_one({'reference': 'R1'}, {'$set': {'amount': '9.00', 'updated_at': later}})
+    app1.exceptions.insert_one({'reference': 'R7', 'created_at': later})
+    target = app1.exceptions.insert_one(dict(VALID, created_at=T0)).inserted_id
+    assert client.post('/api/fix', json={'tx_id': str(target), 'operator': 'alice', 'tx': {'amount': '100.00'}}).status_code == 200
+
+    body = client.get(f'/api/exceptions?changed_since={watermark}').get_json()
+    assert sorted(d['reference'] for d in body['exceptions']) == ['R1', 'R7']
+    assert body['removed'] == [str(target)]
+    assert datetime.fromisoformat(body['watermark']) > since
+
+
+def test_changed_since_too_old_asks_for_a_reload(app1, client):
+    since = (datetime.utcnow() - timedelta(days=app1.TOMBSTONE_RETENTION_DAYS + 1)).isoformat()
+    body = client.get(f'/api/exceptions?changed_since={since}').get_json()
+    assert body['resync'] is True
+    assert client.get('/api/exceptions?changed_since=yesterday').status_code == 400
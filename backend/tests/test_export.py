@@ -0,0 +1,24 @@
+import json
+from datetime import datetime, timedelta
+
+from bson.decimal128 import Decimal128
+
+
+def test_export_streams_the_filtered_queue_as_ndjson(app1, client):
+    t0 = datetime(2025, 5, 1)
+    for i in range(5):
+        app1.exceptions.insert_one({'reference': f'R{i}', 'currency': 'EUR' if i % 2 else 'USD',
+                                    'amount': Decimal128(f'{i}.50'), 'created_at': t0 + timedelta(minutes=i)})
+
+    res = client.get('/api/exceptions/export?currency=usd')
+    assert res.status_code == 200
+    assert res.mimetype == 'application/x-ndjson'
+    assert res.headers['X-Total-Count'] == '3'
+    docs = [json.loads(line) for line in res.get_data(as_text=True).splitlines()]
+    assert [d['reference'] for d in docs] == ['R4', 'R2', 'R0']
+    assert docs[0]['amount'] == '4.50'
+    assert docs[0]['created_at'] == '2025-05-01T00:04:00'
+
+
+def test_export_rejects_bad_amount_filters(client):
+    assert client.get('/api/exceptions/export?min_amount=lots').status_code == 400
@@ -0,0 +1,41 @@
+from datetime import datetime
+
+import pytest
+
+VALID = {
+    'message_type': 'MT103', 'sender': 'DEUTDEFFXXX', 'receiver': 'CHASUS33XXX',
+    'iban': 'GB82WEST12345698765432', 'currency': 'USD', 'amount': '100.00',
+    'beneficiary_name': 'John Smith', 'ordering_customer': 'ACME Ltd', 'reference': 'REF1',
+}
+
+
+@pytest.fixture
+def queued(app1):
+    return str(app1.exceptions.insert_one(dict(VALID, created_at=datetime.utcnow())).inserted_id)
+
+
+def test_fix_moves_the_record_with_exact_amount(app1, client, queued):
+    res = client.post('/api/fix', json={'tx_id': queued, 'operator': 'alice', 'tx': {'amount': '250.5'}})
+    assert res.status_code == 200, res.get_json()
+    doc = app1.processed.find_one()
+    assert str(doc['amount']) == '250.50' and doc['amount_minor'] == 25050
+    assert app1.exceptions.count_documents({}) == 0
+    assert app1.audit.find_one()['operator'] == 'alice'
+
+
+@pytest.mark.parametrize('amount, error', [
+    ('1e6000', 'Amount too large'),
+    ('1E+20', 'Amount exceeds 18 digits / 5 decimals'),
+    ('abc', 'Amount invalid'),
+    ('-5', 'Amount must be positive'),
+    ('10.001', 'Amount has more decimals than USD allows'),
+])
+def test_bad_amounts_are_field_errors_not_server_errors(app1, client, queued, amount, error):
+    res = client.post('/api/fix', json={'tx_id': queued, 'operator': 'alice', 'tx': {'amount': amount}})
+    assert res.status_code == 400
+    assert error in res.get_json()['errors']
+    assert app1.exceptions.count_documents({}) == 1
+
+
+def test_oversized_filter_bound_is_a_bad_request(client):
+    assert client.get('/api/exceptions?min_amount=' + '1' * 40).status_code == 400
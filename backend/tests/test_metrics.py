@@ -0,0 +1,144 @@
+from types import SimpleNamespace
+
+import pytest
+
+import metrics
+
+
+@pytest.fixture
+def registry(monkeypatch):
+    reg = metrics.Registry()
+    monkeypatch.setattr(metrics, 'registry', reg)
+    return reg
+
+
+def _event(name='find', **extra):
+    return SimpleNamespace(command_name=name, command={name: 'exceptions'}, reply={'ok': 1},
+                           duration_micros=2500, **extra)
+
+
+def test_histogram_buckets_are_upper_bounds():
+    hist = metrics.Histogram(buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 2.0):
+        hist.observe(value)
+    assert hist.counts == [2, 1, 1]
+    assert hist.count == 4
+    assert hist.sum == pytest.approx(2.65)
+
+
+def test_render_is_cumulative_prometheus_text(registry):
+    registry.observe('mongo_command_duration_seconds', {'command': 'find'}, 0.002)
+    registry.observe('mongo_command_duration_seconds', {'command': 'find'}, 0.2)
+    registry.inc('mongo_commands_total', {'command': 'find'}, 2)
+    lines = registry.render().splitlines()
+
+    assert '# TYPE mongo_command_duration_seconds histogram' in lines
+    assert 'mongo_command_duration_seconds_bucket{command="find",le="0.001"} 0' in lines
+    assert 'mongo_command_duration_seconds_bucket{command="find",le="0.005"} 1' in lines
+    assert 'mongo_command_duration_seconds_bucket{command="find",le="0.25"} 2' in lines
+    assert 'mongo_command_duration_seconds_bucket{command="find",le="+Inf"} 2' in lines
+    assert 'mongo_command_duration_seconds_count{command="find"} 2' in lines
+    assert 'mongo_commands_total{command="find"} 2' in lines
+
+
+def test_label_values_are_escaped(registry):
+    registry.inc('mongo_commands_total', {'route': 'a"b\\c'})
+    assert 'mongo_commands_total{route="a\\"b\\\\c"} 1' in registry.render()
+
+
+def test_command_listener_times_without_sizing_by_default(registry):
+    listener = metrics.CommandMetrics(sizes=False)
+    listener.started(_event())
+    listener.succeeded(_event())
+    out = registry.render()
+    assert 'mongo_commands_total{command="find",route="(background)"} 1' in out
+    assert 'mongo_command_bytes_total' not in out
+
+
+def test_command_listener_sizes_when_enabled(registry):
+    listener = metrics.CommandMetrics(sizes=True)
+    listener.started(_event())
+    listener.succeeded(_event())
+    out = registry.render()
+    assert 'direction="sent"' in out
+    assert 'direction="received"' in out
+
+
+def test_command_listener_charges_the_current_request(registry):
+    ctx = metrics.RequestContext('/api/exceptions')
+    metrics._local.ctx = ctx
+    try:
+        listener = metrics.CommandMetrics()
+        listener.succeeded(_event())
+        listener.failed(_event())
+    finally:
+        metrics._local.ctx = None
+    assert ctx.db_commands == 2
+    assert ctx.db_seconds == pytest.approx(0.005)
+    assert 'mongo_command_failures_total{command="find",route="/api/exceptions"} 1' in registry.render()
+
+
+@pytest.mark.parametrize('sizes', [True, False])
+def test_server_timing_reports_bytes_only_from_a_sizing_listener(registry, monkeypatch, sizes):
+    from flask import Flask
+    monkeypatch.setattr(metrics, 'COMMAND_BYTES', not sizes)  # the environment must not matter
+    app = Flask(__name__)
+    app.config['SERVER_TIMING_THRESHOLD_MS'] = 0
+    metrics.install(app)
+    listener = metrics.CommandMetrics(sizes=sizes)
+
+    @app.route('/q')
+    def q():
+        listener.started(_event())
+        listener.succeeded(_event())
+        return 'ok'
+
+    timing = app.test_client().get('/q').headers['Server-Timing']
+    assert ('bytes' in timing) == sizes
+    assert 'desc="1 commands' in timing
+
+
+def _upload(*actions, counts=None):
+    counts = counts or [0, 1] + [0] * (len(metrics.LATENCY_BUCKETS) - 1)
+    return {'buckets': list(metrics.LATENCY_BUCKETS),
+            'histograms': [{'kind': 'api', 'action': a, 'phase': 'total', 'counts': counts, 'sum': 0.004,
+                            'count': sum(counts)} for a in actions]}
+
+
+def test_client_timings_merge_into_one_series(registry):
+    assert metrics.record_client_timings(_upload('GET /exceptions')) == (1, 0)
+    assert metrics.record_client_timings(_upload('GET /exceptions')) == (1, 0)
+    out = registry.render()
+    assert 'client_duration_seconds_count{action="GET /exceptions",kind="api",phase="total"} 2' in out
+    assert 'client_duration_seconds_bucket{action="GET /exceptions",kind="api",phase="total",le="0.005"} 2' in out
+
+
+@pytest.mark.parametrize('payload', [
+    None,
+    {'buckets': [0.1, 1.0], 'histograms': []},
+    dict(_upload('GET /x'), histograms=[{'kind': 'api'}]),
+    dict(_upload('GET /x'), histograms=[dict(_upload('GET /x')['histograms'][0], kind='db')]),
+    _upload('GET /x\n'),
+    _upload('GET /x', counts=[1] * 3),
+])
+def test_malformed_client_timings_are_rejected(registry, payload):
+    with pytest.raises(ValueError):
+        metrics.record_client_timings(payload)
+    assert 'client_duration_seconds' not in registry.render()
+
+
+def test_client_series_are_capped(registry, monkeypatch):
+    monkeypatch.setattr(metrics, 'CLIENT_MAX_SERIES', 2)
+    assert metrics.record_client_timings(_upload('GET /a', 'GET /b', 'GET /c')) == (2, 1)
+    # existing series keep merging once the cap is reached
+    assert metrics.record_client_timings(_upload('GET /a', 'GET /d')) == (1, 1)
+    out = registry.render()
+    assert 'action="GET /c"' not in out and 'action="GET /d"' not in out
+    assert 'client_series_dropped_total 2' in out
+
+
+def test_client_metrics_endpoint_needs_a_token(client, auth, registry):
+    assert client.post('/api/client-metrics', json=_upload('GET /a')).status_code == 401
+    resp = client.post('/api/client-metrics', json=_upload('GET /a'), headers=auth)
+    assert resp.get_json() == {'ok': True, 'merged': 1, 'dropped': 0}
+    assert client.post('/api/client-metrics', json={'buckets': []}, headers=auth).status_code == 400
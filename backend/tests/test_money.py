@@ -0,0 +1,77 @@
+from decimal import Decimal
+
+import pytest
+from bson.decimal128 import Decimal128
+
+import money
+
+
+@pytest.mark.parametrize('value, currency, amount, minor', [
+    ('5000', 'USD', '5000.00', 500000),
+    (5000, 'usd', '5000.00', 500000),
+    ('12.345', 'USD', '12.34', 1234),  # banker's rounding, like Decimal128 itself
+    ('12.355', 'USD', '12.36', 1236),
+    ('1500', 'JPY', '1500', 1500),
+    ('1.2345', 'KWD', '1.234', 1234),
+    (Decimal128('7.1'), 'EUR', '7.10', 710),
+    (0.1, 'EUR', '0.10', 10),
+    ('1e30', 'USD', '1000000000000000000000000000000.00', 10 ** 32),
+])
+def test_amount_fields(value, currency, amount, minor):
+    fields = money.amount_fields(value, currency)
+    assert fields == {'amount': Decimal128(amount), 'amount_minor': minor}
+
+
+def test_largest_storable_amount_is_exact():
+    fields = money.amount_fields('9' * 32, 'USD')
+    assert fields['amount_minor'] == int('9' * 32 + '00')
+
+
+@pytest.mark.parametrize('value', ['', 'abc', None, 'NaN', 'Infinity', '1e6000', '9' * 33, '9' * 32 + '.999'])
+def test_bad_or_oversized_amounts_raise_value_error(value):
+    with pytest.raises(ValueError):
+        money.amount_fields(value, 'USD')
+
+
+def test_to_decimal_keeps_floats_as_written():
+    assert money.to_decimal(0.1) == Decimal('0.1')
+    assert money.to_decimal(' 12.50 ') == Decimal('12.50')
+
+
+def test_exponents_and_minor_unit_fit():
+    assert money.exponent('JPY') == 0
+    assert money.exponent(' bhd ') == 3
+    assert money.exponent(None) == money.DEFAULT_EXPONENT
+    assert money.fits_minor_unit(Decimal('10.50'), 'USD')
+    assert money.fits_minor_unit(Decimal('10.500'), 'USD')
+    assert not money.fits_minor_unit(Decimal('10.505'), 'USD')
+    assert not money.fits_minor_unit(Decimal('1.5'), 'JPY')
+
+
+def test_to_decimal128_rejects_what_decimal128_cannot_hold():
+    assert money.to_decimal128('100.25') == Decimal128('100.25')
+    with pytest.raises(ValueError):
+        money.to_decimal128('1' * 40)
+
+
+
+class FindOnly:
+    """A collection with only find(); a dry run never writes."""
+
+    def __init__(self, docs):
+        self.docs = docs
+
+    def find(self, query, projection):
+        return iter(self.docs)
+
+
+def test_migration_skips_amounts_too_large_to_store(app1):
+    import migrate_amounts
+    coll = FindOnly([
+        {'_id': 'ok', 'amount': '12.50', 'currency': 'USD'},
+        {'_id': 'huge', 'amount': '1e40', 'currency': 'USD'},
+        {'_id': 'bad', 'amount': 'n/a', 'currency': 'USD'},
+    ])
+    converted, skipped = migrate_amounts.migrate(coll, dry_run=True)
+    assert converted == 1
+    assert [(s[0], s[2]) for s in skipped] == [('huge', "amount too large: Decimal('1E+40')"), ('bad', "not a number: 'n/a'")]
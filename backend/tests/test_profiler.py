@@ -0,0 +1,101 @@
+from types import SimpleNamespace
+
+import profiler
+
+PLAN = {
+    'queryPlanner': {'winningPlan': {'stage': 'COLLSCAN'}},
+    'stages': [{'$cursor': {'executionStats': {'totalDocsExamined': 900, 'totalKeysExamined': 0, 'nReturned': 900,
+                                               'executionStages': {'stage': 'COLLSCAN'}}}},
+               {'$group': {}, 'nReturned': 3}],
+    'executionStats': {'totalDocsExamined': 100, 'totalKeysExamined': 100,
+                       'executionStages': {'stage': 'IXSCAN'}},
+}
+
+
+class FakeDatabase:
+    def __init__(self):
+        self.commands = []
+
+    def command(self, name, command, **kwargs):
+        self.commands.append((name, command, kwargs))
+        return PLAN
+
+
+class FakeClient(dict):
+    def __missing__(self, name):
+        db = self[name] = FakeDatabase()
+        return db
+
+
+def _events(name, duration_ms, reply, command=None):
+    base = dict(command_name=name, connection_id=('localhost', 27017), request_id=1)
+    started = SimpleNamespace(database_name='payment_fixer_db',
+                              command=command or {name: 'exceptions', 'pipeline': [], 'lsid': {'id': 1}, '$db': 'x'},
+                              **base)
+    succeeded = SimpleNamespace(duration_micros=int(duration_ms * 1000), reply=reply, **base)
+    return started, succeeded
+
+
+def _run(listener, name, duration_ms, reply):
+    started, succeeded = _events(name, duration_ms, reply)
+    listener.started(started)
+    listener.succeeded(succeeded)
+    listener._executor.shutdown(wait=True)
+
+
+def test_execution_stats_sums_every_block():
+    stats = profiler._execution_stats(PLAN)
+    assert stats['docs_examined'] == 1000
+    assert stats['keys_examined'] == 100
+    assert stats['stages'] == {'COLLSCAN', 'IXSCAN'}
+
+
+def test_docs_returned_prefers_the_last_stage_and_sums_shards():
+    assert profiler._docs_returned(PLAN) == 3
+    # no per-stage counts (older servers): what the query layer returned
+    old = {'stages': [{'$cursor': {'executionStats': {'nReturned': 40}}}, {'$group': {}}]}
+    assert profiler._docs_returned(old) == 40
+    assert profiler._docs_returned({'executionStats': {'nReturned': 7}}) == 7
+    assert profiler._docs_returned({'shards': {'a': old, 'b': {'executionStats': {'nReturned': 2}}}}) == 42
+
+
+def test_fast_commands_are_not_captured():
+    listener = profiler.SlowQueryProfiler(threshold_ms=100, capacity=5)
+    listener.bind(FakeClient())
+    _run(listener, 'aggregate', 5, {'cursor': {'firstBatch': []}})
+    assert listener.entries() == []
+
+
+def test_slow_aggregate_is_explained_without_driver_fields():
+    client = FakeClient()
+    listener = profiler.SlowQueryProfiler(threshold_ms=100, capacity=5)
+    listener.bind(client)
+    _run(listener, 'aggregate', 250, {'cursor': {'firstBatch': [{'n': 1}, {'n': 2}]}})
+
+    [entry] = listener.entries()
+    assert entry['command'] == 'aggregate'
+    assert entry['collection'] == 'exceptions'
+    assert entry['docs_examined'] == 1000
+    assert entry['docs_returned'] == 3
+    [(name, command, kwargs)] = client['payment_fixer_db'].commands
+    assert name == 'explain' and kwargs == {'verbosity': 'executionStats'}
+    assert 'lsid' not in command and '$db' not in command
+
+
+def test_unwatched_commands_and_ring_buffer_capacity():
+    listener = profiler.SlowQueryProfiler(threshold_ms=0, capacity=2)
+    listener.bind(FakeClient())
+    for i in range(3):
+        started, succeeded = _events('aggregate', 10 + i, {'cursor': {'firstBatch': []}})
+        started.request_id = succeeded.request_id = i
+        listener.started(started)
+        listener.succeeded(succeeded)
+    started, succeeded = _events('find', 500, {'cursor': {'firstBatch': []}})
+    listener.started(started)
+    listener.succeeded(succeeded)
+    listener._executor.shutdown(wait=True)
+
+    entries = listener.entries()
+    assert [e['duration_ms'] for e in entries] == [12, 11]
+    listener.clear()
+    assert listener.entries() == []
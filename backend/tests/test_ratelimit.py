@@ -0,0 +1,105 @@
+import pytest
+from flask import Flask, jsonify
+from flask_jwt_extended import JWTManager
+
+import ratelimit
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(ratelimit.time, 'monotonic', lambda: now[0])
+    return now
+
+
+def test_bucket_allows_a_burst_then_refills_at_the_rate(clock):
+    buckets = ratelimit.MemoryBuckets()
+    key = ('user:alice', 'dashboard')
+    assert [buckets.take(key, 2, 3) for _ in range(3)] == [0, 0, 0]
+    assert buckets.take(key, 2, 3) == pytest.approx(0.5)
+    clock[0] += 0.5
+    assert buckets.take(key, 2, 3) == 0
+    clock[0] += 60  # refills up to the burst, no further
+    assert [buckets.take(key, 2, 3) for _ in range(4)][-1] > 0
+    assert buckets.take(('user:bob', 'dashboard'), 2, 3) == 0
+
+
+def test_idle_full_buckets_are_pruned(clock, monkeypatch):
+    monkeypatch.setattr(ratelimit, 'PRUNE_EVERY', 3)
+    buckets = ratelimit.MemoryBuckets()
+    buckets.take(('a', 'x'), 1, 5)
+    clock[0] += 10
+    buckets.take(('b', 'x'), 1, 5)
+    buckets.take(('b', 'x'), 1, 5)
+    assert len(buckets) == 1
+
+
+def test_env_overrides_a_class(monkeypatch):
+    monkeypatch.setenv('RATE_LIMIT_ANALYTICS', '0.5/2')
+    assert ratelimit._limit('analytics', 1, 5, 2, 1) == ratelimit.Limit(0.5, 2, 2, 1)
+    monkeypatch.setenv('RATE_LIMIT_ANALYTICS', '3/4/6')
+    assert ratelimit._limit('analytics', 1, 5, 2, 1) == ratelimit.Limit(3, 4, 6, 1)
+
+
+def _limiter(shed_at=2):
+    classes = {
+        'write': ratelimit.Limit(100, 100, None, None),
+        'interactive': ratelimit.Limit(100, 100, 3, 2),
+        'analytics': ratelimit.Limit(100, 100, 1, 1),
+    }
+    return ratelimit.Limiter(classes=classes, route_classes={}, shed_at=shed_at)
+
+
+def test_concurrency_cap_per_class():
+    limiter = _limiter(shed_at=10)
+    assert limiter.admit('a', 'dashboard', 'analytics') is None
+    assert limiter.admit('b', 'dashboard', 'analytics') == ('concurrency', ratelimit.SHED_RETRY_AFTER)
+    limiter.release('analytics')
+    assert limiter.admit('b', 'dashboard', 'analytics') is None
+
+
+def test_lower_classes_are_shed_first_and_writes_never():
+    limiter = _limiter(shed_at=2)
+    for _ in range(2):
+        assert limiter.admit('a', 'fix', 'write') is None
+    # two in flight: analytics is shed, interactive runs until four are
+    assert limiter.admit('a', 'dashboard', 'analytics')[0] == 'shed'
+    assert limiter.admit('a', 'queue', 'interactive') is None
+    assert limiter.admit('a', 'queue', 'interactive') is None
+    assert limiter.admit('a', 'queue', 'interactive')[0] == 'shed'
+    assert limiter.admit('a', 'fix', 'write') is None
+    stats = limiter.stats()
+    assert stats['inflight'] == {'write': 3, 'interactive': 2, 'analytics': 0}
+    assert stats['classes']['analytics']['counts'] == {'shed': 1}
+
+
+def test_rate_rejections_suggest_whole_seconds(clock):
+    limiter = ratelimit.Limiter(classes={'analytics': ratelimit.Limit(0.1, 1, None, None)}, route_classes={})
+    assert limiter.admit('a', 'dashboard', 'analytics') is None
+    assert limiter.admit('a', 'dashboard', 'analytics') == ('rate', 10)
+
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+    app.config['JWT_SECRET_KEY'] = 'test-secret-key-that-is-long-enough-for-hs256'
+    JWTManager(app)
+    limiter = ratelimit.Limiter(classes={'analytics': ratelimit.Limit(1e-3, 1, None, None)},
+                                route_classes={'dashboard': 'analytics', 'ping': None})
+    ratelimit.install(app, limiter)
+    app.add_url_rule('/dashboard', 'dashboard', lambda: jsonify({'ok': True}))
+    app.add_url_rule('/ping', 'ping', lambda: jsonify({'ok': True}))
+    app.limiter = limiter
+    return app
+
+
+def test_flask_rejections_are_429_with_retry_after(app):
+    client = app.test_client()
+    assert client.get('/dashboard').status_code == 200
+    resp = client.get('/dashboard')
+    assert resp.status_code == 429
+    assert resp.headers['Retry-After'] == '1000'
+    assert resp.get_json()['retry_after'] == 1000
+    assert client.get('/ping').status_code == 200  # exempt
+    # the admitted request released its slot
+    assert app.limiter.stats()['inflight'] == {'analytics': 0}
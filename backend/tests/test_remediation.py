@@ -0,0 +1,105 @@
+import time
+from datetime import datetime
+
+import pytest
+
+import remediation
+
+RECORD = {
+    'message_type': 'MT103', 'sender': 'DEUTDEFFXXX', 'receiver': 'CHASUS33XXX',
+    'iban': 'gb82 west 1234 5698 7654 32', 'currency': ' usd', 'amount': '100.00',
+    'beneficiary_name': ' John  Smith', 'ordering_customer': 'ACME Ltd', 'reference': 'REF1',
+    'error': 'IBAN format invalid',
+}
+
+
+def test_plan_applies_every_matching_rule():
+    changes, applied = remediation.plan(RECORD)
+    assert changes == {'iban': 'GB82WEST12345698765432', 'currency': 'USD', 'beneficiary_name': 'John Smith'}
+    assert applied == ['iban-format', 'currency-case', 'beneficiary-whitespace']
+
+
+def test_plan_leaves_clean_records_alone():
+    clean = dict(RECORD, **remediation.plan(RECORD)[0])
+    assert remediation.plan(clean) == ({}, [])
+
+
+def test_rule_error_pattern_gates_the_rule():
+    rule = remediation.Rule('x', '', error='iban format', match={'iban': r'\s'}, fix={'iban': str.strip})
+    assert remediation.plan(dict(RECORD, iban=' X'), [rule])[1] == ['x']
+    assert remediation.plan(dict(RECORD, iban=' X', error='Currency   invalid'), [rule])[1] == []
+    # spaces in the error pattern match any whitespace run in MongoDB too
+    assert remediation.prefilter([rule]) == {'$or': [{'iban': {'$regex': r'\s'},
+                                                      'error': {'$regex': r'iban\s+format', '$options': 'i'}}]}
+
+
+def test_truncated_names_are_left_for_an_operator():
+    truncated = dict(RECORD, iban='GB82WEST12345698765432', currency='USD', beneficiary_name='John Smi',
+                     error='Field 59 truncated')
+    assert remediation.plan(truncated) == ({}, [])
+
+
+def test_unknown_rules_are_rejected(app1):
+    with pytest.raises(ValueError):
+        app1.remediation_engine.run(rule_names=['field59-truncated'])
+
+
+def _queue(app1, **fields):
+    return app1.exceptions.insert_one(dict(RECORD, created_at=datetime.utcnow(), **fields)).inserted_id
+
+
+def test_run_commits_fixed_records_and_keeps_the_rest(app1):
+    fixed = _queue(app1)
+    long_name = _queue(app1, beneficiary_name='  ' + 'A' * 71)
+    run = app1.remediation_engine.run(requested_by='alice')
+    assert (run['status'], run['scanned'], run['fixed'], run['unresolved']) == ('done', 2, 1, 1)
+    assert run['needs_review'][0]['tx_id'] == str(long_name)
+    assert [d['_id'] for d in app1.exceptions.find()] == [long_name]
+    doc = app1.processed.find_one()
+    assert doc['iban'] == 'GB82WEST12345698765432' and doc['processed_by'] == 'auto'
+    entry = app1.audit.find_one({'tx_id': str(fixed)})
+    assert entry['operator'] == 'alice' and entry['remediation_run'] == run['id']
+
+
+def test_dry_run_writes_nothing(app1):
+    _queue(app1)
+    run = app1.remediation_engine.run(dry_run=True)
+    assert run['fixed'] == 1
+    assert app1.exceptions.count_documents({}) == 1 and app1.processed.count_documents({}) == 0
+
+
+def _wait(client, auth):
+    for _ in range(200):
+        run = client.get('/api/remediation/run', headers=auth).get_json()['run']
+        if run['status'] != 'running':
+            return run
+        time.sleep(0.01)
+    raise AssertionError('remediation run did not finish')
+
+
+def test_runs_need_a_token_and_are_started_as_its_subject(app1, client, auth):
+    assert client.post('/api/remediation/run', json={}).status_code == 401
+    assert client.get('/api/remediation/rules').status_code == 401
+    assert client.post('/api/remediation/run', json={'rules': ['nope']}, headers=auth).status_code == 400
+    tx_id = _queue(app1)
+    res = client.post('/api/remediation/run', json={'rules': ['iban-format', 'currency-case',
+                                                              'beneficiary-whitespace']}, headers=auth)
+    assert res.status_code == 202
+    assert res.get_json()['run']['requested_by'] == 'alice'
+    assert _wait(client, auth)['fixed'] == 1
+    assert app1.audit.find_one({'tx_id': str(tx_id)})['operator'] == 'alice'
+
+
+def test_failed_commits_are_reported_with_their_error(app1):
+    tx_id = _queue(app1)
+
+    def commit(*args, **kwargs):
+        raise RuntimeError('write concern timeout')
+
+    engine = remediation.RemediationEngine(app1.exceptions, app1.validate_transaction, commit, workers=1)
+    run = engine.run(requested_by='alice')
+    assert (run['status'], run['fixed'], run['failed']) == ('done', 0, 1)
+    assert run['commit_errors'] == [{'tx_id': str(tx_id), 'rules': ['iban-format', 'currency-case',
+                                                                     'beneficiary-whitespace'],
+                                     'error': "RuntimeError('write concern timeout')"}]
+    assert app1.exceptions.count_documents({}) == 1
@@ -0,0 +1,132 @@
+import csv
+import threading
+import time
+from decimal import Decimal
+
+import pytest
+
+import reports
+from reports import ReportService, Section
+
+
+def _wait(service, rid, timeout=5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = service.get(rid)
+        if job is None or job['status'] in ('done', 'failed'):
+            return job
+        time.sleep(0.01)
+    raise AssertionError(f'report {rid} still running')
+
+
+@pytest.fixture
+def builds():
+    return []
+
+
+@pytest.fixture
+def service(tmp_path, builds):
+    def parse(raw):
+        if raw.get('fail'):
+            return {'fail': True}
+        return {'n': int(raw.get('n', 3))}
+
+    def build(params):
+        builds.append(params)
+        if params.get('fail'):
+            raise RuntimeError('query failed')
+        rows = ([i, Decimal('1.50') * i] for i in range(params['n']))
+        return 'Numbers', [Section('Numbers', ['I', 'Amount'], rows)]
+
+    return ReportService({'numbers': (parse, build)}, directory=str(tmp_path), ttl=60, workers=2)
+
+
+def test_csv_report_renders_to_a_downloadable_file(service):
+    job = service.submit('numbers', 'csv', {'n': '3'})
+    job = _wait(service, job['id'])
+    assert job['status'] == 'done' and job['rows'] == 3
+
+    path, name, mimetype = service.artifact(job['id'])
+    assert name.startswith('numbers-report-') and name.endswith('.csv')
+    assert mimetype == 'text/csv'
+    with open(path, newline='') as fh:
+        rows = list(csv.reader(fh))
+    assert ['I', 'Amount'] in rows and ['2', '3.00'] in rows
+
+
+def test_same_report_is_rendered_once(service, builds):
+    first = service.submit('numbers', 'csv', {'n': 3})
+    _wait(service, first['id'])
+    again = service.submit('numbers', 'csv', {'n': '3'})  # same params once parsed
+    assert again['id'] == first['id']
+    assert len(builds) == 1
+    assert service.submit('numbers', 'xlsx', {'n': 3})['id'] != first['id']
+
+
+def test_requests_join_a_render_in_progress(tmp_path):
+    release = threading.Event()
+    calls = []
+
+    def build(params):
+        calls.append(params)
+        release.wait(5)
+        return 'T', [Section('S', ['A'], [[1]])]
+
+    service = ReportService({'slow': (lambda raw: {}, build)}, directory=str(tmp_path), ttl=60)
+    first = service.submit('slow', 'csv')
+    second = service.submit('slow', 'csv')
+    release.set()
+    assert second['id'] == first['id']
+    assert _wait(service, first['id'])['status'] == 'done'
+    assert len(calls) == 1
+
+
+def test_failed_jobs_are_retried_and_expire(service, builds, monkeypatch):
+    job = _wait(service, service.submit('numbers', 'csv', {'fail': True})['id'])
+    assert job['status'] == 'failed' and job['error'] == 'query failed'
+    assert job['expires_at'] is not None
+    assert service.artifact(job['id']) is None
+
+    # a failure is not cached as an answer: asking again renders again
+    _wait(service, service.submit('numbers', 'csv', {'fail': True})['id'])
+    assert len(builds) == 2
+
+    service.ttl = 0
+    _wait(service, service.submit('numbers', 'csv', {'fail': True})['id'])
+    assert service.jobs() == []
+
+
+def test_artifacts_survive_a_restart_until_they_expire(service, tmp_path, builds):
+    rid = _wait(service, service.submit('numbers', 'csv')['id'])['id']
+    restarted = ReportService(service.kinds, directory=str(tmp_path), ttl=60)
+    assert restarted.submit('numbers', 'csv')['status'] == 'done'
+    assert restarted.artifact(rid) is not None
+    assert len(builds) == 1
+
+
+def test_unknown_kinds_and_formats_are_rejected(service):
+    with pytest.raises(ValueError):
+        service.submit('nope', 'csv')
+    with pytest.raises(ValueError):
+        service.submit('numbers', 'docx')
+
+
+@pytest.mark.parametrize('fmt', ['pdf', 'xlsx'])
+def test_binary_formats_render(service, fmt):
+    job = _wait(service, service.submit('numbers', fmt, {'n': 50})['id'])
+    assert job['status'] == 'done' and job['bytes'] > 0
+    with open(service.artifact(job['id'])[0], 'rb') as fh:
+        assert fh.read(4) == (b'%PDF' if fmt == 'pdf' else b'PK\x03\x04')
+
+
+def test_report_id_ignores_param_order():
+    assert reports.report_id('k', 'csv', {'a': 1, 'b': 2}) == reports.report_id('k', 'csv', {'b': 2, 'a': 1})
+
+
+def test_report_endpoints_need_a_token(client, auth):
+    assert client.get('/api/reports').status_code == 401
+    assert client.post('/api/reports', json={'kind': 'exceptions', 'format': 'csv'}).status_code == 401
+    assert client.get('/api/reports/abc').status_code == 401
+    assert client.get('/api/reports/abc/download').status_code == 401
+    assert client.get('/api/reports', headers=auth).status_code == 200
+    assert client.get('/api/reports/abc', headers=auth).status_code == 404
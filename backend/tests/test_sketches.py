@@ -0,0 +1,94 @@
+import bisect
+import random
+from datetime import datetime, timedelta
+
+import pytest
+
+import archive
+import sketches
+from sketches import TDigest
+
+
+def _rank(values, estimate):
+    """Fraction of `values` at or below `estimate`; t-digest error is bounded in rank, not value."""
+    ordered = sorted(values)
+    return bisect.bisect_right(ordered, estimate) / len(ordered)
+
+
+@pytest.fixture
+def values():
+    rng = random.Random(7)
+    return [rng.lognormvariate(5, 1) for _ in range(20000)]
+
+
+def test_quantiles_track_the_exact_values(values):
+    digest = TDigest()
+    for v in values:
+        digest.add(v)
+    assert digest.count == len(values)
+    assert digest.min == min(values) and digest.max == max(values)
+    for q in (0.5, 0.9, 0.99, 0.999):
+        assert _rank(values, digest.quantile(q)) == pytest.approx(q, abs=0.005)
+
+
+def test_merged_digests_match_a_single_digest(values):
+    parts = [TDigest() for _ in range(8)]
+    for i, v in enumerate(values):
+        parts[i % len(parts)].add(v)
+    merged = TDigest()
+    for part in parts:
+        merged.merge(part)
+
+    assert merged.count == len(values)
+    assert merged.sum == pytest.approx(sum(values))
+    for q in (0.5, 0.9, 0.99, 0.999):
+        assert _rank(values, merged.quantile(q)) == pytest.approx(q, abs=0.005)
+    # merging compresses: the centroid count stays bounded by the compression, not the input size
+    assert len(merged.centroids) < 2 * merged.compression
+
+
+def test_small_digests():
+    digest = TDigest()
+    assert digest.quantile(0.5) is None
+    digest.add(42.0)
+    assert digest.quantile(0.99) == 42.0
+
+
+def test_round_trip_through_a_document(values):
+    digest = TDigest()
+    for v in values[:5000]:
+        digest.add(v)
+    restored = TDigest.from_doc(digest.to_fields())
+    assert restored.count == digest.count
+    assert restored.quantile(0.9) == pytest.approx(digest.quantile(0.9))
+
+
+def test_record_resolution_and_percentiles(mongo):
+    day = datetime(2025, 3, 1, 12)
+    for seconds in range(1, 101):
+        assert sketches.record_resolution(mongo.sketches, 'alice', day, float(seconds))
+    sketches.record_resolution(mongo.sketches, 'bob', day + timedelta(days=1), 10.0)
+
+    [alice, bob] = sketches.operator_percentiles(mongo.sketches)
+    assert alice['operator'] == 'alice' and alice['count'] == 100
+    assert alice['avg_resolution_seconds'] == pytest.approx(50.5)
+    assert alice['p50_resolution_seconds'] == pytest.approx(50.5, abs=1.5)
+    assert bob['count'] == 1
+    assert sketches.operator_percentiles(mongo.sketches, since='2025-03-02')[0]['operator'] == 'bob'
+
+
+def test_rebuild_reads_archived_records(mongo, archive_dir):
+    now = datetime(2025, 6, 1)
+    for i in range(30):
+        processed_at = now - timedelta(days=100 + i)
+        mongo.processed.insert_one({'processed_by': 'alice', 'processed_at': processed_at,
+                                    'created_at': processed_at - timedelta(minutes=5)})
+    mongo.processed.insert_one({'processed_by': 'alice', 'processed_at': now, 'created_at': now - timedelta(minutes=5)})
+    assert archive.archive_collection(mongo.processed, 'processed', now - timedelta(days=30)) == 30
+
+    assert sketches.rebuild(mongo.processed, mongo.sketches) == 31
+    [alice] = sketches.operator_percentiles(mongo.sketches)
+    assert alice['count'] == 31
+    assert alice['p50_resolution_seconds'] == pytest.approx(300)
+
+    assert sketches.rebuild(mongo.processed, mongo.sketches, include_archived=False) == 1
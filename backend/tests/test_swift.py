@@ -0,0 +1,86 @@
+import io
+import xml.etree.ElementTree as ET
+from decimal import Decimal
+
+import pytest
+
+import swift
+
+NS = {'p': swift.PACS008_NS}
+
+
+def _records(*numbers):
+    text = ''.join(swift.synthetic_message(i) for i in numbers)
+    return [swift.to_record(m) for m in swift.iter_mt103(io.StringIO(text, newline=''), chunk_size=7)]
+
+
+def test_messages_split_across_small_chunks():
+    text = ''.join(swift.synthetic_message(i) for i in range(1, 6))
+    raw = list(swift.iter_raw_messages(io.StringIO(text, newline=''), chunk_size=7))
+    assert raw == [swift.synthetic_message(i) for i in range(1, 6)]
+
+
+def test_parse_message_reads_blocks_and_fields():
+    message = swift.parse_message(swift.synthetic_message(3))
+    assert (message['type'], message['sender'], message['receiver']) == ('103', 'ABCDGB2LXXX', 'XYZBDEFFXXX')
+    assert message['uetr'] == '00000000-0000-4000-8000-000000000003'
+    assert message['fields']['32A'] == '250107USD112,03'
+    assert message['fields']['59'] == '/NL91ABNA0417164300\nLi Wei\n10 HIGH STREET\nLONDON'
+
+
+def test_to_record_flattens_the_parties_and_amount():
+    [record] = _records(3)
+    assert record['amount'] == '112.03' and record['currency'] == 'USD' and record['value_date'] == '2025-01-07'
+    assert record['iban'] == 'NL91ABNA0417164300' and record['beneficiary_name'] == 'Li Wei'
+    assert record['beneficiary_address'] == ['10 HIGH STREET', 'LONDON']
+    assert record['ordering_account'] == '12345678' and record['ordering_customer'] == 'ORDERING CUSTOMER 3'
+    assert record['charges'] == 'SHA' and record['reference'] == 'REF0000000003'
+
+
+def test_iban_checksum():
+    assert swift.iban_checksum_ok('GB29NWBK60161331926819')
+    assert not swift.iban_checksum_ok('GB29NWBK60161331926810')
+
+
+def test_synthetic_failures_are_reported():
+    truncated, bad_iban = _records(50, 97)
+    assert swift.record_errors(truncated) == ['Creditor name (field 59) is truncated']
+    assert swift.record_errors(bad_iban) == ['Creditor IBAN invalid (format or checksum)']
+    assert swift.record_errors(_records(1)[0]) == []
+
+
+def test_writer_totals_and_amount_text():
+    records = _records(1, 2, 3)
+    records.append(dict(records[0], amount='5', currency='JPY'))
+    out = io.BytesIO()
+    with swift.Pacs008Writer(out, msg_id='M1') as writer:
+        for record in records:
+            writer.add(record)
+    doc = ET.fromstring(out.getvalue())
+    header = doc.find('p:FIToFICstmrCdtTrf/p:GrpHdr', NS)
+    assert header.find('p:MsgId', NS).text == 'M1'
+    assert header.find('p:NbOfTxs', NS).text == '4'
+    assert Decimal(header.find('p:CtrlSum', NS).text) == sum(Decimal(r['amount']) for r in records)
+    amounts = [(a.text, a.get('Ccy')) for a in doc.iterfind('.//p:IntrBkSttlmAmt', NS)]
+    assert amounts == [('38.01', 'USD'), ('75.02', 'USD'), ('112.03', 'USD'), ('5', 'JPY')]
+    assert [e.text for e in doc.iterfind('.//p:Cdtr/p:Nm', NS)][:2] == ['Maria Garcia Lopez',
+                                                                         'ACME Industrial Supplies Ltd']
+
+
+def test_writer_refuses_records_that_do_not_convert():
+    with pytest.raises(swift.ConversionError) as e:
+        swift.to_pacs008(_records(50)[0])
+    assert e.value.errors == ['Creditor name (field 59) is truncated']
+
+
+@pytest.mark.parametrize('amount', ['1E+20', '1e30', '1e6000', '123456789012345678', '1.000001'])
+def test_out_of_range_amounts_are_errors_not_exceptions(amount):
+    record = dict(_records(1)[0], amount=amount)
+    assert swift.conversion_errors(record) == ['Amount exceeds 18 digits / 5 decimals']
+
+
+def test_convert_reports_failures():
+    text = ''.join(swift.synthetic_message(i) for i in (1, 50, 2))
+    failures, out = [], io.BytesIO()
+    assert swift.convert(io.StringIO(text, newline=''), out, on_failure=lambda r, e: failures.append(e)) == (2, 1)
+    assert failures == [['Creditor name (field 59) is truncated']]
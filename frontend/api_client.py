@@ -0,0 +1,358 @@
+"""
+Background network layer for the PyQt client.
+
+Every backend call runs on a QThreadPool and goes through one shared
+requests.Session, so the GUI thread never blocks on the network and repeated
+calls reuse the same keep-alive connections. Results are delivered back on the
+GUI thread through Qt signals.
+
+Calls made with a `key` supersede each other: starting a new call with the
+same key cancels the previous one, and a cancelled call never reaches its
+callbacks (even if its response was already on the way).
+
+Each call is recorded in telemetry with its dns/connect/ttfb/download split.
+DNS and connect are only non-zero when the call had to open a new connection.
+"""
+import os
+import socket
+import threading
+import time
+from collections import OrderedDict
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.exceptions import NewConnectionError
+from urllib3.util.connection import allowed_gai_family
+from PyQt5.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal
+
+from telemetry import action_name, telemetry
+
+DEFAULT_TIMEOUT = 10  # seconds
+MAX_THREADS = 4
+RECORD_CACHE_SIZE = 50000
+RECORD_CACHE_TTL = 60  # seconds before a cached record is revalidated
+DOWNLOAD_BLOCK_SIZE = 64 * 1024
+
+
+# --- Connection timing ---
+# urllib3 opens connections on the thread making the request, so the phases
+# of the call running on a pool thread are collected in a thread-local dict.
+_timing = threading.local()
+
+
+class _TimedConnectionMixin:
+    def _new_conn(self):
+        phases = getattr(_timing, 'phases', None)
+        if phases is None:
+            return super()._new_conn()
+        started = time.perf_counter()
+        try:
+            addresses = [info[4][0] for info in socket.getaddrinfo(self._dns_host, self.port, allowed_gai_family(),
+                                                                   socket.SOCK_STREAM)]
+        except (OSError, UnicodeError):
+            return super()._new_conn()  # raises urllib3's usual error
+        phases['dns'] = time.perf_counter() - started
+        # connect to the addresses resolved above, in order, as urllib3 would have
+        host = self._dns_host
+        try:
+            for i, address in enumerate(addresses):
+                self._dns_host = address
+                try:
+                    return super()._new_conn()
+                except NewConnectionError:
+                    if i == len(addresses) - 1:
+                        raise
+        finally:
+            self._dns_host = host
+
+    def connect(self):
+        phases = getattr(_timing, 'phases', None)
+        started = time.perf_counter()
+        super().connect()
+        if phases is not None:
+            # TCP (and TLS) handshake, without the lookup
+            phases['connect'] = time.perf_counter() - started - phases.get('dns', 0.0)
+
+
+class _TimedHTTPConnection(_TimedConnectionMixin, HTTPConnection):
+    pass
+
+
+class _TimedHTTPSConnection(_TimedConnectionMixin, HTTPSConnection):
+    pass
+
+
+class _TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _TimedHTTPConnection
+
+
+class _TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _TimedHTTPSConnection
+
+
+class _TimedAdapter(HTTPAdapter):
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {'http': _TimedHTTPConnectionPool,
+                                                   'https': _TimedHTTPSConnectionPool}
+
+
+class _CallTimer:
+    """Times one call on the current thread: headers() after the response head, finish() at the end."""
+
+    def __init__(self, method, path):
+        self.action = action_name(method, path)
+        self.phases = _timing.phases = {}
+        self.started = time.perf_counter()
+        self.headers_at = None
+
+    def headers(self):
+        self.headers_at = time.perf_counter()
+        self.phases['ttfb'] = self.headers_at - self.started - self.phases.get('dns', 0.0) \
+            - self.phases.get('connect', 0.0)
+
+    def finish(self, ok, rows=None):
+        _timing.phases = None
+        ended = time.perf_counter()
+        if self.headers_at is not None:
+            self.phases['download'] = ended - self.headers_at
+        telemetry.record('api', self.action, ended - self.started, rows=rows, phases=self.phases, ok=ok)
+
+
+def _row_count(data):
+    # the list a page/collection response carries, if any
+    if isinstance(data, dict):
+        for value in data.values():
+            if isinstance(value, list):
+                return len(value)
+    return None
+
+
+class _Relay(QObject):
+    """Lives on the GUI thread; the worker emits into it, it calls back out."""
+    finished = pyqtSignal(int, object, object)
+    failed = pyqtSignal(str)
+
+    def __init__(self, call, on_result, on_error):
+        super().__init__()
+        self.call = call
+        self.on_result = on_result
+        self.on_error = on_error
+        self.finished.connect(self._deliver_result)
+        self.failed.connect(self._deliver_error)
+
+    def _deliver_result(self, status, data, headers):
+        self.call.client._done(self.call)
+        if not self.call.cancelled and self.on_result:
+            if self.call.with_headers:
+                self.on_result(status, data, headers)
+            else:
+                self.on_result(status, data)
+
+    def _deliver_error(self, message):
+        self.call.client._done(self.call)
+        if not self.call.cancelled and self.on_error:
+            self.on_error(message)
+
+
+class ApiCall(QRunnable):
+    def __init__(self, client, method, path, kwargs, key, on_result, on_error, with_headers=False):
+        super().__init__()
+        self.setAutoDelete(False)
+        self.with_headers = with_headers
+        self.client = client
+        self.method = method
+        self.path = path
+        self.kwargs = kwargs
+        self.key = key
+        self.cancelled = False
+        self.relay = _Relay(self, on_result, on_error)
+
+    def cancel(self):
+        """
+        Make sure the callbacks never run. A call still queued is taken off the
+        pool; one already running finishes its HTTP request (a download stops
+        at its next block) and the result is discarded.
+        """
+        self.cancelled = True
+        # drop it from the queue if no worker has picked it up yet
+        if self.client.pool.tryTake(self):
+            self.client._done(self)
+
+    def run(self):
+        # always report back (the relay drops results of cancelled calls) so the
+        # client can forget about this call
+        if self.cancelled:
+            self.relay.failed.emit('cancelled')
+            return
+        timer = _CallTimer(self.method, self.path)
+        try:
+            # streamed so the head and the body can be timed separately
+            r = self.client.session.request(self.method, self.client.base + self.path, stream=True, **self.kwargs)
+            timer.headers()
+            body = r.content
+            try:
+                data = r.json()
+            except ValueError:
+                data = {'ok': False, 'error': f'HTTP {r.status_code}: {body[:200].decode(errors="replace")}'}
+        except Exception as e:
+            timer.finish(ok=False)
+            self.relay.failed.emit(str(e))
+            return
+        timer.finish(ok=r.status_code < 400, rows=_row_count(data))
+        self.relay.finished.emit(r.status_code, data, dict(r.headers))
+
+
+class DownloadCall(ApiCall):
+    """Streams the response body into a file instead of parsing it as JSON."""
+
+    def __init__(self, client, path, dest, kwargs, key, on_result, on_error):
+        super().__init__(client, 'GET', path, kwargs, key, on_result, on_error)
+        self.dest = dest
+
+    def run(self):
+        if self.cancelled:
+            self.relay.failed.emit('cancelled')
+            return
+        timer = _CallTimer('GET', self.path)
+        try:
+            with self.client.session.get(self.client.base + self.path, stream=True, **self.kwargs) as r:
+                timer.headers()
+                if r.status_code != 200:
+                    try:
+                        data = r.json()
+                    except ValueError:
+                        data = {'ok': False, 'error': f'HTTP {r.status_code}: {r.text[:200]}'}
+                    timer.finish(ok=False)
+                    self.relay.finished.emit(r.status_code, data, dict(r.headers))
+                    return
+                written = 0
+                with open(self.dest, 'wb') as fh:
+                    for block in r.iter_content(DOWNLOAD_BLOCK_SIZE):
+                        if self.cancelled:
+                            break
+                        fh.write(block)
+                        written += len(block)
+        except Exception as e:
+            timer.finish(ok=False)
+            self._discard()
+            self.relay.failed.emit(str(e))
+            return
+        timer.finish(ok=not self.cancelled)
+        if self.cancelled:
+            self._discard()
+        self.relay.finished.emit(r.status_code, {'ok': True, 'path': self.dest, 'bytes': written}, dict(r.headers))
+
+    def _discard(self):
+        try:
+            os.remove(self.dest)
+        except OSError:
+            pass
+
+
+class ApiClient(QObject):
+    def __init__(self, base, max_threads=MAX_THREADS, parent=None):
+        super().__init__(parent)
+        self.base = base
+        self.session = requests.Session()
+        adapter = _TimedAdapter(pool_connections=1, pool_maxsize=max_threads)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(max_threads)
+        self._inflight = set()
+        self._latest = {}
+
+    def request(self, method, path, key=None, on_result=None, on_error=None, with_headers=False, **kwargs):
+        """
+        Queue `method path` on the pool. on_result(status, data) -- or
+        on_result(status, data, headers) with `with_headers` -- or on_error(message)
+        is called on the GUI thread. Returns the ApiCall, which can be cancel()ed.
+        """
+        kwargs.setdefault('timeout', DEFAULT_TIMEOUT)
+        return self._start(ApiCall(self, method, path, kwargs, key, on_result, on_error, with_headers))
+
+    def set_token(self, token):
+        """Send `token` as a bearer token from now on; the backend rate-limits per token identity."""
+        if token:
+            self.session.headers['Authorization'] = f'Bearer {token}'
+        else:
+            self.session.headers.pop('Authorization', None)
+
+    def get(self, path, **kwargs):
+        return self.request('GET', path, **kwargs)
+
+    def post(self, path, **kwargs):
+        return self.request('POST', path, **kwargs)
+
+    def download(self, path, dest, key=None, on_result=None, on_error=None, **kwargs):
+        """Like get(), but the body is written to `dest`; on_result gets {'ok', 'path', 'bytes'}."""
+        kwargs.setdefault('timeout', DEFAULT_TIMEOUT)
+        return self._start(DownloadCall(self, path, dest, kwargs, key, on_result, on_error))
+
+    def _start(self, call):
+        if call.key is not None:
+            self.cancel(call.key)
+            self._latest[call.key] = call
+        self._inflight.add(call)
+        self.pool.start(call)
+        return call
+
+    def cancel(self, key):
+        previous = self._latest.pop(key, None)
+        if previous is not None:
+            previous.cancel()
+
+    def _done(self, call):
+        self._inflight.discard(call)
+        if call.key is not None and self._latest.get(call.key) is call:
+            del self._latest[call.key]
+
+
+class RecordCache:
+    """
+    Full exception documents by id, filled from queue loads and single fetches.
+
+    Entries older than `ttl` are still returned but flagged stale so the caller
+    can revalidate them (with If-None-Match when an ETag is known).
+    """
+
+    def __init__(self, maxsize=RECORD_CACHE_SIZE, ttl=RECORD_CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()  # id -> (doc, etag, stored_at)
+
+    def put(self, doc, etag=None):
+        tx_id = doc.get('_id')
+        if not tx_id:
+            return
+        self._entries[tx_id] = (doc, etag, time.monotonic())
+        self._entries.move_to_end(tx_id)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def put_many(self, docs):
+        for doc in docs:
+            self.put(doc)
+
+    def get(self, tx_id):
+        """(doc, etag, stale) or None."""
+        entry = self._entries.get(tx_id)
+        if entry is None:
+            return None
+        self._entries.move_to_end(tx_id)
+        doc, etag, stored_at = entry
+        return doc, etag, time.monotonic() - stored_at > self.ttl
+
+    def touch(self, tx_id):
+        entry = self._entries.get(tx_id)
+        if entry is not None:
+            self._entries[tx_id] = (entry[0], entry[1], time.monotonic())
+
+    def invalidate(self, tx_id):
+        self._entries.pop(tx_id, None)
+
+    def clear(self):
+        self._entries.clear()
@@ -0,0 +1,205 @@
+"""
+Operations dashboard: summary figures and pyqtgraph charts from /dashboard.
+
+Kept out of main.py so pyqtgraph (and numpy under it) only load when the
+dashboard is first opened, or in the background once the main window is up.
+"""
+from datetime import datetime, timezone
+
+import pyqtgraph as pg
+from PyQt5.QtCore import QTimer
+from PyQt5.QtWidgets import QCheckBox, QComboBox, QDialog, QHBoxLayout, QLabel, QPushButton, QSpinBox, QVBoxLayout
+
+from telemetry import telemetry
+
+DASHBOARD_REFRESH_SECONDS = 60  # default dashboard auto-refresh interval
+DASHBOARD_DAY_CHOICES = [7, 30, 90, 180, 365]
+
+
+class DashboardDialog(QDialog):
+    """
+    Opens immediately with placeholders and fills in when /dashboard answers.
+    Plot items are created once and updated in place, and an unchanged
+    dashboard (304) costs no redraw, so auto-refresh can be left running.
+    """
+    def __init__(self, api, request_report, parent=None):
+        super().__init__(parent)
+        self.api = api
+        self.setWindowTitle("Dashboard")
+        self.resize(900, 700)
+        self.layout = QVBoxLayout()
+        self.setLayout(self.layout)
+        self.data = None
+        self.etag = None
+        self.key = f'dashboard-{id(self)}'
+        self.tick_labels = {}  # plot -> labels currently on its bottom axis
+
+        # --- Controls ---
+        self.days_box = QComboBox()
+        for days in DASHBOARD_DAY_CHOICES:
+            self.days_box.addItem(f"Last {days} days", days)
+        self.days_box.setCurrentIndex(DASHBOARD_DAY_CHOICES.index(30))
+        self.days_box.currentIndexChanged.connect(lambda _: self.load_data())
+        self.auto_refresh = QCheckBox("Auto-refresh every")
+        self.auto_refresh.toggled.connect(self.toggle_auto_refresh)
+        self.refresh_interval = QSpinBox()
+        self.refresh_interval.setRange(5, 3600)
+        self.refresh_interval.setSuffix(" s")
+        self.refresh_interval.setValue(DASHBOARD_REFRESH_SECONDS)
+        self.refresh_interval.valueChanged.connect(lambda v: self.refresh_timer.setInterval(v * 1000))
+        self.refresh_timer = QTimer(self)
+        self.refresh_timer.setInterval(DASHBOARD_REFRESH_SECONDS * 1000)
+        self.refresh_timer.timeout.connect(self.load_data)
+        self.status_label = QLabel("Loading dashboard…")
+        self.status_label.setStyleSheet("color: gray;")
+
+        controls = QHBoxLayout()
+        controls.addWidget(self.days_box)
+        controls.addWidget(self.auto_refresh)
+        controls.addWidget(self.refresh_interval)
+        controls.addStretch(1)
+        controls.addWidget(self.status_label)
+        self.layout.addLayout(controls)
+
+        # --- Summary Labels ---
+        self.total_exceptions_label = QLabel()
+        self.total_processed_label = QLabel()
+        self.processed_today_label = QLabel()
+        self.processed_recent_label = QLabel()
+        self.avg_resolution_label = QLabel()
+
+        for lbl in [self.total_exceptions_label, self.total_processed_label,
+                    self.processed_today_label, self.processed_recent_label,
+                    self.avg_resolution_label]:
+            lbl.setStyleSheet("font-size: 14px; font-weight: bold;")
+            self.layout.addWidget(lbl)
+        self.show_summary({})
+
+        # --- Charts (items created once, updated in place on every refresh) ---
+        self.top_errors_plot = pg.PlotWidget(title="Top Errors")
+        self.exceptions_by_type_plot = pg.PlotWidget(title="Exceptions by Message Type")
+        self.exceptions_trend_plot = pg.PlotWidget(title="Exceptions Trend (Last 30 Days)",
+                                                   axisItems={'bottom': pg.DateAxisItem(orientation='bottom')})
+        self.processed_by_operator_plot = pg.PlotWidget(title="Processed by Operator")
+
+        for chart in [self.top_errors_plot, self.exceptions_by_type_plot,
+                      self.exceptions_trend_plot, self.processed_by_operator_plot]:
+            chart.setBackground('w')
+            chart.showGrid(x=True, y=True)
+            chart.getAxis('left').setStyle(tickFont=pg.QtGui.QFont("Arial", 10))
+            chart.getAxis('bottom').setStyle(tickFont=pg.QtGui.QFont("Arial", 10))
+
+        self.top_errors_bars = pg.BarGraphItem(x=[], height=[], width=0.6, brush='r')
+        self.top_errors_plot.addItem(self.top_errors_bars)
+        self.exceptions_by_type_bars = pg.BarGraphItem(x=[], height=[], width=0.6, brush='b')
+        self.exceptions_by_type_plot.addItem(self.exceptions_by_type_bars)
+        self.processed_by_operator_bars = pg.BarGraphItem(x=[], height=[], width=0.6, brush='m')
+        self.processed_by_operator_plot.addItem(self.processed_by_operator_bars)
+        # a year of days is fine as it is; peak downsampling keeps longer series cheap to draw
+        self.exceptions_trend_curve = self.exceptions_trend_plot.plot([], [], pen=pg.mkPen('b', width=2),
+                                                                      symbol='o', symbolSize=4)
+        self.exceptions_trend_curve.setDownsampling(auto=True, method='peak')
+        self.exceptions_trend_curve.setClipToView(True)
+
+        self.layout.addWidget(self.top_errors_plot)
+        self.layout.addWidget(self.exceptions_by_type_plot)
+        self.layout.addWidget(self.exceptions_trend_plot)
+        self.layout.addWidget(self.processed_by_operator_plot)
+
+        # --- Buttons ---
+        btn_report = QPushButton("📝 Export Report (PDF)")
+        btn_report.clicked.connect(lambda: request_report(self, None, 'dashboard', 'pdf', {'days': self.days()}))
+        btn_close = QPushButton("Close")
+        btn_close.clicked.connect(self.close)
+
+        btn_row = QHBoxLayout()
+        btn_row.addWidget(btn_report)
+        btn_row.addStretch(1)
+        btn_row.addWidget(btn_close)
+        self.layout.addLayout(btn_row)
+
+        self.finished.connect(self.stop_refresh)
+        self.load_data()
+
+    def days(self):
+        return self.days_box.currentData()
+
+    def toggle_auto_refresh(self, enabled):
+        if enabled:
+            self.refresh_timer.start()
+        else:
+            self.refresh_timer.stop()
+
+    def stop_refresh(self):
+        # nothing may call back into the dialog once it is closed
+        self.refresh_timer.stop()
+        self.api.cancel(self.key)
+
+    def load_data(self):
+        days = self.days()
+        headers = {}
+        if self.etag and self.data and self.data.get('days') == days:
+            headers['If-None-Match'] = self.etag
+        self.status_label.setText("Refreshing…" if self.data else "Loading dashboard…")
+        self.api.get('/dashboard', params={'days': days}, headers=headers, timeout=10, key=self.key,
+                with_headers=True, on_result=lambda status, data, response_headers: self.on_data(days, status, data, response_headers),
+                on_error=self.on_error)
+
+    def on_error(self, message):
+        # no modal box: an auto-refreshing wall display must not pile up dialogs
+        self.status_label.setText(f"Could not load dashboard: {message}")
+
+    def on_data(self, days, status, data, response_headers=None):
+        now = datetime.now().strftime('%H:%M:%S')
+        if status == 304:
+            self.status_label.setText(f"Updated {now} (no changes)")
+            return
+        if not data.get("ok"):
+            self.on_error(data.get('error', f'HTTP {status}'))
+            return
+        self.data = dict(data, days=days)  # store data for report generation
+        self.etag = (response_headers or {}).get('ETag')
+        try:
+            with telemetry.timed('render', 'dashboard charts', rows=len(data.get('exceptions_trend', {}))):
+                self.show_summary(self.data)
+                self.set_bars(self.top_errors_plot, self.top_errors_bars,
+                              [(e['error'], e['count']) for e in data.get('top_errors', [])])
+                self.set_bars(self.exceptions_by_type_plot, self.exceptions_by_type_bars,
+                              [(t['message_type'], t['count']) for t in data.get('exceptions_by_message_type', [])])
+                self.set_bars(self.processed_by_operator_plot, self.processed_by_operator_bars,
+                              [(p['operator'], p['count']) for p in data.get('processed_by_operator', [])])
+                self.set_trend(data.get('exceptions_trend', {}), days)
+        except Exception as e:
+            self.on_error(str(e))
+            return
+        self.status_label.setText(f"Updated {now}")
+
+    def show_summary(self, data):
+        def value(key):
+            return data.get(key, '—') if data else '—'
+        days = data.get('days', self.days()) if data else self.days()
+        total = f"Total Exceptions: {value('total_exceptions')}"
+        if data and data.get('total_occurrences', 0) > data.get('total_exceptions', 0):
+            total += f" ({data['total_occurrences']} incl. duplicates)"
+        self.total_exceptions_label.setText(total)
+        self.total_processed_label.setText(f"Total Processed: {value('total_processed')}")
+        self.processed_today_label.setText(f"Processed Today: {value('processed_today')}")
+        self.processed_recent_label.setText(f"Processed Last {days} Days: {value('processed_recent_days')}")
+        avg_sec = data.get('avg_resolution_seconds') if data else None
+        self.avg_resolution_label.setText(f"Avg Resolution Time: {int(avg_sec)} sec" if avg_sec is not None
+                                          else "Avg Resolution Time: —")
+
+    def set_bars(self, plot, bars, pairs):
+        labels = [label if len(label) <= 28 else label[:27] + '…' for label, _ in pairs]
+        bars.setOpts(x=list(range(len(pairs))), height=[count for _, count in pairs])
+        # re-laying out the axis is the expensive part; skip it when the labels didn't change
+        if self.tick_labels.get(plot) != labels:
+            self.tick_labels[plot] = labels
+            plot.getAxis('bottom').setTicks([list(enumerate(labels))])
+
+    def set_trend(self, trend, days):
+        days_sorted = sorted(trend)
+        x = [datetime.strptime(d, '%Y-%m-%d').replace(tzinfo=timezone.utc).timestamp() for d in days_sorted]
+        y = [trend[d] for d in days_sorted]
+        self.exceptions_trend_curve.setData(x, y)
+        self.exceptions_trend_plot.setTitle(f"Exceptions Trend (Last {days} Days)")
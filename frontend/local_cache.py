@@ -0,0 +1,124 @@
+"""
+On-disk copy of the last synced exception queue and processed list.
+
+One SQLite database (WAL mode, so reads never wait on a write) holds the
+documents of every server the client has talked to, keyed by the API base
+URL. MainWindow renders the cached queue the moment it opens, then asks the
+backend only for what changed since the stored watermark; pages, syncs and
+fixes are written back as they arrive. If the backend is unreachable the
+cached copy stays browsable.
+"""
+import json
+import logging
+import os
+import sqlite3
+from email.utils import parsedate
+
+log = logging.getLogger(__name__)
+
+CACHE_PATH = os.getenv('QUEUE_CACHE_PATH',
+                       os.path.join(os.path.expanduser('~'), '.payment_operator', 'queue_cache.sqlite3'))
+
+# field each collection is ordered by (newest first, like the backend)
+ORDER_FIELDS = {'exceptions': 'created_at', 'processed': 'processed_at'}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS docs (
+    server TEXT NOT NULL,
+    coll TEXT NOT NULL,
+    id TEXT NOT NULL,
+    order_key TEXT NOT NULL,
+    doc TEXT NOT NULL,
+    PRIMARY KEY (server, coll, id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS docs_order ON docs (server, coll, order_key);
+CREATE TABLE IF NOT EXISTS sync_state (
+    server TEXT NOT NULL,
+    coll TEXT NOT NULL,
+    watermark TEXT,
+    next_cursor TEXT,
+    PRIMARY KEY (server, coll)
+);
+"""
+
+_UNSET = object()
+
+
+def _order_key(coll, doc):
+    # timestamps arrive as HTTP dates ("Tue, 07 Jan 2025 10:00:00 GMT"); parsedate is locale-independent
+    parsed = parsedate(doc.get(ORDER_FIELDS[coll]) or '')
+    ts = '%04d%02d%02d%02d%02d%02d' % parsed[:6] if parsed else ''
+    return f"{ts}|{doc.get('_id', '')}"
+
+
+class LocalCache:
+    def __init__(self, server, path=CACHE_PATH):
+        self.server = server
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            self.db = self._open(path)
+        except sqlite3.Error as e:
+            # unusable cache file: work without persistence rather than not at all
+            log.warning('Local cache unavailable (%s); using an in-memory cache', e)
+            self.db = self._open(':memory:')
+
+    @staticmethod
+    def _open(path):
+        db = sqlite3.connect(path)
+        db.execute('PRAGMA journal_mode=WAL')
+        db.execute('PRAGMA synchronous=NORMAL')  # durable enough for a cache, much cheaper commits
+        db.executescript(_SCHEMA)
+        return db
+
+    # --- sync state ---
+    def state(self, coll):
+        """(watermark, next_cursor); (None, None) when `coll` was never synced."""
+        row = self.db.execute('SELECT watermark, next_cursor FROM sync_state WHERE server = ? AND coll = ?',
+                              (self.server, coll)).fetchone()
+        return row if row else (None, None)
+
+    def set_state(self, coll, watermark=_UNSET, next_cursor=_UNSET):
+        current_watermark, current_cursor = self.state(coll)
+        with self.db:
+            self.db.execute('INSERT OR REPLACE INTO sync_state (server, coll, watermark, next_cursor) VALUES (?, ?, ?, ?)',
+                            (self.server, coll,
+                             current_watermark if watermark is _UNSET else watermark,
+                             current_cursor if next_cursor is _UNSET else next_cursor))
+
+    # --- documents ---
+    def page(self, coll, after_key=None, limit=None):
+        """
+        Up to `limit` documents, newest first, starting after `after_key` (the
+        last key of the previous page). Returns (docs, last key).
+        """
+        sql = 'SELECT order_key, doc FROM docs WHERE server = ? AND coll = ?'
+        args = [self.server, coll]
+        if after_key is not None:
+            sql += ' AND order_key < ?'
+            args.append(after_key)
+        sql += ' ORDER BY order_key DESC'
+        if limit:
+            sql += ' LIMIT ?'
+            args.append(limit)
+        rows = self.db.execute(sql, args).fetchall()
+        return [json.loads(doc) for _, doc in rows], (rows[-1][0] if rows else after_key)
+
+    def count(self, coll):
+        return self.db.execute('SELECT COUNT(*) FROM docs WHERE server = ? AND coll = ?',
+                               (self.server, coll)).fetchone()[0]
+
+    def put(self, coll, docs):
+        with self.db:
+            self.db.executemany('INSERT OR REPLACE INTO docs (server, coll, id, order_key, doc) VALUES (?, ?, ?, ?, ?)',
+                                [(self.server, coll, d['_id'], _order_key(coll, d), json.dumps(d))
+                                 for d in docs if d.get('_id')])
+
+    def remove(self, coll, ids):
+        with self.db:
+            self.db.executemany('DELETE FROM docs WHERE server = ? AND coll = ? AND id = ?',
+                                [(self.server, coll, i) for i in ids])
+
+    def clear(self, coll):
+        with self.db:
+            self.db.execute('DELETE FROM docs WHERE server = ? AND coll = ?', (self.server, coll))
+            self.db.execute('DELETE FROM sync_state WHERE server = ? AND coll = ?', (self.server, coll))
@@ -1,43 +1,129 @@
 import sys
-import requests
-import reportlab
-import pyqtgraph as pg
-import openpyxl
-
-from openpyxl import Workbook
-
-from PyQt5.QtWidgets import QFileDialog
-from reportlab.lib.pagesizes import letter
-from reportlab.pdfgen import canvas
+import time
 
+STARTED = time.perf_counter()  # origin of the --profile-startup timings
 
 from PyQt5.QtWidgets import (
-    QApplication, QWidget, QVBoxLayout, QPushButton, QTableWidget, QTableWidgetItem,
-    QMessageBox, QDialog, QLabel, QLineEdit, QFormLayout, QHBoxLayout, QHeaderView, QHBoxLayout , QSplitter
+    QApplication, QWidget, QVBoxLayout, QPushButton, QTableWidget, QTableWidgetItem, QTableView,
+    QMessageBox, QDialog, QLabel, QLineEdit, QFormLayout, QHBoxLayout, QHeaderView, QSplitter,
+    QCheckBox, QSpinBox, QProgressDialog, QComboBox, QFileDialog, QShortcut
 )
-from PyQt5.QtCore import Qt, QThread, pyqtSignal
-from datetime import datetime
+from PyQt5.QtCore import Qt, QObject, QTimer
+from PyQt5.QtGui import QDoubleValidator, QKeySequence
+from datetime import datetime, timedelta, timezone
 
+from api_client import ApiClient, RecordCache
+from local_cache import LocalCache
+from startup import StartupProfile, prewarm
+from telemetry import TelemetryOverlay, telemetry
 
-API_BASE = 'http://localhost:5000/api'
+# Heavy modules are imported where first used, not here, so the login dialog
+# doesn't wait for them: queue_model/queue_filter (numpy), excel_export
+# (openpyxl) and dashboard (pyqtgraph). prewarm() loads them in the background.
+PREWARM_AT_LOGIN = ['queue_model']
+PREWARM_AFTER_LOGIN = ['excel_export', 'dashboard']
 
-# --- Thread for login ---
-class LoginThread(QThread):
-    finished = pyqtSignal(dict)
-    error = pyqtSignal(str)
 
-    def __init__(self, username, password):
+API_BASE = 'http://localhost:5000/api'
+PAGE_SIZE = 5000  # exceptions per page; the table pulls the next page when scrolled to the end
+AUTO_REFRESH_SECONDS = 30  # default auto-refresh interval
+REPORT_POLL_MS = 1000  # how often a pending server-side report is checked
+
+# (label, fields) choices of the filter bar's text search; None = every text column
+FILTER_FIELDS = [
+    ('All fields', None),
+    ('Sender', ['sender']),
+    ('Receiver', ['receiver']),
+    ('Beneficiary', ['beneficiary_name']),
+    ('Error', ['error']),
+    ('ID', ['_id']),
+]
+
+# Every backend call goes through this client: worker threads, one keep-alive session
+api = ApiClient(API_BASE)
+
+# --- Server-side reports ---
+class ReportRequest(QObject):
+    """
+    Asks the backend for a report, waits for it to render (or reuses the copy
+    another operator already rendered) and downloads it to the chosen file.
+    """
+    active = set()  # requests in progress, kept alive until they finish
+
+    def __init__(self, parent, operator, kind, fmt, params=None):
         super().__init__()
-        self.username = username
-        self.password = password
+        self.parent = parent
+        self.operator = operator
+        self.kind = kind
+        self.fmt = fmt
+        self.params = params or {}
+        self.key = f'report-{kind}-{fmt}'
+        self.job = None
+        self.path = None
+        self.progress = None
+        self.poll = QTimer(self)
+        self.poll.setSingleShot(True)
+        self.poll.setInterval(REPORT_POLL_MS)
+        self.poll.timeout.connect(self.check)
+
+    def start(self):
+        self.path, _ = QFileDialog.getSaveFileName(self.parent, f"Save {self.kind} report", f"{self.kind}-report.{self.fmt}",
+                                                   f"{self.fmt.upper()} Files (*.{self.fmt})")
+        if not self.path:
+            return
+        ReportRequest.active.add(self)
+        self.progress = QProgressDialog('Rendering report on the server…', 'Cancel', 0, 0, self.parent)
+        self.progress.setWindowTitle('Report')
+        self.progress.setWindowModality(Qt.WindowModal)
+        self.progress.setMinimumDuration(0)
+        self.progress.canceled.connect(self.cancel)
+        api.post('/reports', json={'kind': self.kind, 'format': self.fmt, 'params': self.params, 'operator': self.operator},
+                 key=self.key, on_result=self.on_job, on_error=self.failed)
+
+    def check(self):
+        api.get(f"/reports/{self.job['id']}", key=self.key, on_result=self.on_job, on_error=self.failed)
+
+    def on_job(self, status, data):
+        if not data.get('ok'):
+            self.failed(data.get('error'))
+            return
+        self.job = data['report']
+        if self.job['status'] == 'failed':
+            self.failed(self.job['error'])
+        elif self.job['status'] == 'done':
+            self.progress.setLabelText('Downloading report…')
+            api.download(f"/reports/{self.job['id']}/download", self.path, key=self.key, timeout=(5, 120),
+                         on_result=self.downloaded, on_error=self.failed)
+        else:
+            self.progress.setLabelText(f"Rendering report on the server… ({self.job['status']})")
+            self.poll.start()
 
-    def run(self):
-        try:
-            r = requests.post(API_BASE + '/login', json={'username': self.username, 'password': self.password}, timeout=5)
-            self.finished.emit(r.json())
-        except Exception as e:
-            self.error.emit(str(e))
-            
+    def downloaded(self, status, data):
+        if not data.get('ok'):
+            self.failed(data.get('error'))
+            return
+        self.finish()
+        QMessageBox.information(self.parent, 'Report', f"Saved {data['bytes']:,} bytes to {self.path}")
+
+    def failed(self, message):
+        self.finish()
+        QMessageBox.critical(self.parent, 'Report', f'Report failed:\n{message}')
+
+    def cancel(self):
+        # the render carries on server-side and stays cached for the next request
+        api.cancel(self.key)
+        self.finish()
+
+    def finish(self):
+        self.poll.stop()
+        self.progress.canceled.disconnect(self.cancel)
+        self.progress.close()
+        self.progress.deleteLater()
+        ReportRequest.active.discard(self)
+
+
+def request_report(parent, operator, kind, fmt, params=None):
+    ReportRequest(parent, operator, kind, fmt, params).start()
 
 
 # --- Login Dialog ---
@@ -124,13 +210,13 @@ class LoginDialog(QDialog):
     def do_login(self):
         u = self.username.text()
         p = self.password.text()
-        self.thread = LoginThread(u, p)
-        self.thread.finished.connect(self.on_login_result)
-        self.thread.error.connect(lambda e: QMessageBox.critical(self, 'Error', e))
-        self.thread.start()
+        api.post('/login', json={'username': u, 'password': p}, timeout=5, key='login',
+                 on_result=self.on_login_result,
+                 on_error=lambda e: QMessageBox.critical(self, 'Error', e))
 
-    def on_login_result(self, data):
+    def on_login_result(self, status, data):
         if data.get('ok'):
+            api.set_token(data.get('token'))
             self.result = self.username.text()
             self.accept()
         else:
@@ -140,29 +226,6 @@ class LoginDialog(QDialog):
         dlg = SignupDialog()
         dlg.exec_()
 
-# --- Signup Thread ---
-class SignupThread(QThread):
-    finished = pyqtSignal(dict)
-    error = pyqtSignal(str)
-
-    def __init__(self, name, username, password):
-        super().__init__()
-        self.name = name
-        self.username = username
-        self.password = password
-
-    def run(self):
-        try:
-            r = requests.post(API_BASE + '/signup', json={
-                'name': self.name,
-                'username': self.username,
-                'password': self.password
-            }, timeout=5)
-            self.finished.emit(r.json())
-        except Exception as e:
-            self.error.emit(str(e))
-
-
 # --- Signup Dialog ---
 class SignupDialog(QDialog):
     def __init__(self):
@@ -215,12 +278,11 @@ class SignupDialog(QDialog):
             QMessageBox.warning(self, "Error", "All fields are required!")
             return
 
-        self.thread = SignupThread(n, u, p)
-        self.thread.finished.connect(self.on_signup_result)
-        self.thread.error.connect(lambda e: QMessageBox.critical(self, 'Error', e))
-        self.thread.start()
+        api.post('/signup', json={'name': n, 'username': u, 'password': p}, timeout=5, key='signup',
+                 on_result=self.on_signup_result,
+                 on_error=lambda e: QMessageBox.critical(self, 'Error', e))
 
-    def on_signup_result(self, data):
+    def on_signup_result(self, status, data):
         if data.get("ok"):
             QMessageBox.information(self, "Success", "Account created successfully! Please login.")
             self.accept()
@@ -236,6 +298,7 @@ class EditorDialog(QDialog):
         self.setFixedSize(400, 400)  # Bigger dialog
         self.tx = tx
         self.operator = operator
+        self.submitted = False  # a fix reached the backend (the stored record changed)
         self.init_ui()
 
     def init_ui(self):
@@ -296,10 +359,13 @@ class EditorDialog(QDialog):
         layout.addRow('IBAN:', self.iban)
         layout.addRow('Amount:', self.amount)
         layout.addRow('Currency:', self.currency)
+        if (self.tx.get('occurrences') or 1) > 1:
+            # upstream re-sent this payment; one fix resolves every copy
+            layout.addRow('Seen:', QLabel(f"{self.tx['occurrences']} times, last {self.tx.get('last_seen_at', '')}"))
 
         # Buttons
         btn_h = QHBoxLayout()
-        save_btn = QPushButton('Submit Fix')
+        self.save_btn = save_btn = QPushButton('Submit Fix')
         save_btn.setObjectName("submitBtn")
         save_btn.clicked.connect(self.submit_fix)
 
@@ -331,17 +397,23 @@ class EditorDialog(QDialog):
             'amount': self.amount.text(),
             'currency': self.currency.text()
         }
-        try:
-            r = requests.post(API_BASE + '/fix', json={'tx_id': self.tx.get('_id'), 'operator': self.operator, 'tx': new_tx}, timeout=5)
-            data = r.json()
-            if r.status_code == 200 and data.get('ok'):
-                QMessageBox.information(self, 'Success', 'Transaction processed successfully')
-                self.accept()
-            else:
-                errs = data.get('errors') or data.get('error') or 'Unknown error'
-                QMessageBox.warning(self, 'Validation failed', str(errs))
-        except Exception as e:
-            QMessageBox.critical(self, 'Error', str(e))
+        self.save_btn.setEnabled(False)
+        api.post('/fix', json={'tx_id': self.tx.get('_id'), 'operator': self.operator, 'tx': new_tx}, timeout=5,
+                 key='fix', on_result=self.on_fix_result, on_error=self.on_fix_error)
+
+    def on_fix_result(self, status, data):
+        self.save_btn.setEnabled(True)
+        self.submitted = True
+        if status == 200 and data.get('ok'):
+            QMessageBox.information(self, 'Success', 'Transaction processed successfully')
+            self.accept()
+        else:
+            errs = data.get('errors') or data.get('error') or 'Unknown error'
+            QMessageBox.warning(self, 'Validation failed', str(errs))
+
+    def on_fix_error(self, message):
+        self.save_btn.setEnabled(True)
+        QMessageBox.critical(self, 'Error', message)
 
 # --- Main Window ---
 class MainWindow(QWidget):
@@ -350,18 +422,33 @@ class MainWindow(QWidget):
         self.operator = operator
         self.setWindowTitle(f'Exception Queue - Operator: {operator}')
         self.resize(1000, 600)
+        self.records = RecordCache()  # full documents by id, so opening an editor needs no reload
+        self.local = LocalCache(API_BASE)  # last synced queue on disk, for an instant start
+        self.offline = False
 
         self.setup_ui()
+        self.warm_start()
 
     def setup_ui(self):
+        from queue_model import ExceptionsTableModel, QueueSortProxy
+
         # --- Table Setup ---
-        self.table = QTableWidget(0, 6)
-        self.table.setHorizontalHeaderLabels(
-            ['ID', 'Sender', 'Receiver', 'Beneficiary', 'Amount', 'Error']
-        )
+        self.model = ExceptionsTableModel(self.fetch_exceptions_page)
+        self.proxy = QueueSortProxy()
+        self.proxy.setSourceModel(self.model)
+
+        self.table = QTableView()
+        self.table.setModel(self.proxy)
         self.table.setAlternatingRowColors(True)
-        self.table.setSortingEnabled(True)
+        self.table.setSelectionBehavior(QTableView.SelectRows)
+        self.table.setWordWrap(False)
+        # fixed row height keeps scrolling O(visible rows) regardless of row count
+        self.table.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+        self.table.verticalHeader().setDefaultSectionSize(24)
         self.table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        # start unsorted (backend order: newest first); clicking a header sorts
+        self.table.horizontalHeader().setSortIndicator(-1, Qt.AscendingOrder)
+        self.table.setSortingEnabled(True)
 
         # --- Buttons ---
         btn_reload = QPushButton('🔄 Load Exceptions')
@@ -389,12 +476,33 @@ class MainWindow(QWidget):
         btn_operator_stats = QPushButton('📈 Operator Stats')
         btn_operator_stats.clicked.connect(self.show_operator_stats)
 
+        # --- Latency overlay (Ctrl+Shift+P) ---
+        self.telemetry_overlay = TelemetryOverlay(api, self)
+        self.telemetry_overlay.hide()
+        btn_telemetry = QPushButton('⏱ Latency')
+        btn_telemetry.clicked.connect(self.toggle_telemetry)
+        QShortcut(QKeySequence('Ctrl+Shift+P'), self, activated=self.toggle_telemetry)
+
+        # --- Auto-refresh (merges changes into the table instead of rebuilding it) ---
+        self.auto_refresh = QCheckBox('Auto-refresh every')
+        self.auto_refresh.toggled.connect(self.toggle_auto_refresh)
+        self.refresh_interval = QSpinBox()
+        self.refresh_interval.setRange(5, 3600)
+        self.refresh_interval.setSuffix(' s')
+        self.refresh_interval.setValue(AUTO_REFRESH_SECONDS)
+        self.refresh_interval.valueChanged.connect(lambda v: self.refresh_timer.setInterval(v * 1000))
+        self.refresh_timer = QTimer(self)
+        self.refresh_timer.setInterval(AUTO_REFRESH_SECONDS * 1000)
+        self.refresh_timer.timeout.connect(self.sync_exceptions)
+
         # --- Layout for buttons ---
         btn_row1 = QHBoxLayout()
         btn_row1.addWidget(btn_reload)
         btn_row1.addWidget(btn_seed)
         btn_row1.addWidget(btn_operator_stats)
         btn_row1.addStretch(1)  # push right
+        btn_row1.addWidget(self.auto_refresh)
+        btn_row1.addWidget(self.refresh_interval)
 
         btn_row2 = QHBoxLayout()
         btn_row2.addWidget(btn_edit)
@@ -403,10 +511,52 @@ class MainWindow(QWidget):
         btn_row2.addWidget(btn_export_pdf)
         btn_row2.addWidget(btn_export_excel)
         btn_row2.addStretch(1)
+        btn_row2.addWidget(btn_telemetry)
+
+        # --- Filter bar (narrows the loaded rows as you type) ---
+        self.filter_field = QComboBox()
+        for label, _ in FILTER_FIELDS:
+            self.filter_field.addItem(label)
+        self.filter_text = QLineEdit()
+        self.filter_text.setPlaceholderText('Search…')
+        self.filter_min = QLineEdit()
+        self.filter_min.setPlaceholderText('Min amount')
+        self.filter_max = QLineEdit()
+        self.filter_max.setPlaceholderText('Max amount')
+        for edit in (self.filter_min, self.filter_max):
+            edit.setValidator(QDoubleValidator(edit))
+            edit.setMaximumWidth(110)
+        self.filter_from = QLineEdit()
+        self.filter_from.setPlaceholderText('From YYYY-MM-DD')
+        self.filter_to = QLineEdit()
+        self.filter_to.setPlaceholderText('To YYYY-MM-DD')
+        for edit in (self.filter_from, self.filter_to):
+            edit.setInputMask('0000-00-00;_')
+            edit.setMaximumWidth(110)
+        btn_clear_filter = QPushButton('Clear')
+        btn_clear_filter.clicked.connect(self.clear_filter)
+        self.filter_count = QLabel()
+
+        self.filter_field.currentIndexChanged.connect(self.apply_filter)
+        for edit in (self.filter_text, self.filter_min, self.filter_max, self.filter_from, self.filter_to):
+            edit.textChanged.connect(self.apply_filter)
+        for signal in (self.proxy.rowsInserted, self.proxy.rowsRemoved, self.proxy.modelReset, self.proxy.layoutChanged):
+            signal.connect(self.update_filter_count)
+
+        filter_row = QHBoxLayout()
+        filter_row.addWidget(self.filter_field)
+        filter_row.addWidget(self.filter_text, 1)
+        filter_row.addWidget(self.filter_min)
+        filter_row.addWidget(self.filter_max)
+        filter_row.addWidget(self.filter_from)
+        filter_row.addWidget(self.filter_to)
+        filter_row.addWidget(btn_clear_filter)
+        filter_row.addWidget(self.filter_count)
 
         btn_layout = QVBoxLayout()
         btn_layout.addLayout(btn_row1)
         btn_layout.addLayout(btn_row2)
+        btn_layout.addLayout(filter_row)
 
         # --- Splitter (Resizable UI) ---
         splitter = QSplitter(Qt.Vertical)
@@ -416,62 +566,271 @@ class MainWindow(QWidget):
         splitter.addWidget(self.table)
         splitter.setSizes([100, 500])  # initial size ratio
 
+        # --- Offline banner (shown while the backend is unreachable) ---
+        self.offline_banner = QLabel()
+        self.offline_banner.setWordWrap(True)
+        self.offline_banner.setStyleSheet('background: #fff3cd; color: #664d03; padding: 4px;')
+        self.offline_banner.hide()
+
         # --- Main Layout ---
         main_layout = QVBoxLayout()
+        main_layout.addWidget(self.offline_banner)
         main_layout.addWidget(splitter)
         self.setLayout(main_layout)
 
+    def show_error(self, message):
+        QMessageBox.critical(self, 'Error', message)
+
+    def toggle_telemetry(self):
+        if self.telemetry_overlay.isVisible():
+            self.telemetry_overlay.hide()
+            return
+        self.place_telemetry()
+        self.telemetry_overlay.show()
+        self.telemetry_overlay.raise_()
+
+    def place_telemetry(self):
+        # bottom-right corner, over the table
+        width, height = min(760, self.width() - 20), min(320, self.height() - 20)
+        self.telemetry_overlay.setGeometry(self.width() - width - 10, self.height() - height - 10, width, height)
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        if self.telemetry_overlay.isVisible():
+            self.place_telemetry()
+
+    # --- Filtering ---
+    def apply_filter(self):
+        from queue_filter import QueueFilter
+        from queue_model import TEXT_FIELDS
+
+        def amount(edit):
+            try:
+                return float(edit.text().replace(',', ''))
+            except ValueError:
+                return None
+
+        def day(edit):
+            # epoch seconds of midnight UTC; incomplete or invalid dates don't filter
+            try:
+                return datetime.strptime(edit.text(), '%Y-%m-%d').replace(tzinfo=timezone.utc)
+            except ValueError:
+                return None
+
+        created_from, created_to = day(self.filter_from), day(self.filter_to)
+        with telemetry.timed('render', 'queue table: filter') as timing:
+            self.proxy.set_filter(QueueFilter(
+                self.filter_text.text(),
+                FILTER_FIELDS[self.filter_field.currentIndex()][1] or TEXT_FIELDS,
+                min_amount=amount(self.filter_min),
+                max_amount=amount(self.filter_max),
+                created_from=created_from.timestamp() if created_from else None,
+                # the "to" day is inclusive
+                created_to=(created_to + timedelta(days=1)).timestamp() if created_to else None,
+            ))
+            timing['rows'] = self.proxy.rowCount()
+
+    def clear_filter(self):
+        for edit in (self.filter_text, self.filter_min, self.filter_max, self.filter_from, self.filter_to):
+            edit.blockSignals(True)
+            edit.clear()
+            edit.blockSignals(False)
+        self.apply_filter()
+
+    def update_filter_count(self, *args):
+        shown, loaded = self.proxy.rowCount(), self.proxy.live_count()
+        self.filter_count.setText(f'{shown:,} of {loaded:,}' if shown != loaded else f'{loaded:,} rows')
+
     def seed_data(self):
-        try:
-            r = requests.post(API_BASE + '/seed', timeout=5)
-            data = r.json()
-            QMessageBox.information(self, 'Seed', f"Inserted: {data.get('inserted_count')}")
+        def done(status, data):
+            if not data.get('ok'):
+                self.show_error(data.get('error', f'HTTP {status}'))
+                return
+            QMessageBox.information(self, 'Seed', f"Inserted: {data.get('inserted_count')}, "
+                                                  f"duplicates collapsed: {data.get('duplicate_count', 0)}")
             self.load_exceptions()
-        except Exception as e:
-            QMessageBox.critical(self, 'Error', str(e))
+        api.post('/seed', timeout=5, key='seed', on_result=done, on_error=self.show_error)
+
+    def warm_start(self):
+        # show the cached queue right away, then fetch only what changed since it was synced
+        docs, last_key = self.local.page('exceptions', limit=PAGE_SIZE)
+        if not docs:
+            self.load_exceptions()
+            return
+        self.records.put_many(docs)
+        with telemetry.timed('render', 'queue table: cached start', rows=len(docs)):
+            self.model.reset(docs, self.next_local_cursor(docs, last_key))
+        self.sync_exceptions()
+
+    def next_local_cursor(self, docs, last_key):
+        # further cached rows are paged in from disk first, then from the backend
+        if len(docs) == PAGE_SIZE:
+            return ('local', last_key)
+        return self.local.state('exceptions')[1]
+
+    def set_offline(self, offline, message=None):
+        if offline != self.offline:
+            self.offline = offline
+            suffix = ' (offline: showing the cached queue)' if offline else ''
+            self.setWindowTitle(f'Exception Queue - Operator: {self.operator}{suffix}')
+        if offline:
+            self.offline_banner.setText(f'Backend unreachable, showing the cached queue: {message}')
+        self.offline_banner.setVisible(offline)
 
     def load_exceptions(self):
-        try:
-            r = requests.get(API_BASE + '/exceptions', timeout=5)
-            data = r.json()
-            arr = data.get('exceptions', [])
-            self.table.setRowCount(0)
-            for tx in arr:
-                row = self.table.rowCount()
-                self.table.insertRow(row)
-                self.table.setItem(row, 0, QTableWidgetItem(tx.get('_id')))
-                self.table.setItem(row, 1, QTableWidgetItem(tx.get('sender', '')))
-                self.table.setItem(row, 2, QTableWidgetItem(tx.get('receiver', '')))
-                self.table.setItem(row, 3, QTableWidgetItem(tx.get('beneficiary_name', '')))
-                self.table.setItem(row, 4, QTableWidgetItem(str(tx.get('amount', ''))))
-                self.table.setItem(row, 5, QTableWidgetItem(tx.get('error', '')))
-        except Exception as e:
-            QMessageBox.critical(self, 'Error', str(e))
+        # a reload makes any page or sync still in flight meaningless
+        api.cancel('exceptions-page')
+        api.cancel('exceptions-refresh')
+        def loaded(status, data):
+            if not data.get('ok'):
+                self.show_error(data.get('error', f'HTTP {status}'))
+                return
+            self.set_offline(False)
+            docs = data.get('exceptions', [])
+            self.records.put_many(docs)
+            self.local.clear('exceptions')
+            self.local.put('exceptions', docs)
+            self.local.set_state('exceptions', watermark=data.get('watermark'), next_cursor=data.get('next_cursor'))
+            with telemetry.timed('render', 'queue table: reload', rows=len(docs)):
+                self.model.reset(docs, data.get('next_cursor'))
+        def failed(message):
+            if self.model.rowCount():
+                self.set_offline(True, message)
+            else:
+                self.show_error(message)
+        api.get('/exceptions', params={'limit': PAGE_SIZE}, timeout=5, key='exceptions',
+                on_result=loaded, on_error=failed)
+
+    def toggle_auto_refresh(self, enabled):
+        if enabled:
+            self.refresh_timer.start()
+            self.sync_exceptions()
+        else:
+            self.refresh_timer.stop()
+            api.cancel('exceptions-refresh')
+
+    def sync_exceptions(self):
+        # only what changed since the last sync; merged by id, so selection and scroll position survive
+        watermark, _ = self.local.state('exceptions')
+        if watermark is None:
+            self.load_exceptions()
+            return
+        def merged(status, data):
+            if status == 429:
+                return  # rate limited: the backend is up, the next tick syncs
+            if not data.get('ok'):
+                self.set_offline(True, data.get('error', f'HTTP {status}'))
+                return
+            self.set_offline(False)
+            if data.get('resync'):
+                self.load_exceptions()
+                return
+            docs, removed = data.get('exceptions', []), data.get('removed', [])
+            self.records.put_many(docs)
+            for tx_id in removed:
+                self.records.invalidate(tx_id)
+            self.local.put('exceptions', docs)
+            self.local.remove('exceptions', removed)
+            self.local.set_state('exceptions', watermark=data.get('watermark'))
+            with telemetry.timed('render', 'queue table: merge changes', rows=len(docs) + len(removed)):
+                self.model.apply_changes(docs, removed)
+        api.get('/exceptions', params={'changed_since': watermark}, timeout=30, key='exceptions-refresh',
+                on_result=merged, on_error=lambda e: self.set_offline(True, e))
+
+    def fetch_exceptions_page(self, cursor):
+        # called by the model's fetchMore when the view reaches the last loaded row
+        if isinstance(cursor, tuple):
+            docs, last_key = self.local.page('exceptions', after_key=cursor[1], limit=PAGE_SIZE)
+            self.records.put_many(docs)
+            with telemetry.timed('render', 'queue table: cached page', rows=len(docs)):
+                self.model.append_page(docs, self.next_local_cursor(docs, last_key))
+            return
+        def failed(message):
+            self.model.append_page([], cursor)  # keep the cursor so scrolling retries
+            self.show_error(message)
+        def loaded(status, data):
+            if not data.get('ok'):
+                failed(data.get('error', f'HTTP {status}'))
+                return
+            docs = data.get('exceptions', [])
+            self.records.put_many(docs)
+            self.local.put('exceptions', docs)
+            self.local.set_state('exceptions', next_cursor=data.get('next_cursor'))
+            with telemetry.timed('render', 'queue table: page', rows=len(docs)):
+                self.model.append_page(docs, data.get('next_cursor'))
+        api.get('/exceptions', params={'limit': PAGE_SIZE, 'after': cursor}, timeout=5, key='exceptions-page',
+                on_result=loaded, on_error=failed)
 
     def edit_selected(self):
-        r = self.table.currentRow()
-        if r < 0:
+        index = self.table.currentIndex()
+        if not index.isValid():
             QMessageBox.warning(self, 'Select', 'Please select a transaction')
             return
-        tx_id = self.table.item(r, 0).text()
-        try:
-            resp = requests.get(API_BASE + '/exceptions', timeout=5)
-            data = resp.json()
-            tx = next((x for x in data.get('exceptions', []) if x.get('_id') == tx_id), None)
-            if not tx:
+        tx_id = self.model.tx_id(self.proxy.mapToSource(index).row())
+
+        # fresh cache hit: no request at all
+        cached = self.records.get(tx_id)
+        if cached and not cached[2]:
+            self.open_editor(cached[0])
+            return
+
+        # otherwise one small request, a bodyless 304 if our copy is still current
+        headers = {'If-None-Match': cached[1]} if cached and cached[1] else {}
+
+        def fetched(status, data, response_headers):
+            if status == 304 and cached:
+                self.records.touch(tx_id)
+                self.open_editor(cached[0])
+            elif status == 200 and data.get('ok'):
+                tx = data['exception']
+                self.records.put(tx, response_headers.get('ETag'))
+                self.open_editor(tx)
+            elif status == 404:
+                self.records.invalidate(tx_id)
                 QMessageBox.warning(self, 'Not found', 'Transaction not found')
-                return
-            dlg = EditorDialog(tx, self.operator)
-            if dlg.exec_():
-                self.load_exceptions()
-        except Exception as e:
-            QMessageBox.critical(self, 'Error', str(e))
+            else:
+                self.show_error(data.get('error', f'HTTP {status}'))
+        def failed(message):
+            if cached:
+                # backend unreachable: the cached copy is still good for reading
+                self.set_offline(True, message)
+                self.open_editor(cached[0])
+            else:
+                self.show_error(message)
+        api.get(f'/exceptions/{tx_id}', headers=headers, timeout=5, key='edit', with_headers=True,
+                on_result=fetched, on_error=failed)
+
+    def open_editor(self, tx):
+        dlg = EditorDialog(tx, self.operator)
+        accepted = dlg.exec_()
+        # fixed (gone from the queue) or rejected with last_error set: either way our copy is stale
+        if dlg.submitted:
+            self.records.invalidate(tx.get('_id'))
+        if accepted:
+            self.sync_exceptions()
 
     def show_processed(self):
+        # only records processed since the last look are downloaded; the rest come from the local cache
+        watermark, _ = self.local.state('processed')
+        def loaded(status, data):
+            if not data.get('ok'):
+                self.show_error(data.get('error', f'HTTP {status}'))
+                return
+            self.local.put('processed', data.get('processed', []))
+            self.local.set_state('processed', watermark=data.get('watermark'))
+            self.on_processed()
+        def failed(message):
+            if watermark is None:
+                self.show_error(message)
+                return
+            self.set_offline(True, message)
+            self.on_processed()
+        api.get('/processed', params={'since': watermark} if watermark else {}, timeout=5, key='processed',
+                on_result=loaded, on_error=failed)
+
+    def on_processed(self):
         try:
-            r = requests.get(API_BASE + '/processed', timeout=5)
-            data = r.json()
-            arr = data.get('processed', [])
+            arr, _ = self.local.page('processed')
             if not arr:
                 QMessageBox.information(self, 'Processed', 'No processed transactions')
                 return
@@ -489,19 +848,27 @@ class MainWindow(QWidget):
             table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
 
             # Populate table
-            for row, a in enumerate(arr):
-                table.setItem(row, 0, QTableWidgetItem(a.get('processed_by', '')))
-                table.setItem(row, 1, QTableWidgetItem(a.get('message_type', '')))
-                table.setItem(row, 2, QTableWidgetItem(a.get('beneficiary_name', '')))
-                table.setItem(row, 3, QTableWidgetItem(str(a.get('amount', ''))))
-                table.setItem(row, 4, QTableWidgetItem(a.get('currency', '')))
+            with telemetry.timed('render', 'processed table', rows=len(arr)):
+                for row, a in enumerate(arr):
+                    table.setItem(row, 0, QTableWidgetItem(a.get('processed_by', '')))
+                    table.setItem(row, 1, QTableWidgetItem(a.get('message_type', '')))
+                    table.setItem(row, 2, QTableWidgetItem(a.get('beneficiary_name', '')))
+                    table.setItem(row, 3, QTableWidgetItem(str(a.get('amount', ''))))
+                    table.setItem(row, 4, QTableWidgetItem(a.get('currency', '')))
 
             layout.addWidget(table)
 
-            # Close button
+            # Server-rendered reports cover every processed record, not just this list
+            btn_row = QHBoxLayout()
+            for fmt in ('pdf', 'xlsx', 'csv'):
+                btn = QPushButton(f"Report ({fmt.upper()})")
+                btn.clicked.connect(lambda _, fmt=fmt: request_report(dlg, self.operator, 'processed', fmt))
+                btn_row.addWidget(btn)
+            btn_row.addStretch(1)
             btn_close = QPushButton("Close")
             btn_close.clicked.connect(dlg.close)
-            layout.addWidget(btn_close)
+            btn_row.addWidget(btn_close)
+            layout.addLayout(btn_row)
 
             dlg.exec_()
 
@@ -509,12 +876,12 @@ class MainWindow(QWidget):
             QMessageBox.critical(self, 'Error', str(e))
             
     def show_operator_stats(self):
-        try:
-            url = f"{API_BASE}/operator_stats"
-            response = requests.get(url)
-            if response.status_code == 200:
-                data = response.json()
+        api.get('/operator_stats', key='operator_stats', on_result=self.on_operator_stats,
+                on_error=lambda e: QMessageBox.critical(self, "Error", f"Could not load operator stats:\n{e}"))
 
+    def on_operator_stats(self, status, data):
+        try:
+            if status == 200:
                 if not data.get("ok") or "stats" not in data:
                     QMessageBox.warning(self, "No Data", "No stats available.")
                     return
@@ -526,22 +893,27 @@ class MainWindow(QWidget):
                 stats_win.setWindowTitle("📈 Operator Stats")
                 stats_win.resize(600, 400)
 
-                # Table with 3 columns: Operator, Count, Avg Resolution (hours)
-                table = QTableWidget(len(stats), 3)
-                table.setHorizontalHeaderLabels(["Operator", "Processed Count", "Avg Resolution (hrs)"])
+                # Operator, Count, then resolution times (hours): average and percentiles
+                table = QTableWidget(len(stats), 6)
+                table.setHorizontalHeaderLabels(["Operator", "Processed Count", "Avg Resolution (hrs)",
+                                                 "P50 (hrs)", "P90 (hrs)", "P99 (hrs)"])
                 table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
 
-                for row, entry in enumerate(stats):
-                    operator = entry.get("operator", "-")
-                    count = entry.get("count", 0)
-                    avg_res_seconds = entry.get("avg_resolution_seconds", 0)
-
+                def hours(seconds):
                     # convert seconds → hours with 2 decimals
-                    avg_res_hours = round(avg_res_seconds / 3600, 2)
+                    return f"{round(seconds / 3600, 2)} hrs" if seconds is not None else "-"
 
-                    table.setItem(row, 0, QTableWidgetItem(str(operator)))
-                    table.setItem(row, 1, QTableWidgetItem(str(count)))
-                    table.setItem(row, 2, QTableWidgetItem(f"{avg_res_hours} hrs"))
+                with telemetry.timed('render', 'operator stats table', rows=len(stats)):
+                    for row, entry in enumerate(stats):
+                        operator = entry.get("operator", "-")
+                        count = entry.get("count", 0)
+
+                        table.setItem(row, 0, QTableWidgetItem(str(operator)))
+                        table.setItem(row, 1, QTableWidgetItem(str(count)))
+                        table.setItem(row, 2, QTableWidgetItem(hours(entry.get("avg_resolution_seconds"))))
+                        table.setItem(row, 3, QTableWidgetItem(hours(entry.get("p50_resolution_seconds"))))
+                        table.setItem(row, 4, QTableWidgetItem(hours(entry.get("p90_resolution_seconds"))))
+                        table.setItem(row, 5, QTableWidgetItem(hours(entry.get("p99_resolution_seconds"))))
 
                 layout = QVBoxLayout()
                 layout.addWidget(table)
@@ -552,197 +924,81 @@ class MainWindow(QWidget):
                 self.stats_window = stats_win
 
             else:
-                QMessageBox.critical(self, "Error", f"Failed to fetch stats! ({response.status_code})")
+                QMessageBox.critical(self, "Error", f"Failed to fetch stats! ({status})")
 
         except Exception as e:
             QMessageBox.critical(self, "Error", f"Could not load operator stats:\n{e}")
 
             
     def show_dashboard(self):
-        dlg = DashboardDialog()
+        from dashboard import DashboardDialog
+
+        dlg = DashboardDialog(api, request_report, self)
         dlg.exec_()  # This opens the dashboard as a modal dialog
 
 
             
     def export_to_pdf(self):
-        path, _ = QFileDialog.getSaveFileName(self, "Save to PDF", "", "PDF Files (*.pdf)")
-        if not path:
-            return
-
-        c = canvas.Canvas(path, pagesize=letter)
-        width, height = letter
-        y = height - 40
-
-        # Write headers
-        headers = [self.table.horizontalHeaderItem(i).text() for i in range(self.table.columnCount())]
-        c.drawString(40, y, " | ".join(headers))
-        y -= 20
-
-        # Write table data
-        for row in range(self.table.rowCount()):
-            row_data = []
-            for col in range(self.table.columnCount()):
-                item = self.table.item(row, col)
-                row_data.append(item.text() if item else "")
-            c.drawString(40, y, " | ".join(row_data))
-            y -= 20
-            if y < 40:  # new page if space runs out
-                c.showPage()
-                y = height - 40
-
-        c.save()
+        # rendered (and cached for other operators) by the backend from the whole queue
+        request_report(self, self.operator, 'exceptions', 'pdf')
     
     def export_to_excel(self):
-        # Open save file dialog
+        # streams the whole queue from the backend (not just the loaded rows) on a worker thread
         path, _ = QFileDialog.getSaveFileName(self, "Save to Excel", "", "Excel Files (*.xlsx)")
         if not path:
             return
 
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "Exceptions"
-
-        # Write headers
-        headers = [self.table.horizontalHeaderItem(i).text() for i in range(self.table.columnCount())]
-        ws.append(headers)
-
-        # Write table data
-        for row in range(self.table.rowCount()):
-            row_data = []
-            for col in range(self.table.columnCount()):
-                item = self.table.item(row, col)
-                row_data.append(item.text() if item else "")
-            ws.append(row_data)
-
-        # Save workbook
-        wb.save(path)
-        print(f"✅ Data exported to {path}")
-
-
-
-import pyqtgraph as pg
-from PyQt5.QtWidgets import QVBoxLayout, QDialog, QLabel, QPushButton, QMessageBox
-import requests
-from reportlab.lib.utils import ImageReader
-from pyqtgraph.exporters import ImageExporter
-import tempfile
-
-
-API_BASE = "http://localhost:5000/api"
-
-
-
-class DashboardDialog(QDialog):
-    def __init__(self):
-        super().__init__()
-        self.setWindowTitle("Dashboard")
-        self.resize(900, 700)
-        self.layout = QVBoxLayout()
-        self.setLayout(self.layout)
-
-        # --- Summary Labels ---
-        self.total_exceptions_label = QLabel()
-        self.total_processed_label = QLabel()
-        self.processed_today_label = QLabel()
-        self.processed_recent_label = QLabel()
-        self.avg_resolution_label = QLabel()
-
-        for lbl in [self.total_exceptions_label, self.total_processed_label,
-                    self.processed_today_label, self.processed_recent_label,
-                    self.avg_resolution_label]:
-            lbl.setStyleSheet("font-size: 14px; font-weight: bold;")
-            self.layout.addWidget(lbl)
-
-        # --- Charts ---
-        self.top_errors_plot = pg.PlotWidget(title="Top Errors")
-        self.exceptions_by_type_plot = pg.PlotWidget(title="Exceptions by Message Type")
-        self.exceptions_trend_plot = pg.PlotWidget(title="Exceptions Trend (Last 30 Days)")
-        self.processed_by_operator_plot = pg.PlotWidget(title="Processed by Operator")
-
-        for chart in [self.top_errors_plot, self.exceptions_by_type_plot,
-                      self.exceptions_trend_plot, self.processed_by_operator_plot]:
-            chart.setBackground('w')
-            chart.showGrid(x=True, y=True)
-            chart.getAxis('left').setStyle(tickFont=pg.QtGui.QFont("Arial", 10))
-            chart.getAxis('bottom').setStyle(tickFont=pg.QtGui.QFont("Arial", 10))
-
-        self.layout.addWidget(self.top_errors_plot)
-        self.layout.addWidget(self.exceptions_by_type_plot)
-        self.layout.addWidget(self.exceptions_trend_plot)
-        self.layout.addWidget(self.processed_by_operator_plot)
+        progress = QProgressDialog('Exporting exceptions…', 'Cancel', 0, 0, self)
+        progress.setWindowTitle('Export to Excel')
+        progress.setWindowModality(Qt.WindowModal)
+        progress.setMinimumDuration(0)
+        progress.setAutoClose(False)
+        progress.setAutoReset(False)
 
-        # --- Buttons ---
-        btn_close = QPushButton("Close")
-        btn_close.clicked.connect(self.close)
+        from excel_export import ExcelExportWorker
 
-        
-        self.layout.addWidget(btn_close)
+        worker = ExcelExportWorker(api.session, API_BASE + '/exceptions/export', path, parent=self)
 
-        self.load_data()
+        def advanced(written, total):
+            if total:
+                progress.setMaximum(total)
+                progress.setValue(min(written, total))
+            progress.setLabelText(f'Exporting exceptions… {written:,} rows')
+        def succeeded(path, written):
+            progress.close()
+            QMessageBox.information(self, 'Export', f'Exported {written:,} exceptions to {path}')
+        def failed(message):
+            progress.close()
+            if message != 'cancelled':
+                self.show_error(f'Export failed:\n{message}')
 
-    def load_data(self):
-        try:
-            r = requests.get(f"{API_BASE}/dashboard", timeout=5)
-            self.data = r.json()  # store data for report generation
-            if not self.data.get("ok"):
-                QMessageBox.warning(self, "Error", "Could not load dashboard")
-                return
+        worker.progress.connect(advanced)
+        worker.succeeded.connect(succeeded)
+        worker.failed.connect(failed)
+        worker.finished.connect(worker.deleteLater)
+        progress.canceled.connect(worker.cancel)
+        worker.start()
 
-            # --- Summary Labels ---
-            self.total_exceptions_label.setText(f"Total Exceptions: {self.data.get('total_exceptions', 0)}")
-            self.total_processed_label.setText(f"Total Processed: {self.data.get('total_processed', 0)}")
-            self.processed_today_label.setText(f"Processed Today: {self.data.get('processed_today', 0)}")
-            self.processed_recent_label.setText(f"Processed Last 30 Days: {self.data.get('processed_recent_days', 0)}")
-            avg_sec = int(self.data.get('avg_resolution_seconds', 0))
-            self.avg_resolution_label.setText(f"Avg Resolution Time: {avg_sec} sec")
-
-            # --- Top Errors Bar Chart ---
-            self.top_errors_plot.clear()
-            top_errors = self.data.get('top_errors', [])
-            if top_errors:
-                errors = [e['error'] for e in top_errors]
-                counts = [e['count'] for e in top_errors]
-                bar = pg.BarGraphItem(x=range(len(errors)), height=counts, width=0.6, brush='r')
-                self.top_errors_plot.addItem(bar)
-                self.top_errors_plot.getAxis('bottom').setTicks([list(enumerate(errors))])
-
-            # --- Exceptions by Message Type ---
-            self.exceptions_by_type_plot.clear()
-            types = self.data.get('exceptions_by_message_type', [])
-            if types:
-                msg_types = [t['message_type'] for t in types]
-                counts = [t['count'] for t in types]
-                bar = pg.BarGraphItem(x=range(len(msg_types)), height=counts, width=0.6, brush='b')
-                self.exceptions_by_type_plot.addItem(bar)
-                self.exceptions_by_type_plot.getAxis('bottom').setTicks([list(enumerate(msg_types))])
-                 # --- Processed by Operator ---
-            self.processed_by_operator_plot.clear()
-            processed = self.data.get('processed_by_operator', [])
-            if processed:
-                names = [p['operator'] for p in processed]
-                counts = [p['count'] for p in processed]
-                bar = pg.BarGraphItem(x=range(len(names)), height=counts, width=0.6, brush='m')
-                self.processed_by_operator_plot.addItem(bar)
-                self.processed_by_operator_plot.getAxis('bottom').setTicks([list(enumerate(names))])
 
-        except Exception as e:
-            QMessageBox.critical(self, "Error", f"Could not load dashboard: {e}")
-            
-
-
-    
 
-    
-            
 # --- Main ---
 def main():
-    app = QApplication(sys.argv)
+    profile = StartupProfile(STARTED, enabled='--profile-startup' in sys.argv)
+    profile.mark('imports done')
+    app = QApplication([arg for arg in sys.argv if arg != '--profile-startup'])
+    profile.mark('QApplication created')
     login = LoginDialog()
+    profile.watch_paint(login, 'login dialog')
+    # the table model's imports load while the operator types
+    prewarm(PREWARM_AT_LOGIN, profile)
     if login.exec_() != QDialog.Accepted:
         sys.exit(0)
     operator = login.result
+    profile.mark('login accepted')
     w = MainWindow(operator)
+    profile.watch_paint(w, 'main window')
     w.show()
+    prewarm(PREWARM_AFTER_LOGIN, profile)
     sys.exit(app.exec_())
 
 if __name__ == '__main__':
@@ -0,0 +1,185 @@
+"""
+Indexed filtering of the loaded queue.
+
+Text columns get a word-prefix index: every lowercased word of a value points
+at the rows holding it, stored as one sorted word list plus a flat numpy
+array of rows grouped by word, so all rows for a prefix are a single slice
+found by two binary searches. Amount and created_at are contiguous float
+arrays and are range-filtered with vectorised comparisons. A QueueFilter
+turns the filter bar's state into a boolean mask over store rows, which is
+what QueueSortProxy applies on every keystroke.
+"""
+import re
+from bisect import bisect_left, insort
+
+import numpy as np
+
+_WORD = re.compile(r'\w+')
+_PREFIX_END = '\U0010ffff'
+
+# rows appended or changed since the last build, before the index is rebuilt
+_REBUILD_MIN = 4096
+_WORD_CACHE_LIMIT = 200000
+
+
+class TextIndex:
+    """Word-prefix index over one text column of a ColumnStore (a live list of strings)."""
+
+    def __init__(self, values):
+        self._values = values
+        self._word_cache = {}
+        self._build()
+
+    def _words(self, value):
+        # rows with the same value share one tuple of words
+        words = self._word_cache.get(value)
+        if words is None:
+            if len(self._word_cache) >= _WORD_CACHE_LIMIT:
+                self._word_cache.clear()
+            words = self._word_cache[value] = tuple(set(_WORD.findall(value.lower())))
+        return words
+
+    def _build(self):
+        # group rows by distinct value first: a column has far fewer distinct values than rows
+        value_ids = {}
+        row_values = np.fromiter((value_ids.setdefault(v, len(value_ids)) for v in self._values),
+                                 dtype=np.int64, count=len(self._values))
+        by_value = np.argsort(row_values, kind='stable')
+        value_counts = np.bincount(row_values, minlength=len(value_ids))
+        value_starts = np.concatenate(([0], np.cumsum(value_counts)[:-1]))
+        # (word, value) pairs, then every pair expanded to the rows holding that value
+        pair_words, pair_values = [], []
+        findall = _WORD.findall
+        for value, vid in value_ids.items():
+            if value.isalnum():  # one word (ids, BICs): skip the regex
+                pair_words.append(value.lower())
+                pair_values.append(vid)
+                continue
+            for word in set(findall(value.lower())):
+                pair_words.append(word)
+                pair_values.append(vid)
+        keys, pair_ranks = np.unique(np.array(pair_words, dtype=str), return_inverse=True)
+        self._keys = keys.tolist()
+        pair_ranks = pair_ranks.reshape(-1).astype(np.int64)
+        order = np.argsort(pair_ranks, kind='stable')
+        pair_ranks = pair_ranks[order]
+        pair_values = np.array(pair_values, dtype=np.int64)[order]
+        counts = value_counts[pair_values]
+        ends = np.cumsum(counts)
+        within = np.arange(int(ends[-1]) if len(ends) else 0) - np.repeat(ends - counts, counts)
+        self._rows = by_value[np.repeat(value_starts[pair_values], counts) + within]
+        self._offsets = np.concatenate(([0], np.cumsum(np.bincount(pair_ranks, weights=counts,
+                                                                   minlength=len(self._keys))))).astype(np.int64)
+        self._built = len(self._values)
+        # rows appended since the build: word -> rows, with the words kept sorted for prefix ranges
+        self._added = {}
+        self._added_keys = []
+        self._added_count = 0
+        # rows whose value was overwritten: excluded from the postings, checked one by one
+        self._changed = set()
+
+    def add(self, first, last):
+        """Index the appended rows first..last."""
+        for row in range(first, last + 1):
+            for word in self._words(self._values[row]):
+                rows = self._added.get(word)
+                if rows is None:
+                    self._added[word] = [row]
+                    insort(self._added_keys, word)
+                else:
+                    rows.append(row)
+        self._added_count += last - first + 1
+        self._maybe_rebuild()
+
+    def changed(self, row):
+        """The value at `row` was overwritten."""
+        self._changed.add(row)
+        self._maybe_rebuild()
+
+    def _maybe_rebuild(self):
+        if self._added_count + len(self._changed) > max(_REBUILD_MIN, self._built // 4):
+            self._build()
+
+    def match(self, prefix, out):
+        """Set out[row] for every row with a word starting with `prefix` (lowercase)."""
+        lo = bisect_left(self._keys, prefix)
+        hi = bisect_left(self._keys, prefix + _PREFIX_END, lo)
+        changed = self._changed
+        if changed:
+            found = np.zeros(len(out), dtype=bool)
+            found[self._rows[self._offsets[lo]:self._offsets[hi]]] = True
+        else:
+            found = out
+            found[self._rows[self._offsets[lo]:self._offsets[hi]]] = True
+        lo = bisect_left(self._added_keys, prefix)
+        hi = bisect_left(self._added_keys, prefix + _PREFIX_END, lo)
+        for word in self._added_keys[lo:hi]:
+            found[self._added[word]] = True
+        if changed:
+            rows = list(changed)
+            found[rows] = False
+            found[[r for r in rows if self.row_matches(r, prefix)]] = True
+            out |= found
+
+    def row_matches(self, row, prefix):
+        return any(w.startswith(prefix) for w in self._words(self._values[row]))
+
+
+class QueueFilter:
+    """
+    The filter bar's state. Every word of `text` must prefix-match a word in one
+    of `fields`; amounts and created_at (epoch seconds) must fall in the given
+    ranges (None = unbounded, `created_to` exclusive).
+    """
+
+    def __init__(self, text='', fields=(), min_amount=None, max_amount=None, created_from=None, created_to=None):
+        self.words = _WORD.findall(text.lower())
+        self.fields = tuple(fields)
+        self.min_amount = min_amount
+        self.max_amount = max_amount
+        self.created_from = created_from
+        self.created_to = created_to
+
+    def is_empty(self):
+        return not self.words and self.min_amount is None and self.max_amount is None \
+            and self.created_from is None and self.created_to is None
+
+    def mask(self, store):
+        """Boolean array over all store rows (retired ones included)."""
+        n = len(store)
+        mask = np.ones(n, dtype=bool)
+        for word in self.words:
+            word_mask = np.zeros(n, dtype=bool)
+            for field in self.fields:
+                store.text_index(field).match(word, word_mask)
+            mask &= word_mask
+        if self.min_amount is not None or self.max_amount is not None:
+            # copies: a numpy view would pin the array's buffer and block appends
+            amounts = np.array(store.amounts, dtype=np.float64)
+            if self.min_amount is not None:
+                mask &= amounts >= self.min_amount
+            if self.max_amount is not None:
+                mask &= amounts <= self.max_amount
+        if self.created_from is not None or self.created_to is not None:
+            created = np.array(store.created, dtype=np.float64)
+            if self.created_from is not None:
+                mask &= created >= self.created_from
+            if self.created_to is not None:
+                mask &= created < self.created_to
+        return mask
+
+    def accepts(self, store, row):
+        for word in self.words:
+            if not any(store.text_index(field).row_matches(row, word) for field in self.fields):
+                return False
+        amount = store.amounts[row]
+        if self.min_amount is not None and not amount >= self.min_amount:
+            return False
+        if self.max_amount is not None and not amount <= self.max_amount:
+            return False
+        created = store.created[row]
+        if self.created_from is not None and not created >= self.created_from:
+            return False
+        if self.created_to is not None and not created < self.created_to:
+            return False
+        return True
@@ -0,0 +1,558 @@
+"""
+Model/view plumbing for the exceptions queue table.
+
+ColumnStore keeps the loaded rows column by column (one list per field plus a
+float array for amounts), ExceptionsTableModel exposes it to Qt and pulls more
+pages from the backend through canFetchMore/fetchMore, and QueueSortProxy
+sorts by keeping a permutation of store rows instead of comparing rows one
+pair at a time through Python, which is what makes QSortFilterProxyModel
+unusable at a million rows.
+
+Refreshes are merged by id (ExceptionsTableModel.apply_changes): changed
+cells emit dataChanged, new records are appended, and records that left the
+queue are retired -- kept in the store but dropped from the proxy -- so no
+store row ever shifts and the view keeps its selection and scroll position.
+Retired rows are reclaimed on the next full reload.
+
+The filter bar narrows the loaded rows through QueueSortProxy.set_filter: a
+QueueFilter (queue_filter.py) evaluates to a mask over store rows from
+per-column word indexes and the amount/created arrays, and the proxy picks the
+accepted rows out of its already sorted order.
+"""
+import calendar
+import sys
+from array import array
+
+import numpy as np
+from PyQt5.QtCore import QAbstractProxyModel, QAbstractTableModel, QModelIndex, Qt, pyqtSignal
+
+from queue_filter import TextIndex
+
+# (document field, header label) for the visible columns
+COLUMNS = [
+    ('_id', 'ID'),
+    ('sender', 'Sender'),
+    ('receiver', 'Receiver'),
+    ('beneficiary_name', 'Beneficiary'),
+    ('amount', 'Amount'),
+    ('error', 'Error'),
+]
+FIELDS = [field for field, _ in COLUMNS]
+AMOUNT_COLUMN = FIELDS.index('amount')
+
+# text columns the filter bar can search
+TEXT_FIELDS = [field for field in FIELDS if field != 'amount']
+
+# fields with few distinct values, interned so repeated strings share one object
+_INTERNED = {'sender', 'receiver', 'error'}
+
+# up to this many inserted rows are placed one by one; more trigger a re-sort
+_INCREMENTAL_LIMIT = 256
+
+
+def _text(value):
+    if value.__class__ is str:
+        return value
+    return '' if value is None else str(value)
+
+
+def _amount_value(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return float('-inf')
+
+
+_MONTHS = {m: i for i, m in enumerate(('Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun',
+                                        'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec'), 1)}
+_DAY_SECONDS = {}
+
+
+def _epoch(value):
+    """Seconds since the epoch for an HTTP date ("Tue, 07 Jan 2025 10:00:00 GMT"); nan if unparseable."""
+    try:
+        day = _DAY_SECONDS.get(value[5:16])
+        if day is None:
+            day = _DAY_SECONDS[value[5:16]] = calendar.timegm(
+                (int(value[12:16]), _MONTHS[value[8:11]], int(value[5:7]), 0, 0, 0))
+        return day + int(value[17:19]) * 3600 + int(value[20:22]) * 60 + int(value[23:25])
+    except (TypeError, ValueError, KeyError):
+        return float('nan')
+
+
+class ColumnStore:
+    """The loaded queue, column-oriented."""
+
+    def __init__(self):
+        self.columns = {field: [] for field in FIELDS}
+        self.amounts = array('d')
+        self.created = array('d')  # created_at as epoch seconds, for date-range filters
+        self.alive = bytearray()
+        self.row_of = {}  # only live rows
+        self.indexes = {}  # field -> TextIndex, built on first filter use
+
+    def __len__(self):
+        return len(self.amounts)
+
+    def live_count(self):
+        return len(self.row_of)
+
+    def append(self, docs):
+        start = len(self.amounts)
+        for field in FIELDS:
+            values = [_text(doc.get(field)) for doc in docs]
+            if field in _INTERNED:
+                values = [sys.intern(v) for v in values]
+            self.columns[field].extend(values)
+        self.amounts.extend(_amount_value(doc.get('amount')) for doc in docs)
+        self.created.extend(_epoch(doc.get('created_at')) for doc in docs)
+        self.alive.extend(b'\x01' * len(docs))
+        ids = self.columns['_id']
+        self.row_of.update(zip(ids[start:], range(start, len(ids))))
+        if docs:
+            for index in self.indexes.values():
+                index.add(start, len(ids) - 1)
+
+    def update(self, row, doc):
+        """Overwrite `row` with `doc`; returns the indexes of the columns that changed."""
+        changed = []
+        for column, field in enumerate(FIELDS):
+            value = _text(doc.get(field))
+            col = self.columns[field]
+            if col[row] != value:
+                col[row] = sys.intern(value) if field in _INTERNED else value
+                changed.append(column)
+                if field in self.indexes:
+                    self.indexes[field].changed(row)
+        if AMOUNT_COLUMN in changed:
+            self.amounts[row] = _amount_value(doc.get('amount'))
+        self.created[row] = _epoch(doc.get('created_at'))
+        return changed
+
+    def retire(self, row):
+        self.alive[row] = 0
+        self.row_of.pop(self.columns['_id'][row], None)
+
+    def value(self, row, column):
+        return self.columns[FIELDS[column]][row]
+
+    def row_values(self, row):
+        return [self.columns[field][row] for field in FIELDS]
+
+    def text_index(self, field):
+        index = self.indexes.get(field)
+        if index is None:
+            index = self.indexes[field] = TextIndex(self.columns[field])
+        return index
+
+    def sort_key(self, column):
+        """Callable mapping a store row to its sort key for `column`."""
+        if column == AMOUNT_COLUMN:
+            return self.amounts.__getitem__
+        return self.columns[FIELDS[column]].__getitem__
+
+
+class ExceptionsTableModel(QAbstractTableModel):
+    """
+    Table model over a ColumnStore.
+
+    `request_page(cursor)` is called from fetchMore with the backend's
+    next_cursor; it must eventually hand the page to append_page().
+    """
+
+    # store rows that left the queue; the proxy drops them from the view
+    rowsRetired = pyqtSignal(list)
+
+    def __init__(self, request_page, parent=None):
+        super().__init__(parent)
+        self.store = ColumnStore()
+        self._request_page = request_page
+        self._next_cursor = None
+        self._fetching = False
+
+    # --- loading ---
+    def reset(self, docs, next_cursor):
+        self.beginResetModel()
+        self.store = ColumnStore()
+        self.store.append(docs)
+        self._next_cursor = next_cursor
+        self._fetching = False
+        self.endResetModel()
+
+    def append_page(self, docs, next_cursor):
+        self._fetching = False
+        self._next_cursor = next_cursor
+        self._insert(docs)
+
+    def _insert(self, docs):
+        # a refresh may already have merged some of these
+        docs = [d for d in docs if d.get('_id') not in self.store.row_of]
+        if not docs:
+            return
+        first = len(self.store)
+        self.beginInsertRows(QModelIndex(), first, first + len(docs) - 1)
+        self.store.append(docs)
+        self.endInsertRows()
+
+    def apply_changes(self, docs, removed_ids):
+        """
+        Merge changed/new exceptions and removed ids by id, touching only what
+        changed. Returns (inserted, removed, updated) counts.
+        """
+        store = self.store
+        inserts = []
+        updated = 0
+        for doc in docs:
+            row = store.row_of.get(doc.get('_id'))
+            if row is None:
+                inserts.append(doc)
+                continue
+            changed = store.update(row, doc)
+            if changed:
+                updated += 1
+                self.dataChanged.emit(self.index(row, min(changed)), self.index(row, max(changed)),
+                                      [Qt.DisplayRole])
+        removed = [store.row_of[tx_id] for tx_id in set(removed_ids) if tx_id in store.row_of]
+        self.retire_rows(removed)
+        self._insert(inserts)
+        return len(inserts), len(removed), updated
+
+    def retire_rows(self, rows):
+        if not rows:
+            return
+        # the proxy locates rows by their (unchanged) values, so notify before forgetting the ids
+        self.rowsRetired.emit(rows)
+        for row in rows:
+            self.store.retire(row)
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and self._next_cursor is not None and not self._fetching
+
+    def fetchMore(self, parent=QModelIndex()):
+        if not self.canFetchMore(parent):
+            return
+        self._fetching = True
+        self._request_page(self._next_cursor)
+
+    # --- Qt model API ---
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.store)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(COLUMNS)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        if role == Qt.DisplayRole:
+            return self.store.value(index.row(), index.column())
+        if role == Qt.TextAlignmentRole and index.column() == AMOUNT_COLUMN:
+            return int(Qt.AlignRight | Qt.AlignVCenter)
+        return None
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole:
+            return None
+        if orientation == Qt.Horizontal:
+            return COLUMNS[section][1]
+        return section + 1
+
+    def headers(self):
+        return [label for _, label in COLUMNS]
+
+    def tx_id(self, row):
+        return self.store.columns['_id'][row]
+
+
+class QueueSortProxy(QAbstractProxyModel):
+    """
+    Sorting and filtering proxy backed by a list of store rows in display order.
+
+    Sorting is two C-level sorts (by store row, then stably by the column list's
+    __getitem__); locating a store row (mapFromSource) is a binary search.
+    `_full` holds every live row in display order and `_rows` the ones passing
+    the filter (the same list while nothing is filtered), so a filter change
+    only selects from an order that is already sorted.
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._rows = []
+        self._full = self._rows
+        self._full_array = None  # numpy copy of _full, reused while it doesn't change
+        self._column = -1
+        self._descending = False
+        self._filter = None
+        self._mask = None  # filter result per store row while a filter is set
+
+    def setSourceModel(self, model):
+        self.beginResetModel()
+        super().setSourceModel(model)
+        model.modelAboutToBeReset.connect(self.beginResetModel)
+        model.modelReset.connect(self._on_source_reset)
+        model.rowsInserted.connect(self._on_rows_inserted)
+        model.dataChanged.connect(self._on_data_changed)
+        model.rowsRetired.connect(self._on_rows_retired)
+        self._reset_rows()
+        self.endResetModel()
+
+    # --- ordering ---
+    # Rows are ordered by the column value, ties by store row ascending (in both
+    # directions: Python's sort stays stable with reverse=True).
+    def _column_key(self):
+        if self._column < 0:
+            return None
+        return self.sourceModel().store.sort_key(self._column)
+
+    def _sorted(self, rows):
+        rows = sorted(rows)
+        key = self._column_key()
+        if key is not None:
+            rows.sort(key=key, reverse=self._descending)
+        return rows
+
+    def _position(self, row, rows=None):
+        """Binary search for where store row `row` sits (or would sit) in `rows` (default: the shown rows)."""
+        key = self._column_key()
+        if rows is None:
+            rows = self._rows
+        lo, hi = 0, len(rows)
+        if key is None:
+            while lo < hi:
+                mid = (lo + hi) // 2
+                if rows[mid] < row:
+                    lo = mid + 1
+                else:
+                    hi = mid
+            return lo
+        target = key(row)
+        descending = self._descending
+        while lo < hi:
+            mid = (lo + hi) // 2
+            probe = rows[mid]
+            value = key(probe)
+            if value == target:
+                before = probe < row
+            else:
+                before = value > target if descending else value < target
+            if before:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        self._column = column
+        self._descending = order == Qt.DescendingOrder and column >= 0
+        self._relayout()
+
+    def _relayout(self, resort=True):
+        self.layoutAboutToBeChanged.emit()
+        persistent = self.persistentIndexList()
+        source_rows = [self._rows[i.row()] for i in persistent]
+        if resort:
+            self._full = self._sorted(self._full)
+            self._full_array = None
+        self._rows = self._full if self._filter is None else self._filtered()
+        new = []
+        for row, index in zip(source_rows, persistent):
+            pos = self._locate(row)
+            new.append(QModelIndex() if pos is None else self.index(pos, index.column()))
+        self.changePersistentIndexList(persistent, new)
+        self.layoutChanged.emit()
+
+    # --- filtering ---
+    def set_filter(self, queue_filter):
+        """Show only the rows `queue_filter` accepts; None (or an empty filter) shows everything."""
+        if queue_filter is not None and queue_filter.is_empty():
+            queue_filter = None
+        if queue_filter is None and self._filter is None:
+            return
+        self._filter = queue_filter
+        self._mask = queue_filter.mask(self.sourceModel().store) if queue_filter else None
+        self._relayout(resort=False)
+
+    def live_count(self):
+        """Rows shown when nothing is filtered."""
+        return len(self._full)
+
+    def _accepts(self, row):
+        return self._filter is None or bool(self._mask[row])
+
+    def _filtered(self):
+        store = self.sourceModel().store
+        if self._column < 0:
+            # unsorted: display order is store order, so the mask gives the rows directly
+            alive = np.frombuffer(bytes(store.alive), dtype=np.bool_)
+            return np.flatnonzero(self._mask & alive).tolist()
+        if self._full_array is None:
+            self._full_array = np.array(self._full, dtype=np.int64)
+        full = self._full_array
+        return full[self._mask[full]].tolist()
+
+    def _refilter_row(self, row):
+        store = self.sourceModel().store
+        accepted = bool(store.alive[row]) and self._filter.accepts(store, row)
+        if accepted == bool(self._mask[row]):
+            return
+        self._mask[row] = accepted
+        if accepted:
+            pos = self._position(row)
+            self.beginInsertRows(QModelIndex(), pos, pos)
+            self._rows.insert(pos, row)
+            self.endInsertRows()
+        else:
+            pos = self._locate(row)
+            if pos is not None:
+                self.beginRemoveRows(QModelIndex(), pos, pos)
+                del self._rows[pos]
+                self.endRemoveRows()
+
+    # --- source signals ---
+    def _reset_rows(self):
+        model = self.sourceModel()
+        self._full = self._sorted(range(model.rowCount()))
+        self._full_array = None
+        if self._filter is None:
+            self._rows = self._full
+        else:
+            self._mask = self._filter.mask(model.store)
+            self._rows = self._filtered()
+
+    def _on_source_reset(self):
+        self._reset_rows()
+        self.endResetModel()
+
+    def _on_rows_inserted(self, parent, first, last):
+        filtered = self._filter is not None
+        if filtered:
+            store = self.sourceModel().store
+            self._mask = np.concatenate((self._mask, [self._filter.accepts(store, row)
+                                                      for row in range(first, last + 1)]))
+        self._full_array = None
+        if self._column >= 0 and last - first < _INCREMENTAL_LIMIT:
+            # a handful of new rows (a refresh): insert each at its sorted position
+            for row in range(first, last + 1):
+                if filtered:
+                    self._full.insert(self._position(row, self._full), row)
+                    if not self._mask[row]:
+                        continue
+                pos = self._position(row)
+                self.beginInsertRows(QModelIndex(), pos, pos)
+                self._rows.insert(pos, row)
+                self.endInsertRows()
+            return
+        # new store rows are appended; place them at the end, then restore the order
+        shown = [row for row in range(first, last + 1) if self._accepts(row)]
+        if filtered:
+            self._full.extend(range(first, last + 1))
+        if shown:
+            end = len(self._rows)
+            self.beginInsertRows(QModelIndex(), end, end + len(shown) - 1)
+            self._rows.extend(shown)
+            self.endInsertRows()
+        if self._column >= 0:
+            self._relayout()
+
+    def _on_rows_retired(self, rows):
+        self._full_array = None
+        for row in rows:
+            if self._full is not self._rows:
+                pos = self._locate(row, self._full)
+                if pos is not None:
+                    del self._full[pos]
+            pos = self._locate(row)
+            if pos is None:
+                continue
+            self.beginRemoveRows(QModelIndex(), pos, pos)
+            del self._rows[pos]
+            self.endRemoveRows()
+
+    def _on_data_changed(self, top_left, bottom_right, roles=()):
+        for row in range(top_left.row(), bottom_right.row() + 1):
+            if top_left.column() <= self._column <= bottom_right.column():
+                self._reposition(row)
+            if self._filter is not None:
+                self._refilter_row(row)
+            pos = self._locate(row)
+            if pos is not None:
+                self.dataChanged.emit(self.index(pos, top_left.column()),
+                                      self.index(pos, bottom_right.column()), roles)
+
+    def _locate(self, row, rows=None):
+        """Position of store row `row` in `rows` (default: the shown rows), or None when it isn't there."""
+        if rows is None:
+            rows = self._rows
+        pos = self._position(row, rows)
+        if pos < len(rows) and rows[pos] == row:
+            return pos
+        return None
+
+    def _reposition(self, row):
+        # the sort value of `row` changed: its old slot can only be found by scanning
+        if self._full is not self._rows:
+            try:
+                self._full.remove(row)
+            except ValueError:
+                pass
+            else:
+                self._full.insert(self._position(row, self._full), row)
+                self._full_array = None
+        try:
+            old = self._rows.index(row)
+        except ValueError:
+            return
+        del self._rows[old]
+        new = self._position(row)
+        self._rows.insert(old, row)
+        if new == old:
+            return
+        self.beginMoveRows(QModelIndex(), old, old, QModelIndex(), new if new < old else new + 1)
+        del self._rows[old]
+        self._rows.insert(new, row)
+        self.endMoveRows()
+        self._full_array = None
+
+    # --- Qt proxy API ---
+    def mapToSource(self, proxy_index):
+        if not proxy_index.isValid():
+            return QModelIndex()
+        return self.sourceModel().index(self._rows[proxy_index.row()], proxy_index.column())
+
+    def mapFromSource(self, source_index):
+        if not source_index.isValid():
+            return QModelIndex()
+        pos = self._locate(source_index.row())
+        if pos is None:
+            return QModelIndex()
+        return self.index(pos, source_index.column())
+
+    def source_row(self, proxy_row):
+        return self._rows[proxy_row]
+
+    def index(self, row, column, parent=QModelIndex()):
+        if parent.isValid() or not (0 <= row < len(self._rows)) or not (0 <= column < self.columnCount()):
+            return QModelIndex()
+        return self.createIndex(row, column)
+
+    def parent(self, index=QModelIndex()):
+        return QModelIndex()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self.sourceModel().columnCount()
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if orientation == Qt.Vertical:
+            return section + 1 if role == Qt.DisplayRole else None
+        return self.sourceModel().headerData(section, orientation, role)
+
+    def canFetchMore(self, parent=QModelIndex()):
+        # a short filtered list would otherwise keep the view pulling pages until the queue is exhausted
+        return not parent.isValid() and self._filter is None and self.sourceModel().canFetchMore(QModelIndex())
+
+    def fetchMore(self, parent=QModelIndex()):
+        if not parent.isValid():
+            self.sourceModel().fetchMore(QModelIndex())
@@ -0,0 +1,63 @@
+"""
+Startup timing and background prewarming for the client.
+
+main.py only imports what the login dialog needs; the table model (numpy),
+the Excel writer (openpyxl) and the dashboard (pyqtgraph) are imported on
+first use. prewarm() imports them on a daemon thread while the operator is
+typing credentials or looking at the queue, so first use rarely pays for
+them either. `python main.py --profile-startup` prints when each stage was
+reached, counted from the start of main.py.
+"""
+import importlib
+import sys
+import threading
+import time
+
+from PyQt5.QtCore import QEvent, QObject
+
+
+class StartupProfile(QObject):
+    """Prints '[startup] <ms> <stage>' lines to stderr when enabled; a no-op otherwise."""
+
+    def __init__(self, started, enabled=False):
+        super().__init__()
+        self.started = started
+        self.enabled = enabled
+        self._labels = {}  # widget -> label of its first paint
+
+    def mark(self, label):
+        if self.enabled:
+            elapsed = (time.perf_counter() - self.started) * 1000
+            print(f'[startup] {elapsed:8.1f} ms  {label}', file=sys.stderr, flush=True)
+
+    def watch_paint(self, widget, label):
+        """Mark `label` when `widget` first paints."""
+        if self.enabled:
+            self._labels[widget] = label
+            widget.installEventFilter(self)
+
+    def eventFilter(self, obj, event):
+        if event.type() == QEvent.Paint and obj in self._labels:
+            obj.removeEventFilter(self)
+            self.mark(f'{self._labels.pop(obj)} painted')
+        return False
+
+    def imported(self, name, seconds):
+        self.mark(f'imported {name} in {seconds * 1000:.1f} ms (background)')
+
+
+def prewarm(modules, profile):
+    """Import `modules` on a daemon thread; import errors surface later, on first real use."""
+    def run():
+        for name in modules:
+            if name in sys.modules:
+                continue
+            started = time.perf_counter()
+            try:
+                importlib.import_module(name)
+            except Exception:
+                continue
+            profile.imported(name, time.perf_counter() - started)
+
+    threading.Thread(target=run, name='prewarm', daemon=True).start()
+
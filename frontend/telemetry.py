@@ -0,0 +1,225 @@
+"""
+Client-side latency telemetry.
+
+Every API call (split into dns/connect/ttfb/download by api_client) and every
+table or chart render is recorded as a Sample in a bounded in-memory ring.
+TelemetryOverlay shows per-action percentiles over that ring inside the main
+window. Alongside the ring, durations are folded into histograms with the
+backend's latency buckets; when uploading is switched on they are posted to
+/api/client-metrics and end up next to the server's own timings in
+/api/metrics.
+"""
+import os
+import re
+import threading
+import time
+from bisect import bisect_left
+from collections import deque, namedtuple
+from contextlib import contextmanager
+
+from PyQt5.QtCore import Qt, QTimer
+from PyQt5.QtWidgets import QCheckBox, QFrame, QHBoxLayout, QHeaderView, QLabel, QPushButton, QTableWidget, \
+    QTableWidgetItem, QVBoxLayout
+
+TELEMETRY_SAMPLES = 5000  # size of the ring the overlay computes percentiles over
+# must match metrics.LATENCY_BUCKETS on the backend, which rejects anything else
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+UPLOAD_SECONDS = int(os.getenv('TELEMETRY_UPLOAD_SECONDS', '0'))  # 0 = don't upload unless switched on
+PHASES = ('dns', 'connect', 'ttfb', 'download')
+
+Sample = namedtuple('Sample', 'at kind action seconds rows phases ok')
+
+# ids in paths would make every record its own action
+_ID_SEGMENT = re.compile(r'/[0-9a-fA-F]{24,64}(?=/|$)')
+
+
+def action_name(method, path):
+    """'GET /exceptions/<id>' for 'GET /exceptions/65a1...?x=1'."""
+    return f"{method} {_ID_SEGMENT.sub('/<id>', path.split('?', 1)[0])}"
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return None
+    return sorted_values[min(int(q * len(sorted_values)), len(sorted_values) - 1)]
+
+
+class Telemetry:
+    def __init__(self, size=TELEMETRY_SAMPLES):
+        self._lock = threading.Lock()  # API calls record from pool threads
+        self._samples = deque(maxlen=size)
+        self._pending = {}  # (kind, action, phase) -> [bucket counts, sum, count] not uploaded yet
+
+    def record(self, kind, action, seconds, rows=None, phases=None, ok=True):
+        sample = Sample(time.time(), kind, action, seconds, rows, phases or {}, ok)
+        with self._lock:
+            self._samples.append(sample)
+            self._fold(kind, action, 'total', seconds)
+            for phase, value in sample.phases.items():
+                self._fold(kind, action, phase, value)
+
+    def _fold(self, kind, action, phase, seconds):
+        hist = self._pending.get((kind, action, phase))
+        if hist is None:
+            hist = self._pending[(kind, action, phase)] = [[0] * (len(LATENCY_BUCKETS) + 1), 0.0, 0]
+        hist[0][bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        hist[1] += seconds
+        hist[2] += 1
+
+    @contextmanager
+    def timed(self, kind, action, rows=None):
+        """Record the duration of the block; the yielded dict's 'rows' can be set inside it."""
+        info = {'rows': rows}
+        started = time.perf_counter()
+        try:
+            yield info
+        finally:
+            self.record(kind, action, time.perf_counter() - started, rows=info['rows'])
+
+    def samples(self):
+        with self._lock:
+            return list(self._samples)
+
+    def summary(self):
+        """Per (kind, action): count, errors, p50/p90/p99/max ms, last rows and median phase ms."""
+        by_action = {}
+        for s in self.samples():
+            by_action.setdefault((s.kind, s.action), []).append(s)
+        rows = []
+        for (kind, action), samples in sorted(by_action.items()):
+            ms = sorted(s.seconds * 1000 for s in samples)
+            phases = {}
+            for phase in PHASES:
+                values = sorted(s.phases[phase] * 1000 for s in samples if phase in s.phases)
+                if values:
+                    phases[phase] = percentile(values, 0.5)
+            rows.append({
+                'kind': kind, 'action': action, 'count': len(samples),
+                'errors': sum(1 for s in samples if not s.ok),
+                'p50': percentile(ms, 0.5), 'p90': percentile(ms, 0.9), 'p99': percentile(ms, 0.99), 'max': ms[-1],
+                'rows': next((s.rows for s in reversed(samples) if s.rows is not None), None),
+                'phases': phases,
+            })
+        return rows
+
+    # --- upload ---
+    def take_pending(self):
+        """The histograms gathered since the last take, as /api/client-metrics expects them."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        return [{'kind': kind, 'action': action, 'phase': phase, 'counts': counts, 'sum': total, 'count': count}
+                for (kind, action, phase), (counts, total, count) in pending.items()]
+
+    def restore(self, histograms):
+        """Put back histograms whose upload failed, so the next upload carries them."""
+        with self._lock:
+            for h in histograms:
+                current = self._pending.get((h['kind'], h['action'], h['phase']))
+                if current is None:
+                    self._pending[(h['kind'], h['action'], h['phase'])] = [list(h['counts']), h['sum'], h['count']]
+                else:
+                    current[0] = [a + b for a, b in zip(current[0], h['counts'])]
+                    current[1] += h['sum']
+                    current[2] += h['count']
+
+
+telemetry = Telemetry()
+
+
+class TelemetryOverlay(QFrame):
+    """Floating panel with per-action percentiles; refreshes itself while visible."""
+
+    COLUMNS = ['Action', 'Count', 'p50 ms', 'p90 ms', 'p99 ms', 'Max ms', 'Rows', 'dns / connect / ttfb / download ms']
+
+    def __init__(self, api, parent=None):
+        super().__init__(parent)
+        self.api = api
+        self.setFrameShape(QFrame.StyledPanel)
+        self.setAutoFillBackground(True)
+        self.setStyleSheet('TelemetryOverlay { background-color: rgba(250, 250, 250, 235); border: 1px solid #888; }')
+
+        self.table = QTableWidget(0, len(self.COLUMNS))
+        self.table.setHorizontalHeaderLabels(self.COLUMNS)
+        self.table.verticalHeader().setVisible(False)
+        self.table.setEditTriggers(QTableWidget.NoEditTriggers)
+        self.table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeToContents)
+        self.table.horizontalHeader().setSectionResizeMode(0, QHeaderView.Stretch)
+
+        self.upload = QCheckBox('Upload to server')
+        self.upload.setChecked(UPLOAD_SECONDS > 0)
+        self.upload.toggled.connect(self.toggle_upload)
+        self.status = QLabel()
+        btn_close = QPushButton('Close')
+        btn_close.clicked.connect(self.hide)
+
+        controls = QHBoxLayout()
+        controls.addWidget(QLabel('<b>Client latency</b> (last %d samples)' % TELEMETRY_SAMPLES))
+        controls.addStretch(1)
+        controls.addWidget(self.status)
+        controls.addWidget(self.upload)
+        controls.addWidget(btn_close)
+        layout = QVBoxLayout()
+        layout.addLayout(controls)
+        layout.addWidget(self.table)
+        self.setLayout(layout)
+
+        self.refresh_timer = QTimer(self)
+        self.refresh_timer.setInterval(1000)
+        self.refresh_timer.timeout.connect(self.refresh)
+        # uploads run whether or not the panel is open
+        self.upload_timer = QTimer(self)
+        self.upload_timer.setInterval(max(UPLOAD_SECONDS, 10) * 1000)
+        self.upload_timer.timeout.connect(self.upload_now)
+        self.toggle_upload(self.upload.isChecked())
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        self.refresh()
+        self.refresh_timer.start()
+
+    def hideEvent(self, event):
+        self.refresh_timer.stop()
+        super().hideEvent(event)
+
+    def refresh(self):
+        summary = telemetry.summary()
+        self.table.setRowCount(len(summary))
+
+        def fmt(value):
+            return '' if value is None else f'{value:.1f}'
+
+        for i, row in enumerate(summary):
+            count = f"{row['count']}" + (f" ({row['errors']} failed)" if row['errors'] else '')
+            phases = ' / '.join(fmt(row['phases'].get(p)) or '–' for p in PHASES) if row['phases'] else ''
+            cells = [f"{row['kind']}: {row['action']}", count, fmt(row['p50']), fmt(row['p90']), fmt(row['p99']),
+                     fmt(row['max']), '' if row['rows'] is None else f"{row['rows']:,}", phases]
+            for col, text in enumerate(cells):
+                item = QTableWidgetItem(text)
+                if col:
+                    item.setTextAlignment(int(Qt.AlignRight | Qt.AlignVCenter))
+                self.table.setItem(i, col, item)
+
+    def toggle_upload(self, enabled):
+        if enabled:
+            self.upload_timer.start()
+        else:
+            self.upload_timer.stop()
+
+    def upload_now(self):
+        histograms = telemetry.take_pending()
+        if not histograms:
+            return
+
+        def done(status, data):
+            if data.get('ok'):
+                self.status.setText(f"Uploaded {time.strftime('%H:%M:%S')}")
+            else:
+                telemetry.restore(histograms)
+                self.status.setText(f"Upload failed: {data.get('error', f'HTTP {status}')}")
+
+        def failed(message):
+            telemetry.restore(histograms)
+            self.status.setText(f'Upload failed: {message}')
+
+        self.api.post('/client-metrics', json={'buckets': list(LATENCY_BUCKETS), 'histograms': histograms},
+                      on_result=done, on_error=failed)
@@ -0,0 +1,14 @@
+import os
+import sys
+
+import pytest
+
+# the client is a flat set of modules run from its own directory
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+
+@pytest.fixture(scope='session')
+def qapp():
+    widgets = pytest.importorskip('PyQt5.QtWidgets')
+    return widgets.QApplication.instance() or widgets.QApplication([])
@@ -0,0 +1,82 @@
+import threading
+import time
+
+import pytest
+
+from api_client import ApiClient
+
+
+class FakeResponse:
+    status_code = 200
+    headers = {}
+
+    def __init__(self, path):
+        self.content = b'{}'
+        self.path = path
+
+    def json(self):
+        return {'ok': True, 'path': self.path}
+
+
+class GatedSession:
+    """Stands in for requests.Session: each request waits until the test opens the gate."""
+
+    def __init__(self):
+        self.gate = threading.Event()
+        self.started = []
+
+    def request(self, method, url, **kwargs):
+        self.started.append(url)
+        self.gate.wait(5)
+        return FakeResponse(url)
+
+
+@pytest.fixture
+def client(qapp):
+    client = ApiClient('http://backend', max_threads=1)
+    client.session = GatedSession()
+    yield client
+    client.session.gate.set()
+    client.pool.waitForDone(5000)
+
+
+def _settle(qapp, client):
+    client.session.gate.set()
+    deadline = time.monotonic() + 5
+    while client._inflight and time.monotonic() < deadline:
+        qapp.processEvents()
+        time.sleep(0.005)
+    assert not client._inflight
+
+
+def _wait_running(client, n):
+    deadline = time.monotonic() + 5
+    while len(client.session.started) < n and time.monotonic() < deadline:
+        time.sleep(0.005)
+
+
+def test_a_superseded_call_never_reaches_its_callbacks(qapp, client):
+    results = []
+    first = client.get('/exceptions', key='page', on_result=lambda s, d: results.append(('first', d)),
+                       on_error=lambda m: results.append(('first error', m)))
+    _wait_running(client, 1)  # the first request is on the wire
+    client.get('/exceptions?after=c1', key='page', on_result=lambda s, d: results.append(('second', d)),
+               on_error=lambda m: results.append(('second error', m)))
+    assert first.cancelled
+    _settle(qapp, client)
+    assert results == [('second', {'ok': True, 'path': 'http://backend/exceptions?after=c1'})]
+    assert client._latest == {}
+
+
+def test_a_queued_call_is_taken_off_the_pool_when_cancelled(qapp, client):
+    results = []
+    client.get('/busy', on_result=lambda s, d: results.append('busy'))
+    _wait_running(client, 1)  # the only worker is taken
+    queued = client.get('/report', key='report', on_result=lambda s, d: results.append('report'),
+                        on_error=results.append)
+    assert queued in client._inflight
+    client.cancel('report')
+    assert queued.cancelled and queued not in client._inflight
+    _settle(qapp, client)
+    assert results == ['busy']
+    assert client.session.started == ['http://backend/busy']  # the cancelled call never ran
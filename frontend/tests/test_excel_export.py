@@ -0,0 +1,60 @@
+import json
+from contextlib import contextmanager
+from datetime import datetime
+from decimal import Decimal
+
+import pytest
+
+openpyxl = pytest.importorskip('openpyxl')
+
+import excel_export  # noqa: E402
+from excel_export import ExcelExportWorker  # noqa: E402
+
+
+class FakeResponse:
+    def __init__(self, docs):
+        self.status_code = 200
+        self.headers = {'X-Total-Count': str(len(docs))}
+        self._lines = [json.dumps(d).encode() for d in docs] + [b'']
+
+    def iter_lines(self):
+        return iter(self._lines)
+
+
+class FakeSession:
+    def __init__(self, docs):
+        self.docs = docs
+
+    @contextmanager
+    def get(self, url, **kwargs):
+        yield FakeResponse(self.docs)
+
+
+DOCS = [
+    {'_id': 'a', 'created_at': '2025-05-01T10:00:00', 'sender': 'BANKDEFF', 'amount': '1234.50', 'currency': 'USD'},
+    {'_id': 'b', 'created_at': 'not a date', 'sender': None, 'amount': '1500', 'currency': 'JPY'},
+]
+
+
+def test_rows_are_typed_for_excel(qapp, tmp_path):
+    path = str(tmp_path / 'queue.xlsx')
+    worker = ExcelExportWorker(FakeSession(DOCS), 'http://backend/api/exceptions/export', path)
+    assert worker._export() == 2
+
+    ws = openpyxl.load_workbook(path)['Exceptions']
+    rows = list(ws.iter_rows(values_only=True))
+    assert rows[0] == tuple(title for _, title in excel_export.EXPORT_COLUMNS)
+    assert rows[1][:3] == ('a', datetime(2025, 5, 1, 10, 0), 'BANKDEFF')
+    assert Decimal(str(rows[1][5])) == Decimal('1234.5')
+    assert ws['F2'].number_format == '#,##0.00'
+    assert rows[2][1] == 'not a date' and rows[2][2] is None and ws['F3'].number_format == '#,##0'
+
+
+def test_full_sheets_roll_over(qapp, tmp_path, monkeypatch):
+    monkeypatch.setattr(excel_export, 'MAX_SHEET_ROWS', 3)
+    path = str(tmp_path / 'queue.xlsx')
+    docs = [dict(DOCS[0], _id=str(i)) for i in range(5)]
+    assert ExcelExportWorker(FakeSession(docs), 'url', path)._export() == 5
+    wb = openpyxl.load_workbook(path)
+    assert wb.sheetnames == ['Exceptions', 'Exceptions 2', 'Exceptions 3']
+    assert [ws.max_row for ws in wb.worksheets] == [3, 3, 2]
@@ -0,0 +1,57 @@
+import logging
+
+from local_cache import LocalCache
+
+
+def _doc(i, day):
+    return {'_id': f'id{i}', 'created_at': f'{day} Jan 2025 10:00:00 GMT', 'reference': f'R{i}'}
+
+
+def _days(docs):
+    return [d['_id'] for d in docs]
+
+
+def test_documents_page_newest_first_and_survive_reopening(tmp_path):
+    path = str(tmp_path / 'cache.sqlite3')
+    cache = LocalCache('http://a', path=path)
+    cache.put('exceptions', [_doc(1, 'Wed, 01'), _doc(3, 'Fri, 03'), _doc(2, 'Thu, 02'), {'reference': 'no id'}])
+    cache.db.close()
+
+    cache = LocalCache('http://a', path=path)
+    assert cache.count('exceptions') == 3
+    first, key = cache.page('exceptions', limit=2)
+    assert _days(first) == ['id3', 'id2']
+    rest, _ = cache.page('exceptions', after_key=key, limit=2)
+    assert _days(rest) == ['id1']
+
+
+def test_servers_and_collections_are_kept_apart(tmp_path):
+    path = str(tmp_path / 'cache.sqlite3')
+    a, b = LocalCache('http://a', path=path), LocalCache('http://b', path=path)
+    a.put('exceptions', [_doc(1, 'Wed, 01')])
+    b.put('exceptions', [_doc(2, 'Thu, 02')])
+    a.put('processed', [{'_id': 'p1', 'processed_at': 'Wed, 01 Jan 2025 11:00:00 GMT'}])
+    assert _days(a.page('exceptions')[0]) == ['id1']
+    assert _days(b.page('exceptions')[0]) == ['id2']
+    a.clear('exceptions')
+    assert a.count('exceptions') == 0 and a.count('processed') == 1 and b.count('exceptions') == 1
+
+
+def test_sync_state_updates_only_what_is_given(tmp_path):
+    cache = LocalCache('http://a', path=str(tmp_path / 'cache.sqlite3'))
+    assert cache.state('exceptions') == (None, None)
+    cache.set_state('exceptions', watermark='w1', next_cursor='c1')
+    cache.set_state('exceptions', watermark='w2')
+    assert cache.state('exceptions') == ('w2', 'c1')
+    cache.put('exceptions', [_doc(1, 'Wed, 01'), _doc(2, 'Thu, 02')])
+    cache.remove('exceptions', ['id1'])
+    assert _days(cache.page('exceptions')[0]) == ['id2']
+
+
+def test_unusable_cache_file_falls_back_to_memory(tmp_path, caplog):
+    (tmp_path / 'bad.sqlite3').write_bytes(b'this is not a database' * 100)
+    with caplog.at_level(logging.WARNING, logger='local_cache'):
+        cache = LocalCache('http://a', path=str(tmp_path / 'bad.sqlite3'))
+    cache.put('exceptions', [_doc(1, 'Wed, 01')])
+    assert cache.count('exceptions') == 1
+    assert 'using an in-memory cache' in caplog.text
@@ -0,0 +1,52 @@
+from types import SimpleNamespace
+
+import pytest
+
+import main
+
+
+class FakeApi:
+    def __init__(self, status, data):
+        self.reply = status, data
+
+    def get(self, path, on_result=None, on_error=None, **kwargs):
+        on_result(*self.reply)
+
+    post = get
+
+
+class Recorder:
+    def __init__(self):
+        self.calls = []
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self.calls.append((name, args, kwargs))
+
+
+@pytest.fixture
+def window():
+    errors = []
+    return SimpleNamespace(model=Recorder(), records=Recorder(), local=Recorder(), errors=errors,
+                           show_error=errors.append, load_exceptions=lambda: errors.append('reloaded'))
+
+
+def test_a_loaded_page_advances_the_cursor(qapp, window, monkeypatch):
+    monkeypatch.setattr(main, 'api', FakeApi(200, {'ok': True, 'exceptions': [{'_id': 'a'}], 'next_cursor': 'c2'}))
+    main.MainWindow.fetch_exceptions_page(window, 'c1')
+    assert ('append_page', ([{'_id': 'a'}], 'c2'), {}) in window.model.calls
+    assert ('set_state', ('exceptions',), {'next_cursor': 'c2'}) in window.local.calls
+
+
+@pytest.mark.parametrize('status', [429, 500])
+def test_a_rejected_page_keeps_the_cursor_and_reports(qapp, window, monkeypatch, status):
+    monkeypatch.setattr(main, 'api', FakeApi(status, {'ok': False, 'error': 'busy'}))
+    main.MainWindow.fetch_exceptions_page(window, 'c1')
+    assert window.model.calls == [('append_page', ([], 'c1'), {})]
+    assert window.local.calls == []  # the cached cursor isn't overwritten either
+    assert window.errors == ['busy']
+
+
+def test_a_failed_seed_is_reported_not_announced(qapp, window, monkeypatch):
+    monkeypatch.setattr(main, 'api', FakeApi(429, {'ok': False}))
+    main.MainWindow.seed_data(window)
+    assert window.errors == ['HTTP 429']
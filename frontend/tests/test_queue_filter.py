@@ -0,0 +1,89 @@
+import numpy as np
+import pytest
+
+import queue_filter
+from queue_filter import QueueFilter, TextIndex
+from queue_model import ColumnStore
+
+NAMES = ['Acme Trading Ltd', 'ACME Holdings', 'Beta Corp', 'acmeco', 'Gamma-Acme GmbH']
+
+
+def _rows(index, prefix, n):
+    out = np.zeros(n, dtype=bool)
+    index.match(prefix, out)
+    return np.flatnonzero(out).tolist()
+
+
+def test_text_index_matches_word_prefixes_case_insensitively():
+    index = TextIndex(list(NAMES))
+    assert _rows(index, 'acme', len(NAMES)) == [0, 1, 3, 4]
+    assert _rows(index, 'hold', len(NAMES)) == [1]
+    assert _rows(index, 'corp', len(NAMES)) == [2]
+    assert _rows(index, 'cme', len(NAMES)) == []  # prefixes of words, not substrings
+
+
+def test_text_index_sees_appended_and_overwritten_rows():
+    values = list(NAMES)
+    index = TextIndex(values)
+    values += ['Delta Acme', 'Omega']
+    index.add(5, 6)
+    values[0] = 'Zeta Partners'
+    index.changed(0)
+    assert _rows(index, 'acme', len(values)) == [1, 3, 4, 5]
+    assert _rows(index, 'zeta', len(values)) == [0]
+    assert index.row_matches(6, 'ome') and not index.row_matches(0, 'acme')
+
+
+def test_text_index_rebuilds_once_enough_rows_change(monkeypatch):
+    monkeypatch.setattr(queue_filter, '_REBUILD_MIN', 2)
+    values = list(NAMES)
+    index = TextIndex(values)
+    values += ['Delta Acme', 'Epsilon Acme', 'Omega']
+    index.add(5, 7)
+    assert index._built == 8 and not index._added
+    assert _rows(index, 'acme', len(values)) == [0, 1, 3, 4, 5, 6]
+
+
+def _doc(i, name, amount, created):
+    return {'_id': f'id{i}', 'beneficiary_name': name, 'sender': 'BANKDEFF', 'amount': amount,
+            'created_at': created}
+
+
+@pytest.fixture
+def store():
+    store = ColumnStore()
+    store.append([
+        _doc(0, 'Acme Trading', '100.00', 'Tue, 07 Jan 2025 10:00:00 GMT'),
+        _doc(1, 'Beta Corp', '250.00', 'Wed, 08 Jan 2025 10:00:00 GMT'),
+        _doc(2, 'Acme Holdings', '900.00', 'Thu, 09 Jan 2025 10:00:00 GMT'),
+        _doc(3, 'Gamma', '50.00', 'Fri, 10 Jan 2025 10:00:00 GMT'),
+    ])
+    return store
+
+
+def _check(queue_filter, store):
+    mask = queue_filter.mask(store)
+    # the per-row check the proxy uses for single rows agrees with the vectorised mask
+    assert [queue_filter.accepts(store, row) for row in range(len(store))] == mask.tolist()
+    return np.flatnonzero(mask).tolist()
+
+
+def test_empty_filter_accepts_everything(store):
+    assert QueueFilter().is_empty()
+    assert _check(QueueFilter(), store) == [0, 1, 2, 3]
+
+
+def test_every_word_must_match_some_field(store):
+    fields = ('beneficiary_name', 'sender')
+    assert _check(QueueFilter('acme', fields), store) == [0, 2]
+    assert _check(QueueFilter('ACME hold', fields), store) == [2]
+    assert _check(QueueFilter('acme bankde', fields), store) == [0, 2]
+    assert _check(QueueFilter('acme beta', fields), store) == []
+
+
+def test_amount_and_created_ranges(store):
+    jan8 = store.created[1]
+    assert _check(QueueFilter(min_amount=100, max_amount=250), store) == [0, 1]
+    assert _check(QueueFilter(created_from=jan8), store) == [1, 2, 3]
+    assert _check(QueueFilter(created_to=jan8), store) == [0]  # exclusive
+    assert _check(QueueFilter('acme', ('beneficiary_name',), min_amount=500), store) == [2]
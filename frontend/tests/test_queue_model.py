@@ -0,0 +1,84 @@
+import pytest
+from PyQt5.QtCore import Qt
+
+from queue_model import AMOUNT_COLUMN, FIELDS, ExceptionsTableModel, QueueSortProxy
+
+ID_COLUMN = FIELDS.index('_id')
+
+
+def _doc(i, amount, sender='BANKDEFF', created='Tue, 07 Jan 2025 10:00:00 GMT'):
+    return {'_id': f'id{i}', 'sender': sender, 'receiver': 'BANKUS33', 'beneficiary_name': f'Name {i}',
+            'amount': amount, 'error': 'IBAN format invalid', 'created_at': created}
+
+
+@pytest.fixture
+def pages():
+    return []
+
+
+@pytest.fixture
+def model(qapp, pages):
+    model = ExceptionsTableModel(pages.append)
+    model.reset([_doc(0, '30.00'), _doc(1, '10.00'), _doc(2, '20.00'), _doc(3, '10.00')], next_cursor='c1')
+    return model
+
+
+@pytest.fixture
+def proxy(model):
+    proxy = QueueSortProxy()
+    proxy.setSourceModel(model)
+    return proxy
+
+
+def _ids(proxy):
+    return [proxy.data(proxy.index(r, ID_COLUMN)) for r in range(proxy.rowCount())]
+
+
+def test_store_keeps_columns_and_numeric_amounts(model):
+    store = model.store
+    assert len(store) == 4 and store.live_count() == 4
+    assert list(store.amounts) == [30.0, 10.0, 20.0, 10.0]
+    assert store.row_of['id2'] == 2
+    assert model.data(model.index(2, AMOUNT_COLUMN)) == '20.00'
+
+
+def test_unsorted_proxy_keeps_backend_order(proxy):
+    assert _ids(proxy) == ['id0', 'id1', 'id2', 'id3']
+
+
+def test_amount_sort_is_numeric_and_stable(proxy):
+    proxy.sort(AMOUNT_COLUMN, Qt.AscendingOrder)
+    assert _ids(proxy) == ['id1', 'id3', 'id2', 'id0']
+    proxy.sort(AMOUNT_COLUMN, Qt.DescendingOrder)
+    assert _ids(proxy) == ['id0', 'id2', 'id1', 'id3']
+
+
+def test_fetch_more_requests_the_next_page_once(model, pages, proxy):
+    assert model.canFetchMore()
+    model.fetchMore()
+    model.fetchMore()
+    assert pages == ['c1']
+    model.append_page([_doc(4, '15.00'), _doc(1, '10.00')], next_cursor=None)
+    assert not model.canFetchMore()
+    assert len(model.store) == 5  # id1 was already loaded
+    proxy.sort(AMOUNT_COLUMN, Qt.AscendingOrder)
+    assert _ids(proxy) == ['id1', 'id3', 'id4', 'id2', 'id0']
+
+
+def test_apply_changes_updates_inserts_and_retires_by_id(model, proxy):
+    proxy.sort(AMOUNT_COLUMN, Qt.AscendingOrder)
+    changed = []
+    model.dataChanged.connect(lambda top_left, bottom_right, roles: changed.append(top_left.row()))
+
+    counts = model.apply_changes([_doc(2, '5.00'), _doc(5, '25.00')], removed_ids=['id0', 'missing'])
+    assert counts == (1, 1, 1)
+    assert changed == [2]
+    # retired rows stay in the store, so no store row shifts
+    assert len(model.store) == 5 and model.store.live_count() == 4
+    assert _ids(proxy) == ['id2', 'id1', 'id3', 'id5']
+
+
+def test_reapplying_the_same_changes_is_a_no_op(model, proxy):
+    model.apply_changes([_doc(2, '5.00')], removed_ids=['id0'])
+    assert model.apply_changes([_doc(2, '5.00')], removed_ids=['id0']) == (0, 0, 0)
+    assert _ids(proxy) == ['id1', 'id2', 'id3']
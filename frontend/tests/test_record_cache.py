@@ -0,0 +1,36 @@
+import time
+
+from api_client import RecordCache
+
+
+def test_least_recently_used_entries_are_evicted():
+    cache = RecordCache(maxsize=2, ttl=60)
+    cache.put({'_id': 'a'})
+    cache.put({'_id': 'b'})
+    cache.get('a')  # a is now the most recent
+    cache.put({'_id': 'c'})
+    assert cache.get('b') is None
+    assert cache.get('a')[0] == {'_id': 'a'}
+    assert cache.get('c') is not None
+
+
+def test_entries_go_stale_after_ttl_and_touch_refreshes_them(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(time, 'monotonic', lambda: now[0])
+    cache = RecordCache(maxsize=10, ttl=30)
+    cache.put({'_id': 'a', 'amount': '1.00'}, etag='"v1"')
+    assert cache.get('a') == ({'_id': 'a', 'amount': '1.00'}, '"v1"', False)
+    now[0] += 31
+    assert cache.get('a')[2] is True
+    cache.touch('a')
+    assert cache.get('a')[2] is False
+
+
+def test_documents_without_an_id_are_ignored_and_invalidate_drops():
+    cache = RecordCache()
+    cache.put({'amount': '1.00'})
+    cache.put_many([{'_id': 'a'}, {'_id': 'b'}])
+    cache.invalidate('a')
+    assert cache.get('a') is None and cache.get('b') is not None
+    cache.clear()
+    assert cache.get('b') is None
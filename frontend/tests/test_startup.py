@@ -0,0 +1,27 @@
+import sys
+import time
+
+from startup import StartupProfile, prewarm
+
+
+def test_profile_only_prints_when_enabled(qapp, capsys):
+    StartupProfile(time.perf_counter()).mark('login shown')
+    assert capsys.readouterr().err == ''
+    StartupProfile(time.perf_counter(), enabled=True).mark('login shown')
+    assert capsys.readouterr().err.startswith('[startup] ')
+
+
+def test_prewarm_imports_in_the_background_and_ignores_failures(qapp, monkeypatch):
+    monkeypatch.delitem(sys.modules, 'colorsys', raising=False)
+    imported = []
+
+    class Profile:
+        def imported(self, name, seconds):
+            imported.append(name)
+
+    prewarm(['no_such_module_here', 'colorsys', 'sys'], Profile())
+    for _ in range(200):
+        if imported:
+            break
+        time.sleep(0.01)
+    assert imported == ['colorsys'] and 'colorsys' in sys.modules
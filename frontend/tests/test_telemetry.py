@@ -0,0 +1,39 @@
+from telemetry import LATENCY_BUCKETS, Telemetry, action_name
+
+
+def test_action_names_hide_ids_and_queries():
+    assert action_name('GET', '/exceptions/65a1b2c3d4e5f6a7b8c9d0e1?x=1') == 'GET /exceptions/<id>'
+    assert action_name('POST', '/fix') == 'POST /fix'
+
+
+def test_record_folds_totals_and_phases_into_bucketed_histograms():
+    t = Telemetry()
+    t.record('api', 'GET /exceptions', 0.003, phases={'ttfb': 0.002})
+    t.record('api', 'GET /exceptions', 0.2)
+    pending = {h['phase']: h for h in t.take_pending()}
+    assert set(pending) == {'total', 'ttfb'}
+    total = pending['total']
+    assert len(total['counts']) == len(LATENCY_BUCKETS) + 1
+    assert total['counts'][LATENCY_BUCKETS.index(0.005)] == 1
+    assert total['counts'][LATENCY_BUCKETS.index(0.25)] == 1
+    assert total['count'] == 2 and abs(total['sum'] - 0.203) < 1e-9
+    assert t.take_pending() == []
+
+
+def test_failed_upload_is_restored_and_merged():
+    t = Telemetry()
+    t.record('render', 'queue', 0.01)
+    failed = t.take_pending()
+    t.record('render', 'queue', 0.01)
+    t.restore(failed)
+    [hist] = t.take_pending()
+    assert hist['count'] == 2 and sum(hist['counts']) == 2
+
+
+def test_summary_percentiles_and_errors():
+    t = Telemetry(size=3)
+    for ms in (50, 10, 20, 30):
+        t.record('api', 'GET /x', ms / 1000, rows=ms, ok=ms != 30)
+    [row] = t.summary()
+    assert row['count'] == 3  # the ring keeps the last three
+    assert (row['p50'], row['max'], row['errors'], row['rows']) == (20, 30, 1, 30)